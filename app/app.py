@@ -1,10 +1,27 @@
+import csv
+import io
 import os
-from typing import Dict, Any, List, Optional
-from flask import Flask, jsonify, Response
-from .models import db, Player, Campaign
-from .campaigns import get_active_campaigns
-from .schemas import ma, player_schema, api_campaigns_schema
-from .services import filter_eligible_campaigns
+from typing import Any, Dict, List, NamedTuple, Optional
+from flask import (
+    Flask, jsonify, request, Response, stream_with_context)
+from marshmallow import ValidationError
+from .audiences import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, campaign_known, campaign_player_total,
+    campaign_players, iter_campaign_players)
+from .database import DEFAULT_PRAGMAS, database_tuning
+from .models import db, Player
+from .profiles import load_player_profile
+from .catalog import catalog, CatalogSnapshot, CatalogUnavailableError
+from .schemas import (
+    ma, player_delta_schema, player_schema, player_serializer)
+from .engine import CompiledCampaign, PlayerView
+from .metrics import metrics
+from .profile_cache import profile_cache, ProfileSnapshot
+from .selectivity import matcher_statistics
+from .services import (
+    apply_player_delta, assign_campaigns, campaign_rows, get_client_configs)
+from .singleflight import SingleFlight
+from .write_behind import assignment_queue
 
 app = Flask(__name__)
 basedir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
@@ -12,10 +29,50 @@ app.config['SQLALCHEMY_DATABASE_URI'] = (
     f'sqlite:///{os.path.join(basedir, "instance", "profiles.db")}'
 )
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['CAMPAIGN_REFRESH_INTERVAL'] = 60.0
+# Players hold only their CAMPAIGN_TOP_K highest priority matching campaigns,
+# and at most CAMPAIGN_PLAYER_CAP active campaigns (0: no limit)
+app.config['CAMPAIGN_TOP_K'] = 0
+app.config['CAMPAIGN_PLAYER_CAP'] = 0
+app.config['PROFILE_CACHE_SIZE'] = 10000
+app.config['PROFILE_CACHE_REDIS_URL'] = None
+# 'marshmallow' (player_schema) or 'compiled' (player_serializer)
+app.config['PROFILE_SERIALIZER'] = 'marshmallow'
+# One matcher evaluation in MATCHER_SAMPLE_EVERY is measured (0 disables),
+# rules are reordered every MATCHER_REORDER_EVERY measured evaluations
+app.config['MATCHER_SAMPLE_EVERY'] = 64
+app.config['MATCHER_REORDER_EVERY'] = 1000
+# ASGI entry point (app.asgi): request worker threads, and the seconds
+# allowed to a campaign catalog fetch
+app.config['ASGI_WORKERS'] = 16
+app.config['CAMPAIGN_FETCH_TIMEOUT'] = 5.0
+# Pragmas of every SQLite connection, and size of the query-only connection
+# pool of file databases (0: one pool for reads and writes)
+app.config['SQLITE_PRAGMAS'] = dict(DEFAULT_PRAGMAS)
+app.config['SQLITE_READ_POOL_SIZE'] = 8
+# Write-behind of campaign assignments: acknowledged once in the log file,
+# written to the database in batches by a background thread
+app.config['ASSIGNMENT_WRITE_BEHIND'] = False
+app.config['ASSIGNMENT_LOG_PATH'] = os.path.join(
+    basedir, "instance", "assignments.log")
+app.config['ASSIGNMENT_QUEUE_MAX_DEPTH'] = 10000
+app.config['ASSIGNMENT_BATCH_SIZE'] = 500
+app.config['ASSIGNMENT_QUEUE_TIMEOUT'] = 1.0
 
-# Init DB & Marshmallow
+# Overrides from FLASK_* environment variables
+app.config.from_prefixed_env()
+
+# Init DB (engine options first), Marshmallow, campaign catalog, profile
+# cache, matcher statistics & assignment queue (replaying its log)
+database_tuning.init_app(app)
 db.init_app(app)
 ma.init_app(app)
+catalog.init_app(app)
+profile_cache.init_app(app)
+matcher_statistics.init_app(app)
+assignment_queue.init_app(app)
+catalog.subscribe(lambda snapshot: campaign_rows.discard(
+    snapshot.diff.removed if snapshot.diff else ()))
 
 
 @app.route('/', methods=['GET'])
@@ -24,33 +81,315 @@ def healthcheck() -> Dict[str, str]:
     return jsonify({"status": "ok"})
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics() -> Response:
+    """Metrics endpoint: current value of every counter and gauge"""
+    return jsonify(metrics.snapshot())
+
+
+@app.route('/admin/matcher_stats', methods=['GET'])
+def get_matcher_stats() -> Response:
+    """
+    Admin endpoint: sampled rejection rate and cost of every rule of the
+    current campaigns, listed in evaluation order
+    """
+    try:
+        campaigns_snapshot: CatalogSnapshot = catalog.snapshot()
+    except CatalogUnavailableError:
+        return jsonify({"error": "Campaigns unavailable"}), 503
+
+    return jsonify({
+        "sampled": matcher_statistics.sampled,
+        "sample_every": matcher_statistics.sample_every,
+        "reorder_every": matcher_statistics.reorder_every,
+        "campaigns": matcher_statistics.report(
+            campaigns_snapshot.campaign_set.campaigns),
+    })
+
+
+@app.route('/admin/catalog/changes', methods=['GET'])
+def get_catalog_changes() -> Response:
+    """
+    Admin endpoint: campaign ids added, changed and removed by each catalog
+    version after ?since=<version>, for incremental consumers
+    """
+    since = request.args.get("since", 0, type=int)
+    try:
+        campaigns_snapshot: CatalogSnapshot = catalog.snapshot()
+        diffs = catalog.changes(since)
+    except CatalogUnavailableError:
+        return jsonify({"error": "Campaigns unavailable"}), 503
+    except LookupError as error:
+        return jsonify({"error": str(error.args[0])}), 410
+
+    return jsonify({
+        "version": campaigns_snapshot.version,
+        "changes": [diff._asdict() for diff in diffs],
+    })
+
+
+class ClientConfig(NamedTuple):
+    """Outcome of get_client_config, shared by coalesced requests"""
+    snapshot: Optional[ProfileSnapshot]
+    catalog_version: int = 0
+    error: Optional[str] = None
+    status: int = 200
+
+
+# Concurrent requests for the same player share one computation
+client_config_calls: SingleFlight[ClientConfig] = SingleFlight('client_config')
+
+
 @app.route('/get_client_config/<player_id>', methods=['GET'])
 def get_client_config(player_id: str) -> Response:
     """API endpoint to get and update a player's profile with matching campaigns"""
+    config = client_config_calls.do(
+        player_id, lambda: _client_config(player_id))
+    if config.error:
+        return jsonify({"error": config.error}), config.status
+
+    # Conditional per request: coalesced clients may hold different ETags
+    return _profile_response(config.snapshot, config.catalog_version)
+
+
+def _client_config(player_id: str) -> ClientConfig:
+    """Match a player with the campaigns and snapshot the updated profile"""
+
+    # Cached profile: served as is unless a new campaign matches it
+    generation = profile_cache.generation(player_id)
+    cached: Optional[ProfileSnapshot] = profile_cache.get(player_id)
+    player: Optional[Player] = None
+
+    if not cached:
+        player = load_player_profile(player_id)
+
+        if not player:
+            return ClientConfig(None, error="Player not found", status=404)
+
+    # Campaigns: validated and compiled by the catalog, off the request path
+    try:
+        campaigns_snapshot: CatalogSnapshot = catalog.snapshot()
+    except CatalogUnavailableError:
+        return ClientConfig(None, error="Campaigns unavailable", status=503)
+
+    if cached:
+        if not campaigns_snapshot.campaign_set.match(cached.view):
+            _record_response_cache(hit=True)
+            return ClientConfig(cached, campaigns_snapshot.version)
+
+        player = load_player_profile(player_id)
+
+        if not player:
+            return ClientConfig(None, error="Player not found", status=404)
+
+    _record_response_cache(hit=False)
+
+    # Match campaigns with player profile
+    matched_campaigns: List[CompiledCampaign] = \
+        campaigns_snapshot.campaign_set.match(PlayerView.from_player(player))
+
+    # Queued if write-behind is enabled and not full, written now otherwise
+    if matched_campaigns and \
+            not assignment_queue.submit({player: matched_campaigns}):
+        assign_campaigns({player: matched_campaigns})
+
+    # Serialize before committing: the commit expires the loaded player
+    snapshot = ProfileSnapshot.create(
+        PlayerView.from_player(player), _encode_profile(player))
+    db.session.commit()
+    # Not cached if a concurrent write invalidated the player since loading
+    profile_cache.put(snapshot, generation, db.session)
+
+    # Updated player profile
+    return ClientConfig(snapshot, campaigns_snapshot.version)
+
 
-    player: Optional[Player] = Player.query.filter_by(
-        player_id=player_id).first()
+def _dump_profile(player: Player) -> Dict[str, Any]:
+    """Serialize a player with the configured PROFILE_SERIALIZER"""
+    if app.config['PROFILE_SERIALIZER'] == 'compiled':
+        return player_serializer.dump(player)
+    return player_schema.dump(player)
 
+
+def _encode_profile(player: Player) -> bytes:
+    """Serialize a player to the response body of get_client_config"""
+    if app.config['PROFILE_SERIALIZER'] == 'compiled':
+        return player_serializer.encode(player_serializer.dump(player))
+    return app.json.response(player_schema.dump(player)).get_data()
+
+
+def _profile_response(
+        snapshot: ProfileSnapshot, catalog_version: int) -> Response:
+    """Respond with an encoded profile, or 304 if the client has it"""
+    response = app.response_class(snapshot.body, mimetype=app.json.mimetype)
+    response.set_etag(snapshot.etag(catalog_version))
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        metrics.incr('response_cache.not_modified')
+    return response
+
+
+def _record_response_cache(hit: bool) -> None:
+    metrics.incr('response_cache.hits' if hit else 'response_cache.misses')
+    hits = metrics.get('response_cache.hits')
+    metrics.set('response_cache.hit_ratio',
+                hits / (hits + metrics.get('response_cache.misses')))
+
+
+@app.route('/get_client_configs', methods=['POST'])
+def get_client_configs_bulk() -> Response:
+    """
+    API endpoint to match and update many players at once.
+
+    Expects a JSON body {"player_ids": [...]} and streams one JSON document
+    per line (NDJSON), in request order.
+    """
+    body = request.get_json(silent=True) or {}
+    player_ids = body.get("player_ids")
+    if not isinstance(player_ids, list) or not all(
+            isinstance(player_id, str) for player_id in player_ids):
+        return jsonify({"error": "player_ids must be a list of strings"}), 400
+
+    try:
+        campaigns_snapshot: CatalogSnapshot = catalog.snapshot()
+    except CatalogUnavailableError:
+        return jsonify({"error": "Campaigns unavailable"}), 503
+
+    def generate():
+        for player_id, data in get_client_configs(
+                player_ids, campaigns_snapshot.campaign_set,
+                dump=_dump_profile):
+            if data is None:
+                line = {"player_id": player_id, "error": "Player not found"}
+            else:
+                line = {"player_id": player_id, "profile": data}
+            yield app.json.dumps(line) + "\n"
+
+    return Response(
+        stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/players/<player_id>', methods=['PATCH'])
+def update_player(player_id: str) -> Response:
+    """
+    API endpoint reporting a change of a player's state.
+
+    Expects a JSON body with the new values of changed attributes (level,
+    xp, country, language, total_spent, clan_id, last_session) and an
+    "items" object of new quantities by item key. Only the campaigns
+    reading a changed attribute are re-evaluated; the newly assigned ones
+    are returned.
+    """
+    try:
+        delta: Dict[str, Any] = player_delta_schema.load(
+            request.get_json(silent=True) or {})
+    except ValidationError as error:
+        return jsonify({"error": error.messages}), 400
+
+    player: Optional[Player] = load_player_profile(player_id)
     if not player:
         return jsonify({"error": "Player not found"}), 404
 
-    # Mocked campaigns: deserialized for validation
-    active_campaigns: List[Dict[str, Any]] = api_campaigns_schema.load(
-        get_active_campaigns())
+    try:
+        campaigns_snapshot: CatalogSnapshot = catalog.snapshot()
+    except CatalogUnavailableError:
+        return jsonify({"error": "Campaigns unavailable"}), 503
 
-    # Match campaigns with player profile
-    matched_campaigns: List[Dict[str, Any]] = [
-        campaign
-        for campaign in active_campaigns
-        if filter_eligible_campaigns(player, campaign)]
-
-    if matched_campaigns:
-        campaigns: List[Campaign] = [
-            Campaign(
-                campaign_id=campaign['id'],
-                name=campaign['name']) for campaign in matched_campaigns]
-        player.campaigns.extend(campaigns)
-        db.session.commit()
-
-    # Return updated player profile
-    return jsonify(player_schema.dump(player))
+    try:
+        assigned: List[CompiledCampaign] = apply_player_delta(
+            player, delta, campaigns_snapshot.campaign_set)
+    except LookupError as error:
+        db.session.rollback()
+        return jsonify({"error": str(error.args[0])}), 400
+    db.session.commit()
+
+    return jsonify({
+        "player_id": player_id,
+        "assigned": [
+            {"campaign_id": campaign.campaign_id, "name": campaign.name}
+            for campaign in assigned],
+    })
+
+
+@app.route('/campaigns/<campaign_id>/players', methods=['GET'])
+def get_campaign_players(campaign_id: str) -> Response:
+    """
+    API endpoint listing the players assigned to a campaign.
+
+    Query parameters: after (player_id cursor, exclusive), limit and format.
+    The default json format answers one page and the cursor of the next one
+    ("next", null on the last page); ndjson and csv stream every player
+    after the cursor.
+    """
+    output = request.args.get("format", "json")
+    after = request.args.get("after")
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    if output not in ("json", "ndjson", "csv"):
+        return jsonify({"error": "format must be json, ndjson or csv"}), 400
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        return jsonify(
+            {"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    if not _campaign_exists(campaign_id):
+        return jsonify({"error": "Campaign not found"}), 404
+
+    if output == "json":
+        players = campaign_players(campaign_id, after, limit)
+        metrics.incr('campaign_players.rows', len(players))
+        return jsonify({
+            "campaign_id": campaign_id,
+            "players": players,
+            "next": players[-1] if len(players) == limit else None,
+        })
+
+    def generate_ndjson():
+        for page in iter_campaign_players(campaign_id, after, limit):
+            metrics.incr('campaign_players.rows', len(page))
+            yield "".join(
+                app.json.dumps({"player_id": player_id}) + "\n"
+                for player_id in page)
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(["player_id"])
+        for page in iter_campaign_players(campaign_id, after, limit):
+            metrics.incr('campaign_players.rows', len(page))
+            writer.writerows([player_id] for player_id in page)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    if output == "csv":
+        return Response(
+            stream_with_context(generate_csv()), mimetype='text/csv',
+            headers={"Content-Disposition":
+                     f'attachment; filename="{campaign_id}-players.csv"'})
+    return Response(
+        stream_with_context(generate_ndjson()),
+        mimetype='application/x-ndjson')
+
+
+@app.route('/campaigns/<campaign_id>/players/count', methods=['GET'])
+def get_campaign_player_count(campaign_id: str) -> Response:
+    """API endpoint counting the players assigned to a campaign"""
+    if not _campaign_exists(campaign_id):
+        return jsonify({"error": "Campaign not found"}), 404
+    return jsonify({
+        "campaign_id": campaign_id,
+        "players": campaign_player_total(campaign_id),
+    })
+
+
+def _campaign_exists(campaign_id: str) -> bool:
+    """Whether a campaign is in the catalog or was assigned at some point
+
+    The catalog is read as it is: audiences never wait for it to load.
+    """
+    current = catalog.current()
+    campaigns = current.campaign_set.campaigns if current else ()
+    return any(campaign.campaign_id == campaign_id for campaign in campaigns) \
+        or campaign_known(campaign_id)
@@ -0,0 +1,315 @@
+"""
+ASGI entry point serving the routes of the Flask application.
+
+Serve with any ASGI server, e.g. ``uvicorn app.asgi:application``.
+
+The event loop never blocks on the campaign API or on SQLite:
+- the campaign catalog is fetched by an asyncio task, in a dedicated thread,
+  with a timeout; a slow or failing API leaves the last snapshot in place
+  and requests needing campaigns fail fast with 503 until one is loaded.
+  Routes never load the catalog nor start its refresh thread themselves
+- each request runs the Flask route in a bounded pool of worker threads,
+  streaming the response back to the event loop chunk by chunk
+- concurrent get_client_config requests for the same player share a single
+  route call; each request then gets its own conditional (ETag) answer
+"""
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple)
+from flask import Flask
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_etags, remove_entity_headers, unquote_etag
+from .app import app as flask_app
+from .catalog import CampaignCatalog, catalog as campaign_catalog
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+CLIENT_CONFIG_PREFIX = '/get_client_config/'
+# Routes answering 503 while no campaign catalog could be loaded
+CATALOG_ROUTES = (
+    CLIENT_CONFIG_PREFIX, '/get_client_configs', '/admin/matcher_stats',
+    '/admin/catalog/changes', '/players/')
+UNAVAILABLE = b'{"error":"Campaigns unavailable"}\n'
+
+
+class BufferedResponse(NamedTuple):
+    """Complete response of a route call"""
+    status: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+
+
+class ProfileASGIApp:
+    """ASGI application running the Flask routes off the event loop"""
+
+    def __init__(self, app: Flask, catalog: CampaignCatalog,
+                 workers: Optional[int] = None,
+                 fetch_timeout: Optional[float] = None) -> None:
+        """
+        Args:
+            app: Flask application whose routes are served
+            catalog: Campaign catalog used by the routes
+            workers: Size of the request thread pool, defaults to the
+                ASGI_WORKERS setting
+            fetch_timeout: Seconds allowed to one campaign catalog fetch,
+                defaults to the CAMPAIGN_FETCH_TIMEOUT setting
+        """
+        self.app = app
+        self.catalog = catalog
+        # Loaded by startup and the 503 gate, with a timeout
+        self._load_on_demand = catalog.load_on_demand
+        catalog.load_on_demand = False
+        self.fetch_timeout = float(
+            fetch_timeout if fetch_timeout is not None
+            else app.config['CAMPAIGN_FETCH_TIMEOUT'])
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or int(app.config['ASGI_WORKERS']),
+            thread_name_prefix='asgi-worker')
+        # The catalog fetch must not wait behind requests for a thread
+        self._fetch_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='campaign-fetch')
+        self._fetch: Optional[Future] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def startup(self) -> None:
+        """Load the campaign catalog and start refreshing it periodically"""
+        await self.refresh_catalog()
+        interval = self.catalog.refresh_interval
+        if interval > 0 and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(
+                self._refresh_periodically(interval))
+
+    async def shutdown(self) -> None:
+        """Stop refreshing the campaign catalog"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    def close(self) -> None:
+        """Release the worker threads"""
+        self.catalog.load_on_demand = self._load_on_demand
+        self.executor.shutdown(wait=True)
+        self._fetch_executor.shutdown(wait=False)
+
+    async def refresh_catalog(self) -> bool:
+        """
+        Refresh the campaign catalog, waiting at most fetch_timeout.
+
+        Concurrent callers share the fetch in progress. A fetch that times
+        out keeps running in its thread and may still publish a snapshot.
+
+        Returns:
+            bool: True if the catalog was refreshed in time
+        """
+        if self._fetch is None or self._fetch.done():
+            self._fetch = self._fetch_executor.submit(self.catalog.refresh)
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(self._fetch)),
+                self.fetch_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Campaign API fetch timed out after %.1fs",
+                           self.fetch_timeout)
+            metrics.incr('catalog.fetch_timeouts')
+            return False
+
+    async def _refresh_periodically(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh_catalog()
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope: Scope, receive: Receive,
+                    send: Send) -> None:
+        path: str = scope['path']
+        if path.startswith(CATALOG_ROUTES) and not self.catalog.loaded \
+                and not (await self.refresh_catalog() and self.catalog.loaded):
+            await _send_buffered(send, BufferedResponse(
+                503, [('Content-Type', 'application/json'),
+                      ('Content-Length', str(len(UNAVAILABLE)))],
+                UNAVAILABLE))
+            return
+
+        body = await _read_body(receive)
+        if scope['method'] == 'GET' and path.startswith(CLIENT_CONFIG_PREFIX):
+            response = await self._client_config(scope)
+            await _send_buffered(send, _conditional(scope, response))
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = loop.run_in_executor(
+            self.executor, self._call_flask, _environ(scope, body),
+            lambda message: loop.call_soon_threadsafe(
+                queue.put_nowait, message))
+        while True:
+            message = await queue.get()
+            if message is None:
+                break
+            await send(message)
+        await done
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _client_config(self, scope: Scope) -> BufferedResponse:
+        """Call get_client_config, once for concurrent identical requests
+
+        The shared call is made without conditional headers, so that every
+        request can be answered with respect to its own If-None-Match.
+        """
+        key = scope['path']
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            metrics.incr('asgi.coalesced')
+            return await asyncio.shield(shared)
+
+        environ = _environ(scope, b'')
+        environ.pop('HTTP_IF_NONE_MATCH', None)
+        shared = asyncio.get_running_loop().run_in_executor(
+            self.executor, self._call_flask_buffered, environ)
+        self._in_flight[key] = shared
+        shared.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(shared)
+
+    def _call_flask(self, environ: Dict[str, Any],
+                    emit: Callable[[Optional[Dict[str, Any]]], None]) -> None:
+        """Run the Flask application, emitting ASGI response messages"""
+        def start_response(status: str, headers: List[Tuple[str, str]],
+                           exc_info: Any = None) -> Callable[[bytes], None]:
+            emit({'type': 'http.response.start',
+                  'status': int(status.split(' ', 1)[0]),
+                  'headers': [(name.lower().encode('latin-1'),
+                               value.encode('latin-1'))
+                              for name, value in headers]})
+            return lambda data: emit({
+                'type': 'http.response.body', 'body': data,
+                'more_body': True})
+
+        try:
+            iterable = self.app(environ, start_response)
+            try:
+                for chunk in iterable:
+                    if chunk:
+                        emit({'type': 'http.response.body', 'body': chunk,
+                              'more_body': True})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        finally:
+            emit(None)
+
+    def _call_flask_buffered(
+            self, environ: Dict[str, Any]) -> BufferedResponse:
+        messages: List[Dict[str, Any]] = []
+        self._call_flask(environ, lambda m: m and messages.append(m))
+        start, chunks = messages[0], messages[1:]
+        return BufferedResponse(
+            status=start['status'],
+            headers=[(name.decode('latin-1'), value.decode('latin-1'))
+                     for name, value in start['headers']],
+            body=b''.join(chunk['body'] for chunk in chunks))
+
+
+def _environ(scope: Scope, body: bytes) -> Dict[str, Any]:
+    """WSGI environ of an ASGI HTTP request"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ: Dict[str, Any] = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', ()):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        if name == 'CONTENT_TYPE':
+            environ[name] = value
+            continue
+        key = 'HTTP_' + name
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    # The body was read whole, chunked or not
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+def _conditional(scope: Scope, response: BufferedResponse
+                 ) -> BufferedResponse:
+    """Turn a 200 into a 304 when the request's If-None-Match holds the ETag
+    of the response, as Response.make_conditional does"""
+    if response.status != 200:
+        return response
+    request_headers = Headers(
+        [(name.decode('latin-1'), value.decode('latin-1'))
+         for name, value in scope.get('headers', ())])
+    if_none_match = request_headers.get('If-None-Match')
+    headers = Headers(response.headers)
+    etag = headers.get('ETag')
+    if not if_none_match or not etag or \
+            not parse_etags(if_none_match).contains_weak(
+                unquote_etag(etag)[0]):
+        return response
+    metrics.incr('response_cache.not_modified')
+    remove_entity_headers(headers)
+    return BufferedResponse(304, headers.to_wsgi_list(), b'')
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks: List[bytes] = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _send_buffered(send: Send, response: BufferedResponse) -> None:
+    await send({
+        'type': 'http.response.start',
+        'status': response.status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers]})
+    await send({'type': 'http.response.body', 'body': response.body})
+
+
+# Process-wide ASGI application
+application = ProfileASGIApp(flask_app, campaign_catalog)
@@ -0,0 +1,78 @@
+"""
+Reverse lookups: the players assigned to a campaign.
+
+Audiences are read from player_campaign in player_id order, with keyset
+pagination on its (campaign_id, player_id) index: a page costs one index
+range search whatever its position, and a full export is streamed page by
+page without holding the list in memory. Counts come from
+campaign_player_count, kept up to date by triggers on player_campaign.
+"""
+from typing import Iterator, List, Optional
+from sqlalchemy import select
+from .models import db, Campaign, campaign_player_count, player_campaign
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+
+def campaign_known(campaign_id: str) -> bool:
+    """Whether a campaign was ever stored, i.e. assigned"""
+    return db.session.execute(
+        select(Campaign.id).where(Campaign.campaign_id == campaign_id)
+    ).first() is not None
+
+
+def campaign_players(campaign_id: str, after: Optional[str] = None,
+                     limit: int = DEFAULT_PAGE_SIZE) -> List[str]:
+    """
+    One page of the players assigned to a campaign.
+
+    Args:
+        campaign_id: Public identifier of the campaign
+        after: Last player_id of the previous page, None for the first one
+        limit: Maximum number of players
+
+    Returns:
+        List[str]: Player identifiers, in ascending order
+    """
+    statement = select(player_campaign.c.player_id).where(
+        player_campaign.c.campaign_id == campaign_id)
+    if after is not None:
+        statement = statement.where(player_campaign.c.player_id > after)
+    return list(db.session.scalars(
+        statement.order_by(player_campaign.c.player_id).limit(limit)))
+
+
+def iter_campaign_players(campaign_id: str, after: Optional[str] = None,
+                          page_size: int = DEFAULT_PAGE_SIZE
+                          ) -> Iterator[List[str]]:
+    """
+    Every player assigned to a campaign, page by page.
+
+    Each page is read in a transaction of its own: a long export does not
+    keep a read transaction open, which would hold back WAL checkpoints.
+
+    Args:
+        campaign_id: Public identifier of the campaign
+        after: Only players with a greater player_id are returned
+        page_size: Number of players per query
+
+    Yields:
+        List[str]: Non-empty pages of player identifiers, in ascending order
+    """
+    while True:
+        page = campaign_players(campaign_id, after, page_size)
+        db.session.rollback()
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after = page[-1]
+
+
+def campaign_player_total(campaign_id: str) -> int:
+    """Number of players assigned to a campaign, from its counter"""
+    return db.session.scalar(
+        select(campaign_player_count.c.players).where(
+            campaign_player_count.c.campaign_id == campaign_id)) or 0
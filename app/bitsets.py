@@ -0,0 +1,93 @@
+"""
+Bitset encoding of item ownership.
+
+Item names are mapped to dense bit positions by a process-wide, append-only
+dictionary. A player's owned items then fit in one Python int and campaign
+item rules compile to masks: "has all" is (owned & required) == required and
+"has any" is owned & excluded != 0.
+"""
+import sys
+from threading import Lock
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+WORD_BITS = 64
+WORD_MASK = (1 << WORD_BITS) - 1
+
+
+class ItemDictionary:
+    """Append-only mapping of item names to bit positions
+
+    Items are identified by name, as in campaign matchers.
+    """
+
+    def __init__(self) -> None:
+        self._positions: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def position(self, name: str) -> int:
+        """Return the bit position of an item name, allocating it if new
+
+        Positions are never reused or moved, so masks and bitsets built at
+        different times stay comparable.
+        """
+        position = self._positions.get(name)
+        if position is None:
+            with self._lock:
+                position = self._positions.setdefault(
+                    name, len(self._positions))
+        return position
+
+    def get(self, name: str) -> Optional[int]:
+        """Return the bit position of an item name, or None if unknown"""
+        return self._positions.get(name)
+
+    def mask(self, names: Iterable[str]) -> int:
+        """Encode item names as a bitset (also used for owned items)"""
+        mask = 0
+        for name in names:
+            mask |= 1 << self.position(name)
+        return mask
+
+    def footprint(self, players: int = 1000000) -> Dict[str, int]:
+        """Estimate the bytes needed to hold the bitsets of many players
+
+        Args:
+            players: Number of players
+
+        Returns:
+            Dict[str, int]: Number of known items, and bytes for packed
+            uint64 words (columnar) and for worst-case Python ints (online)
+        """
+        positions = max(1, len(self))
+        return {
+            "items": len(self),
+            "packed_bytes": players * 8 * -(-positions // 64),
+            "int_bytes": players * sys.getsizeof(1 << (positions - 1)),
+        }
+
+    def names(self, mask: int) -> Iterator[str]:
+        """Decode a bitset back to item names"""
+        by_position = {p: name for name, p in self._positions.items()}
+        position = 0
+        while mask:
+            if mask & 1:
+                yield by_position[position]
+            mask >>= 1
+            position += 1
+
+
+def words(bitset: int) -> Iterator[Tuple[int, int]]:
+    """Split a bitset into its non-zero 64-bit words, lowest first"""
+    word = 0
+    while bitset:
+        if bitset & WORD_MASK:
+            yield word, bitset & WORD_MASK
+        bitset >>= WORD_BITS
+        word += 1
+
+
+# Process-wide dictionary shared by the online and batch matching paths
+item_dictionary = ItemDictionary()
@@ -1,7 +1,7 @@
 """
 Mock campaigns: fake API.
 """
-from typing import Dict, Any, List, Union
+from typing import Dict, Any, List, Optional, Union
 
 
 def create_campaign(
@@ -12,7 +12,10 @@ def create_campaign(
     countries: List[str] = [],
     required_items: List[str] = [],
     excluded_items: List[str] = [],
-    enabled: bool = True
+    enabled: bool = True,
+    start_date: str = "2024-01-25 00:00:00Z",
+    end_date: str = "2026-02-25 00:00:00Z",
+    last_updated: str = "2024-07-13 11:46:58Z"
 ) -> Dict[str, Any]:
     return {
         "id": campaign_id,
@@ -32,10 +35,10 @@ def create_campaign(
                 "items": excluded_items
             },
         },
-        "start_date": "2024-01-25 00:00:00Z",
-        "end_date": "2026-02-25 00:00:00Z",
+        "start_date": start_date,
+        "end_date": end_date,
         "enabled": enabled,
-        "last_updated": "2024-07-13 11:46:58Z"
+        "last_updated": last_updated
     }
 
 
@@ -55,3 +58,22 @@ def get_active_campaigns() -> List[Dict[str, Any]]:
             excluded_items=["Item 4"]
         )
     ]
+
+
+class CampaignAPIStub:
+    """
+    Local stand-in for the campaign API.
+    Serves a mutable list of campaigns, counts calls and can simulate outages.
+    """
+
+    def __init__(
+            self, campaigns: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.campaigns: List[Dict[str, Any]] = list(campaigns or [])
+        self.calls: int = 0
+        self.failing: bool = False
+
+    def __call__(self) -> List[Dict[str, Any]]:
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError("Campaign API unavailable")
+        return [dict(campaign) for campaign in self.campaigns]
@@ -0,0 +1,299 @@
+"""
+Campaign catalog: cached, periodically refreshed view of the campaign API.
+
+Campaigns are fetched and validated off the request path, compiled once,
+and published as an immutable snapshot that request handlers read without
+locking. Each refresh diffs the new list against the previous one by id and
+last_updated: only added and changed campaigns are validated and compiled
+again, and the diff is kept in a bounded history (changes) so consumers
+such as the re-match job can process only what changed. When the upstream
+API fails, the last good snapshot keeps being served and the failure is
+reported through the catalog.* metrics. While the refresh thread runs, a
+timer also refreshes the active campaigns of the current snapshot when one
+starts or ends.
+"""
+import logging
+import time
+from collections import deque
+from threading import Event, Lock, Thread
+from typing import (
+    Callable, Deque, Dict, Any, List, Optional, NamedTuple, Tuple)
+from marshmallow import ValidationError
+from .campaigns import get_active_campaigns
+from .engine import (
+    CompiledCampaign, CompiledCampaignSet, Selection, compile_campaign)
+from .metrics import metrics
+from .schedule import Clock
+from .schemas import api_campaign_schema
+
+logger = logging.getLogger(__name__)
+
+Fetcher = Callable[[], List[Dict[str, Any]]]
+
+
+class CatalogUnavailableError(RuntimeError):
+    """Raised when no campaign snapshot has ever been loaded"""
+
+
+# Number of diffs kept for changes()
+DIFF_HISTORY = 1000
+
+
+class CatalogDiff(NamedTuple):
+    """Campaign ids added, changed (new last_updated) and removed by the
+    snapshot of a version"""
+    version: int
+    added: Tuple[str, ...] = ()
+    changed: Tuple[str, ...] = ()
+    removed: Tuple[str, ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+class CatalogSnapshot(NamedTuple):
+    """Immutable, validated and compiled state of the campaign catalog"""
+    version: int
+    campaigns: Tuple[Dict[str, Any], ...]
+    campaign_set: CompiledCampaignSet
+    loaded_at: float
+    # Changes from the previous snapshot; everything is added in version 1
+    diff: Optional[CatalogDiff] = None
+
+
+class CampaignCatalog:
+    """Campaign catalog extension, refreshed in a background thread"""
+
+    def __init__(self, fetcher: Fetcher = get_active_campaigns,
+                 refresh_interval: float = 60.0,
+                 clock: Optional[Clock] = None) -> None:
+        self.fetcher: Fetcher = fetcher
+        self.refresh_interval: float = refresh_interval
+        self.clock: Optional[Clock] = clock
+        self.selection: Selection = Selection()
+        # Whether snapshot() loads the catalog when none was loaded yet
+        self.load_on_demand: bool = True
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._validated: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        self._compiled: Dict[Tuple[Any, Any], CompiledCampaign] = {}
+        self._keys: List[Tuple[Any, Any]] = []
+        self._diffs: Deque[CatalogDiff] = deque(maxlen=DIFF_HISTORY)
+        self._stale: bool = False
+        self._refresh_lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+        self._listeners: List[Callable[[CatalogSnapshot], None]] = []
+
+    def init_app(self, app: Any) -> None:
+        """Read the catalog configuration from a Flask app
+
+        Args:
+            app: Flask application; CAMPAIGN_REFRESH_INTERVAL is the refresh
+                period in seconds (0 disables background refresh),
+                CAMPAIGN_TOP_K and CAMPAIGN_PLAYER_CAP the Selection of
+                the compiled campaign sets
+        """
+        app.config.setdefault('CAMPAIGN_REFRESH_INTERVAL', 60.0)
+        self.refresh_interval = float(app.config['CAMPAIGN_REFRESH_INTERVAL'])
+        self.selection = Selection(
+            top_k=int(app.config.get('CAMPAIGN_TOP_K', 0)),
+            player_cap=int(app.config.get('CAMPAIGN_PLAYER_CAP', 0)))
+        app.extensions['campaign_catalog'] = self
+
+    def subscribe(self, listener: Callable[[CatalogSnapshot], None]) -> None:
+        """Call listener with every newly published snapshot
+
+        Args:
+            listener: Callback, run in the refreshing thread
+        """
+        self._listeners.append(listener)
+
+    def changes(self, since: int) -> List[CatalogDiff]:
+        """
+        Return the diffs of the snapshots published after a version.
+
+        Args:
+            since: Last version the caller processed, 0 for none
+
+        Returns:
+            List[CatalogDiff]: Diffs in version order, empty if up to date
+
+        Raises:
+            LookupError: If diffs after since were dropped from the history,
+                or since is ahead of the current version, as after a
+                restart (versions are numbered by each process); the caller
+                has to process the whole catalog again
+        """
+        snapshot = self._snapshot
+        version = snapshot.version if snapshot is not None else 0
+        if since > version:
+            raise LookupError(
+                f"Catalog version {since} is ahead of version {version}")
+        diffs = list(self._diffs)
+        if diffs and since < diffs[0].version - 1:
+            raise LookupError(
+                f"Catalog changes since version {since} are not retained")
+        return [diff for diff in diffs if diff.version > since]
+
+    @property
+    def stale(self) -> bool:
+        """True when the last refresh attempt failed"""
+        return self._stale
+
+    @property
+    def loaded(self) -> bool:
+        """Whether a snapshot was loaded, without loading one"""
+        return self._snapshot is not None
+
+    def current(self) -> Optional[CatalogSnapshot]:
+        """Return the current snapshot, None if none was loaded, without
+        loading one"""
+        return self._snapshot
+
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        Return the current catalog snapshot.
+
+        Unless load_on_demand was turned off, by a server owning the
+        refreshes, loads the catalog synchronously on first use and starts
+        the background refresh thread.
+
+        Returns:
+            CatalogSnapshot: Last successfully loaded snapshot
+
+        Raises:
+            CatalogUnavailableError: If no snapshot could ever be loaded
+        """
+        snapshot = self._snapshot
+        if snapshot is None and self.load_on_demand:
+            self.refresh()
+            self.start()
+            snapshot = self._snapshot
+        if snapshot is None:
+            raise CatalogUnavailableError("Campaign catalog unavailable")
+
+        if self._stale:
+            metrics.incr('catalog.stale_reads')
+        return snapshot
+
+    def refresh(self) -> bool:
+        """
+        Fetch, validate and compile the campaigns, then publish a snapshot.
+
+        Campaigns whose (id, last_updated) pair was already seen are not
+        validated nor compiled again. A new snapshot version is only
+        published when the campaign list changed, with its diff.
+
+        Returns:
+            bool: True if the fetch succeeded, False otherwise
+        """
+        with self._refresh_lock:
+            try:
+                raw_campaigns = self.fetcher()
+            except Exception:
+                logger.exception(
+                    "Campaign API fetch failed, serving stale data")
+                self._stale = True
+                metrics.incr('catalog.refresh_failures')
+                metrics.set('catalog.stale', 1)
+                return False
+
+            keys: List[Tuple[Any, Any]] = []
+            validated: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+            for raw in raw_campaigns:
+                key = (raw.get('id'), raw.get('last_updated'))
+                campaign = self._validated.get(key)
+                if campaign is None:
+                    try:
+                        campaign = api_campaign_schema.load(raw)
+                    except ValidationError as error:
+                        logger.warning(
+                            "Skipping invalid campaign %s: %s",
+                            raw.get('id'), error.messages)
+                        metrics.incr('catalog.invalid_campaigns')
+                        continue
+                    metrics.incr('catalog.campaigns_parsed')
+                keys.append(key)
+                validated[key] = campaign
+            self._validated = validated
+
+            current = self._snapshot
+            if current is None or keys != self._keys:
+                version = current.version + 1 if current else 1
+                diff = self._diff(version, keys)
+                self._compiled = {
+                    key: self._compiled.get(key) or self._compile(
+                        validated[key]) for key in keys}
+                self._keys = keys
+                # Single reference assignment: readers see either snapshot
+                self._snapshot = CatalogSnapshot(
+                    version=version,
+                    campaigns=tuple(validated[key] for key in keys),
+                    campaign_set=CompiledCampaignSet.from_compiled(
+                        (self._compiled[key] for key in keys),
+                        clock=self.clock, selection=self.selection),
+                    loaded_at=time.time(),
+                    diff=diff)
+                self._diffs.append(diff)
+                if self._thread is not None:
+                    self._snapshot.campaign_set.schedule.start()
+                if current is not None:
+                    current.campaign_set.schedule.stop()
+                metrics.set('catalog.version', self._snapshot.version)
+                metrics.set('catalog.campaigns', len(keys))
+                metrics.incr('catalog.diff.added', len(diff.added))
+                metrics.incr('catalog.diff.changed', len(diff.changed))
+                metrics.incr('catalog.diff.removed', len(diff.removed))
+                for listener in self._listeners:
+                    listener(self._snapshot)
+
+            self._stale = False
+            metrics.set('catalog.stale', 0)
+            metrics.incr('catalog.refreshes')
+            return True
+
+    def _diff(self, version: int, keys: List[Tuple[Any, Any]]) -> CatalogDiff:
+        before = dict(self._keys)
+        after = dict(keys)
+        return CatalogDiff(
+            version=version,
+            added=tuple(campaign_id for campaign_id in after
+                        if campaign_id not in before),
+            changed=tuple(campaign_id for campaign_id, updated in after.items()
+                          if campaign_id in before
+                          and before[campaign_id] != updated),
+            removed=tuple(campaign_id for campaign_id in before
+                          if campaign_id not in after))
+
+    @staticmethod
+    def _compile(campaign: Dict[str, Any]) -> CompiledCampaign:
+        metrics.incr('catalog.campaigns_compiled')
+        return compile_campaign(campaign)
+
+    def start(self) -> None:
+        """Start the background refresh thread, if configured and not running"""
+        if self.refresh_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(
+            target=self._run, name='campaign-catalog', daemon=True)
+        self._thread.start()
+        if self._snapshot is not None:
+            self._snapshot.campaign_set.schedule.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh thread and the schedule timer"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._snapshot is not None:
+            self._snapshot.campaign_set.schedule.stop()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+
+# Process-wide catalog, configured by init_app
+catalog = CampaignCatalog()
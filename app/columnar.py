@@ -0,0 +1,287 @@
+"""
+Columnar, vectorized campaign matching over many players at once.
+
+Player attributes are stored as NumPy columns: levels, dictionary-encoded
+countries and packed item ownership bitsets (the app.bitsets positions, 64
+items per uint64 word); columns of the other matched attributes are built
+from the player views on first use. Each campaign is evaluated as a handful
+of boolean mask operations across all players instead of one Python call per
+player.
+
+NumPy is an optional dependency, only needed for this module.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from .bitsets import WORD_BITS, item_dictionary, words
+from .engine import (
+    CompiledCampaign, CompiledCampaignSet, PlayerView, priority_key)
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("Columnar matching requires numpy to be installed")
+
+
+class PlayerColumns:
+    """Column-oriented snapshot of the matching attributes of many players"""
+
+    def __init__(
+            self,
+            player_ids: Sequence[str],
+            levels: 'np.ndarray',
+            has_level: 'np.ndarray',
+            country_codes: 'np.ndarray',
+            countries: Dict[str, int],
+            item_bits: 'np.ndarray',
+            assigned: Optional[Dict[str, 'np.ndarray']] = None,
+            views: Optional[Sequence[PlayerView]] = None) -> None:
+        """
+        Args:
+            player_ids: Public identifiers, one per row
+            levels: int64 levels (meaningless where has_level is False)
+            has_level: bool, False for players without a level
+            country_codes: int32 codes into countries, -1 for no country
+            countries: Country dictionary, country to code
+            item_bits: uint64 array of shape (players, words) holding the
+                owned item bitsets, word 0 being the lowest 64 positions
+            assigned: Row indices of the players assigned to each campaign
+            views: PlayerView of each row, source of the columns of the
+                other attributes
+        """
+        _require_numpy()
+        self.player_ids = list(player_ids)
+        self.levels = levels
+        self.has_level = has_level
+        self.country_codes = country_codes
+        self.countries = countries
+        self.item_bits = item_bits
+        self.assigned: Dict[str, 'np.ndarray'] = assigned or {}
+        self.views = views
+        self._columns: Dict[Tuple[str, str], Any] = {
+            ('numeric', 'level'): (levels, has_level),
+            ('categorical', 'country'): (country_codes, countries),
+        }
+
+    def __len__(self) -> int:
+        return len(self.player_ids)
+
+    def _column(self, kind: str, attribute: str) -> Any:
+        column = self._columns.get((kind, attribute))
+        if column is None:
+            if self.views is None:
+                raise ValueError(
+                    f"No {attribute} column: columns were not built from "
+                    "player views")
+            values = [getattr(view, attribute) for view in self.views]
+            column = getattr(self, f'_build_{kind}')(values)
+            self._columns[(kind, attribute)] = column
+        return column
+
+    def numeric(self, attribute: str) -> Tuple['np.ndarray', 'np.ndarray']:
+        """Values of a numeric (or datetime, as UTC epoch seconds)
+        attribute, and whether each row has one"""
+        return self._column('numeric', attribute)
+
+    def categorical(self, attribute: str
+                    ) -> Tuple['np.ndarray', Dict[Any, int]]:
+        """Dictionary codes of a single-valued attribute (-1 for None) and
+        the dictionary, value to code"""
+        return self._column('categorical', attribute)
+
+    def sets(self, attribute: str) -> List[FrozenSet[Any]]:
+        """Values of a set-valued attribute, one frozenset per row"""
+        return self._column('sets', attribute)
+
+    @staticmethod
+    def _build_numeric(values: List[Any]) -> Tuple['np.ndarray', 'np.ndarray']:
+        present = np.fromiter(
+            (value is not None for value in values), dtype=bool,
+            count=len(values))
+        numbers = np.zeros(len(values), dtype=np.float64)
+        for row, value in enumerate(values):
+            if value is None:
+                continue
+            if isinstance(value, datetime):
+                if value.tzinfo is None:
+                    value = value.replace(tzinfo=timezone.utc)
+                value = value.timestamp()
+            numbers[row] = value
+        return numbers, present
+
+    @staticmethod
+    def _build_categorical(values: List[Any]
+                           ) -> Tuple['np.ndarray', Dict[Any, int]]:
+        dictionary: Dict[Any, int] = {}
+        codes = np.fromiter(
+            (-1 if value is None
+             else dictionary.setdefault(value, len(dictionary))
+             for value in values), dtype=np.int32, count=len(values))
+        return codes, dictionary
+
+    @staticmethod
+    def _build_sets(values: List[Any]) -> List[FrozenSet[Any]]:
+        return [frozenset(value) for value in values]
+
+    @classmethod
+    def from_views(cls, views: Iterable[PlayerView]) -> 'PlayerColumns':
+        """
+        Build columns from player views.
+
+        Args:
+            views: PlayerView of each player, in row order
+
+        Returns:
+            PlayerColumns: Columnar snapshot of the views
+        """
+        _require_numpy()
+        views = list(views)
+        countries: Dict[str, int] = {}
+        for view in views:
+            if view.country is not None:
+                countries.setdefault(view.country, len(countries))
+
+        count = len(views)
+        word_count = max(1, -(-len(item_dictionary) // WORD_BITS))
+        levels = np.zeros(count, dtype=np.int64)
+        has_level = np.zeros(count, dtype=bool)
+        country_codes = np.full(count, -1, dtype=np.int32)
+        item_bits = np.zeros((count, word_count), dtype=np.uint64)
+        assigned: Dict[str, List[int]] = {}
+
+        for row, view in enumerate(views):
+            if view.level is not None:
+                levels[row] = view.level
+                has_level[row] = True
+            if view.country is not None:
+                country_codes[row] = countries[view.country]
+            for word, bits in words(view.item_bits):
+                item_bits[row, word] = bits
+            for campaign_id in view.campaign_ids:
+                assigned.setdefault(campaign_id, []).append(row)
+
+        return cls(
+            [view.player_id for view in views], levels, has_level,
+            country_codes, countries, item_bits,
+            {campaign_id: np.asarray(rows, dtype=np.int64)
+             for campaign_id, rows in assigned.items()},
+            views)
+
+
+def evaluate_campaign(
+        columns: PlayerColumns,
+        campaign: CompiledCampaign,
+        now: Optional[datetime] = None) -> 'np.ndarray':
+    """
+    Evaluate a campaign's matchers for every player at once.
+
+    Equivalent to CompiledCampaign.matches (and therefore to
+    services.check_player_matches_campaign_criteria) applied to each row.
+    Rules run in the campaign's order and evaluation stops once no row is
+    left.
+
+    Args:
+        columns: Columnar snapshot of the players
+        campaign: Compiled campaign
+        now: Reference time of time-based rules
+
+    Returns:
+        np.ndarray: Boolean mask of the matching rows
+    """
+    mask = np.ones(len(columns), dtype=bool)
+    for rule in campaign.rules:
+        mask &= rule.test_columns(columns, now)
+        if not mask.any():
+            break
+    return mask
+
+
+def match_columns(
+        columns: PlayerColumns,
+        campaign_set: CompiledCampaignSet,
+        now: Optional[datetime] = None) -> Dict[str, 'np.ndarray']:
+    """
+    Return, for each active campaign, the rows newly eligible to it.
+
+    Equivalent to CompiledCampaignSet.match applied to each row. With a
+    selection, the active campaigns of the set's scope are walked in
+    priority order: each row keeps a quota of remaining assignments, which
+    the campaigns it holds use up as they are passed, and evaluation stops
+    once every quota is exhausted.
+
+    Args:
+        columns: Columnar snapshot of the players
+        campaign_set: Compiled campaigns
+        now: Evaluation time, defaults to the schedule clock
+
+    Returns:
+        Dict[str, np.ndarray]: Sorted row indices keyed by campaign_id;
+        campaigns without eligible players are absent
+    """
+    if now is None:
+        now = campaign_set.now()
+
+    active = campaign_set.active(now)
+    if campaign_set.selection:
+        return _match_selected(columns, campaign_set, active, now)
+
+    result: Dict[str, 'np.ndarray'] = {}
+    for campaign in active:
+        rows = np.flatnonzero(_eligible(columns, campaign, now))
+        if len(rows):
+            result[campaign.campaign_id] = rows
+    return result
+
+
+def _eligible(columns: PlayerColumns, campaign: CompiledCampaign,
+              now: datetime) -> 'np.ndarray':
+    mask = evaluate_campaign(columns, campaign, now)
+    assigned = columns.assigned.get(campaign.campaign_id)
+    if assigned is not None:
+        mask[assigned] = False
+    return mask
+
+
+def _match_selected(columns: PlayerColumns,
+                    campaign_set: CompiledCampaignSet,
+                    active: List[CompiledCampaign],
+                    now: datetime) -> Dict[str, 'np.ndarray']:
+    selection = campaign_set.selection
+    scope = sorted(campaign_set.scope.active(now), key=priority_key)
+    evaluated = {campaign.campaign_id: campaign for campaign in active}
+
+    held = np.zeros(len(columns), dtype=np.int64)
+    for campaign in scope:
+        assigned = columns.assigned.get(campaign.campaign_id)
+        if assigned is not None:
+            held[assigned] += 1
+    # Remaining assignments of each row under top_k and player_cap
+    top = np.full(len(columns), selection.top_k) \
+        if selection.top_k > 0 else None
+    cap = np.maximum(selection.player_cap - held, 0) \
+        if selection.player_cap > 0 else None
+
+    result: Dict[str, 'np.ndarray'] = {}
+    for ranked in scope:
+        quota = top if cap is None else cap if top is None \
+            else np.minimum(top, cap)
+        if not (quota > 0).any():
+            break
+        campaign = evaluated.get(ranked.campaign_id)
+        if campaign is not None:
+            rows = np.flatnonzero(
+                _eligible(columns, campaign, now) & (quota > 0))
+            if len(rows):
+                result[campaign.campaign_id] = rows
+                for remaining in (top, cap):
+                    if remaining is not None:
+                        remaining[rows] -= 1
+        assigned = columns.assigned.get(ranked.campaign_id)
+        if top is not None and assigned is not None:
+            top[assigned] -= 1
+    return result
@@ -0,0 +1,160 @@
+"""
+SQLite configuration for concurrent use.
+
+Every connection runs the SQLITE_PRAGMAS on open (WAL journaling, relaxed
+synchronous, larger page cache, memory mapping and a busy timeout), through
+a sqlite3 connection factory.
+
+File databases are split between a single writer connection, which
+serializes the transactions writing (such as campaign assignments) inside
+the process, and a pool of SQLITE_READ_POOL_SIZE query-only connections
+serving the reads of sessions that did not write yet, such as profile loads.
+With WAL, readers neither block nor are blocked by the writer.
+
+init_app must run before db.init_app, which creates the engines.
+"""
+import sqlite3
+from threading import Lock
+from typing import Any, Dict, Optional, Type
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+
+# Session.info key set once a session transaction wrote
+WRITING_KEY = 'database.writing'
+
+DEFAULT_PRAGMAS: Dict[str, Any] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Negative: size in KiB, i.e. 64 MiB
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+def connection_factory(pragmas: Dict[str, Any],
+                       read_only: bool = False) -> Type[sqlite3.Connection]:
+    """
+    Build a sqlite3 connection class applying pragmas when it connects.
+
+    Args:
+        pragmas: Pragma names and values
+        read_only: Leave the journal mode alone and refuse writes
+            (query_only)
+
+    Returns:
+        Type[sqlite3.Connection]: Value for the factory argument of
+        sqlite3.connect
+    """
+    statements = [
+        f'PRAGMA {name}={value}' for name, value in pragmas.items()
+        if not (read_only and name == 'journal_mode')]
+    if read_only:
+        statements.append('PRAGMA query_only=ON')
+
+    class TunedConnection(sqlite3.Connection):
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            super().__init__(*args, **kwargs)
+            for statement in statements:
+                self.execute(statement).close()
+
+    return TunedConnection
+
+
+class DatabaseTuning:
+    """Engine options of the SQLite database, and its query-only engine"""
+
+    def __init__(self) -> None:
+        self.read_pool_size = 0
+        self.read_options: Dict[str, Any] = {}
+        self._reader: Optional[Engine] = None
+        self._lock = Lock()
+
+    def init_app(self, app: Any) -> None:
+        """Derive SQLALCHEMY_ENGINE_OPTIONS and the query-only engine options
+
+        Args:
+            app: Flask application; SQLITE_PRAGMAS are the pragmas of every
+                connection, SQLITE_READ_POOL_SIZE the number of query-only
+                connections (0 disables the read/write split)
+        """
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+        app.extensions['database_tuning'] = self
+        if not uri or make_url(uri).get_backend_name() != 'sqlite':
+            return
+
+        pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        options.setdefault('connect_args', {})['factory'] = \
+            connection_factory(pragmas)
+
+        read_pool_size = int(app.config.get('SQLITE_READ_POOL_SIZE', 0))
+        if make_url(uri).database in (None, '', ':memory:') \
+                or read_pool_size <= 0:
+            # An in-memory database is private to its single connection
+            return
+
+        options.update(pool_size=1, max_overflow=0)
+        self.read_pool_size = read_pool_size
+        self.read_options = {
+            'pool_size': read_pool_size,
+            'max_overflow': 0,
+            'connect_args': {
+                'factory': connection_factory(pragmas, read_only=True)},
+        }
+
+    def reader(self, writer: Engine) -> Optional[Engine]:
+        """Query-only engine on the database of writer, None if disabled"""
+        if not self.read_pool_size:
+            return None
+        if self._reader is None:
+            with self._lock:
+                if self._reader is None:
+                    self._reader = create_engine(
+                        writer.url, **self.read_options)
+        return self._reader
+
+    def dispose(self) -> None:
+        """Close the connections of the query-only engine"""
+        if self._reader is not None:
+            self._reader.dispose()
+
+
+class RoutingSession(Session):
+    """Session reading through the query-only engine until it writes
+
+    Flushes and DML statements use the writer engine, and so does every
+    statement after them until the transaction ends, so that a session
+    reads its own writes.
+    """
+
+    def get_bind(self, mapper: Optional[Any] = None,
+                 clause: Optional[Any] = None,
+                 bind: Optional[Any] = None, **kwargs: Any) -> Any:
+        engine = super().get_bind(
+            mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None:
+            return engine
+        writer = self._db.engines.get(None)
+        tuning = current_app.extensions.get('database_tuning')
+        reader = tuning.reader(writer) if tuning is not None else None
+        if reader is None or engine is not writer:
+            return engine
+        if self._flushing or self.info.get(WRITING_KEY) or \
+                getattr(clause, 'is_dml', False):
+            self.info[WRITING_KEY] = True
+            return engine
+        return reader
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _end_writing(session: Session, transaction: Any) -> None:
+    if transaction.parent is None:
+        session.info.pop(WRITING_KEY, None)
+
+
+# Process-wide configuration, applied by init_app
+database_tuning = DatabaseTuning()
@@ -0,0 +1,479 @@
+"""
+Compiled campaign matchers.
+
+Campaigns validated by APICampaignSchema are compiled once into immutable
+predicate objects, so that matching a player no longer walks the raw
+matchers dictionaries on every request. Matchers compile to the rules of
+the types in app.matchers.
+"""
+from bisect import bisect_left
+from datetime import datetime
+from typing import (
+    Dict, Any, List, Optional, FrozenSet, Iterable, NamedTuple, Sequence,
+    Set, Tuple)
+from .bitsets import item_dictionary
+from .index import CampaignIndex
+from .matchers import Rule, registry
+from .metrics import metrics
+from .schedule import CampaignSchedule, Clock
+from .selectivity import MatcherStatistics, matcher_statistics
+
+
+class PlayerView(NamedTuple):
+    """Read-only view of the player attributes used by matchers"""
+    player_id: str
+    level: Optional[int]
+    country: Optional[str]
+    item_names: FrozenSet[str]
+    campaign_ids: FrozenSet[str]
+    item_bits: int
+    total_spent: Optional[float] = None
+    last_session: Optional[datetime] = None
+    language: Optional[str] = None
+    clan_id: Optional[str] = None
+    xp: Optional[int] = None
+    device_models: FrozenSet[str] = frozenset()
+    firmwares: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def create(cls, player_id: str, level: Optional[int],
+               country: Optional[str], item_names: Iterable[str] = (),
+               campaign_ids: Iterable[str] = (),
+               **attributes: Any) -> 'PlayerView':
+        """Build a view from plain values, encoding the owned items
+
+        Args:
+            attributes: Other view fields; device_models and firmwares
+                accept any iterable
+        """
+        item_names = frozenset(item_names)
+        for name in ('device_models', 'firmwares'):
+            if name in attributes:
+                attributes[name] = frozenset(attributes[name])
+        return cls(
+            player_id=player_id,
+            level=level,
+            country=country,
+            item_names=item_names,
+            campaign_ids=frozenset(campaign_ids),
+            item_bits=item_dictionary.mask(item_names),
+            **attributes)
+
+    @classmethod
+    def from_player(cls, player: Any) -> 'PlayerView':
+        """Build a view from a Player model instance
+
+        Args:
+            player: Player object containing the player data
+
+        Returns:
+            PlayerView: Snapshot of the matching attributes
+        """
+        devices = player.devices
+        return cls(
+            player_id=player.player_id,
+            level=player.level,
+            country=player.country,
+            item_names=player.owned_item_names,
+            campaign_ids=player.assigned_campaign_ids,
+            item_bits=player.owned_item_bits,
+            total_spent=player.total_spent,
+            last_session=player.last_session,
+            language=player.language,
+            clan_id=player.clan_id,
+            xp=player.xp,
+            device_models=frozenset(
+                device.model for device in devices if device.model),
+            firmwares=frozenset(
+                device.firmware for device in devices if device.firmware))
+
+
+class CompiledCampaign(NamedTuple):
+    """Immutable, precompiled form of a campaign and its matchers"""
+    campaign_id: str
+    name: str
+    priority: float
+    enabled: bool
+    start_date: Optional[datetime]
+    end_date: Optional[datetime]
+    level_min: Optional[int]
+    level_max: Optional[int]
+    countries: Optional[FrozenSet[str]]
+    required_items: FrozenSet[str]
+    excluded_items: FrozenSet[str]
+    required_mask: int
+    excluded_mask: int
+    rules: Tuple[Rule, ...] = ()
+
+    def is_active(self, now: datetime) -> bool:
+        """Check if the campaign is enabled and running at the given time"""
+        if not self.enabled:
+            return False
+
+        if self.start_date and self.end_date:
+            if now < self.start_date or now > self.end_date:
+                return False
+
+        return True
+
+    def matches(self, view: PlayerView,
+                now: Optional[datetime] = None) -> bool:
+        """Check if a player view matches the campaign matchers
+
+        Rules run cheapest and most selective first, up to the first one
+        rejecting the player.
+
+        Args:
+            view: PlayerView of the player
+            now: Reference time of time-based rules, defaults to the
+                current UTC time
+        """
+        for rule in self.rules:
+            if not rule.test(view, now):
+                return False
+        return True
+
+
+def compile_campaign(campaign: Dict[str, Any]) -> CompiledCampaign:
+    """
+    Compile a validated campaign into a CompiledCampaign.
+
+    Mirrors the semantics of services.check_player_matches_campaign_criteria
+    and services.check_campaign_is_active: empty matchers impose no
+    constraint, and a level matcher defaults to a minimum of 1 and no maximum.
+    The level, country and item fields feed the CampaignIndex; matching
+    itself runs the rules compiled by the matcher registry.
+
+    Args:
+        campaign: Dictionary loaded through APICampaignSchema
+
+    Returns:
+        CompiledCampaign: Immutable predicate object for the campaign
+    """
+    matchers: Dict[str, Any] = campaign.get("matchers") or {}
+    level: Dict[str, Any] = matchers.get("level") or {}
+    has: Dict[str, Any] = matchers.get("has") or {}
+    does_not_have: Dict[str, Any] = matchers.get("does_not_have") or {}
+
+    level_min: Optional[int] = None
+    level_max: Optional[int] = None
+    if level:
+        level_min = int(level.get("min", 1))
+        if level.get("max", float('inf')) != float('inf'):
+            level_max = int(level["max"])
+
+    countries: Optional[FrozenSet[str]] = None
+    if has.get("country"):
+        countries = frozenset(has["country"])
+
+    required_items = frozenset(has.get("items") or ())
+    excluded_items = frozenset(does_not_have.get("items") or ())
+
+    return CompiledCampaign(
+        campaign_id=campaign['id'],
+        name=campaign['name'],
+        priority=campaign.get("priority") or 0.0,
+        enabled=bool(campaign.get("enabled", False)),
+        start_date=campaign.get("start_date"),
+        end_date=campaign.get("end_date"),
+        level_min=level_min,
+        level_max=level_max,
+        countries=countries,
+        required_items=required_items,
+        excluded_items=excluded_items,
+        required_mask=item_dictionary.mask(required_items),
+        excluded_mask=item_dictionary.mask(excluded_items),
+        rules=registry.compile(matchers))
+
+
+def dependency_map(campaigns: Sequence[CompiledCampaign]
+                   ) -> Dict[str, FrozenSet[int]]:
+    """
+    Map PlayerView attributes to the campaigns whose rules read them.
+
+    Args:
+        campaigns: Compiled campaigns
+
+    Returns:
+        Dict[str, FrozenSet[int]]: Positions in campaigns, by attribute
+    """
+    dependents: Dict[str, Set[int]] = {}
+    for position, campaign in enumerate(campaigns):
+        for rule in campaign.rules:
+            for attribute in rule.attributes:
+                dependents.setdefault(attribute, set()).add(position)
+    return {attribute: frozenset(positions)
+            for attribute, positions in dependents.items()}
+
+
+def priority_key(campaign: CompiledCampaign) -> Tuple[float, str]:
+    """Sort key of campaigns by descending priority, then campaign_id"""
+    return -campaign.priority, campaign.campaign_id
+
+
+class Selection(NamedTuple):
+    """How many of the matching campaigns a player is assigned
+
+    Matching campaigns are taken in priority_key order. A player holds only
+    their top_k highest ranked matches: the active campaigns they are
+    assigned to count toward top_k ahead of the candidates ranked below
+    them, so evaluating a player again assigns nothing past the top_k. No
+    campaign is assigned once the player holds player_cap active campaigns.
+    0 disables a limit.
+    """
+    top_k: int = 0
+    player_cap: int = 0
+
+    def __bool__(self) -> bool:
+        return self.top_k > 0 or self.player_cap > 0
+
+    def limit(self, held_above: int, held: int) -> Optional[int]:
+        """Most campaigns to assign to a player up to a candidate
+
+        Args:
+            held_above: Active campaigns of the player ranked above the
+                candidate
+            held: Active campaigns of the player
+
+        Returns:
+            Optional[int]: Number of new assignments, including the ones
+            ranked above the candidate, None if unlimited
+        """
+        limits = []
+        if self.top_k > 0:
+            limits.append(max(self.top_k - held_above, 0))
+        if self.player_cap > 0:
+            limits.append(max(self.player_cap - held, 0))
+        return min(limits) if limits else None
+
+
+class CompiledCampaignSet:
+    """Set of compiled campaigns, built once per campaign list"""
+
+    def __init__(self, campaigns: Iterable[Dict[str, Any]],
+                 statistics: Optional[MatcherStatistics] = None,
+                 clock: Optional[Clock] = None,
+                 selection: Selection = Selection()) -> None:
+        """
+        Args:
+            campaigns: Dictionaries loaded through APICampaignSchema
+            statistics: Rule statistics driving the evaluation order,
+                defaults to the process-wide matcher_statistics
+            clock: Time source of the activity schedule, defaults to the
+                current UTC time
+            selection: Limits on the campaigns assigned to a player; when
+                set, campaigns are evaluated by priority
+        """
+        self._build(
+            tuple(compile_campaign(campaign) for campaign in campaigns),
+            statistics, clock, selection)
+
+    @classmethod
+    def from_compiled(cls, campaigns: Iterable[CompiledCampaign],
+                      statistics: Optional[MatcherStatistics] = None,
+                      clock: Optional[Clock] = None,
+                      selection: Selection = Selection()
+                      ) -> 'CompiledCampaignSet':
+        """Build a set from campaigns compiled beforehand, such as the
+        unchanged campaigns of a previous set
+
+        Args:
+            campaigns: Compiled campaigns, in catalog order
+            statistics: As in the constructor
+            clock: As in the constructor
+            selection: As in the constructor
+        """
+        campaign_set = cls.__new__(cls)
+        campaign_set._build(tuple(campaigns), statistics, clock, selection)
+        return campaign_set
+
+    def subset(self, campaign_ids: Iterable[str]) -> 'CompiledCampaignSet':
+        """Set of the campaigns with the given identifiers, same clock,
+        statistics and selection
+
+        The selection limits of the subset still count the campaigns the
+        players hold in the whole set.
+        """
+        wanted = frozenset(campaign_ids)
+        campaign_set = CompiledCampaignSet.from_compiled(
+            [campaign for campaign in self.campaigns
+             if campaign.campaign_id in wanted],
+            self.statistics, self.schedule.clock, self.selection)
+        campaign_set.scope = self.scope
+        return campaign_set
+
+    def _build(self, campaigns: Tuple[CompiledCampaign, ...],
+               statistics: Optional[MatcherStatistics],
+               clock: Optional[Clock], selection: Selection) -> None:
+        self.statistics: MatcherStatistics = (
+            statistics if statistics is not None else matcher_statistics)
+        self.campaigns: Tuple[CompiledCampaign, ...] = campaigns
+        self.selection = selection
+        # Set whose active campaigns count toward the selection limits: the
+        # set itself, or the set a subset was taken from
+        self.scope: CompiledCampaignSet = self
+        self.index = CampaignIndex(self.campaigns)
+        self.schedule = CampaignSchedule(self.campaigns, clock)
+        self.dependents: Dict[str, FrozenSet[int]] = dependency_map(
+            self.campaigns)
+        self.positions: Dict[str, int] = {
+            campaign.campaign_id: position
+            for position, campaign in enumerate(campaigns)}
+        # Rank of each position in priority_key order
+        by_priority = sorted(
+            range(len(campaigns)),
+            key=lambda position: priority_key(campaigns[position]))
+        self.priority_rank: List[int] = [0] * len(campaigns)
+        for rank, position in enumerate(by_priority):
+            self.priority_rank[position] = rank
+        self.reorder()
+
+    def __len__(self) -> int:
+        return len(self.campaigns)
+
+    def reorder(self) -> None:
+        """Reorder the rules of every campaign from the rule statistics"""
+        self._reordered_at: int = self.statistics.sampled
+        self.campaigns = tuple(
+            campaign._replace(rules=self.statistics.order(campaign))
+            for campaign in self.campaigns)
+        metrics.incr('matcher_stats.reorders')
+
+    def now(self) -> datetime:
+        """Current time, read from the schedule clock"""
+        return self.schedule.clock()
+
+    def active(self, now: Optional[datetime] = None
+               ) -> List[CompiledCampaign]:
+        """Return the enabled campaigns running at a given time
+
+        Args:
+            now: Time of the lookup, defaults to the schedule clock
+        """
+        active = self.schedule.active(now)
+        return [campaign for position, campaign in enumerate(self.campaigns)
+                if position in active]
+
+    def match(self, view: PlayerView,
+              now: Optional[datetime] = None) -> List[CompiledCampaign]:
+        """
+        Return the campaigns a player is newly eligible to.
+
+        Only the campaigns the schedule reports as active are evaluated. A
+        sample of the evaluations is measured by the rule statistics, and
+        the rules are reordered once enough samples were collected. With a
+        selection, candidates are evaluated by descending priority and the
+        evaluation stops once the selection limit is reached.
+
+        Args:
+            view: PlayerView of the player to match
+            now: Evaluation time, defaults to the schedule clock
+
+        Returns:
+            List[CompiledCampaign]: Active, matching campaigns the player
+            is not assigned to yet
+        """
+        return self._evaluate(self._candidate_positions(view), view, now)
+
+    def match_changed(self, view: PlayerView, changed: Iterable[str],
+                      now: Optional[datetime] = None
+                      ) -> List[CompiledCampaign]:
+        """
+        Return the campaigns a player became eligible to through a change.
+
+        Only the campaigns with a rule reading one of the changed
+        attributes are evaluated: the outcome of the others is the same as
+        before the change.
+
+        Args:
+            view: PlayerView of the player, after the change
+            changed: Names of the PlayerView attributes that changed
+            now: Evaluation time, defaults to the schedule clock
+
+        Returns:
+            List[CompiledCampaign]: Active, matching campaigns the player
+            is not assigned to yet, among the affected ones
+        """
+        positions = sorted(set().union(
+            *(self.dependents.get(name, ()) for name in changed)))
+        metrics.incr('player_delta.evaluated', len(positions))
+        metrics.incr('player_delta.campaigns', len(self.campaigns))
+        return self._evaluate(positions, view, now)
+
+    def held(self, view: PlayerView, now: Optional[datetime] = None
+             ) -> List[Tuple[float, str]]:
+        """Sorted priority keys of the active campaigns of the set a player
+        is assigned to"""
+        active = self.schedule.active(now)
+        positions = self.positions
+        campaigns = self.campaigns
+        return sorted(
+            priority_key(campaigns[position])
+            for position in (positions.get(campaign_id, -1)
+                             for campaign_id in view.campaign_ids)
+            if position in active)
+
+    def _evaluate(self, positions: Iterable[int], view: PlayerView,
+                  now: Optional[datetime]) -> List[CompiledCampaign]:
+        if now is None:
+            now = self.schedule.clock()
+        active = self.schedule.active(now)
+
+        selection = self.selection
+        held: List[Tuple[float, str]] = []
+        if selection:
+            held = self.scope.held(view, now)
+            if selection.limit(0, len(held)) == 0:
+                metrics.incr('campaign_selection.capped')
+                return []
+            positions = sorted(positions, key=self.priority_rank.__getitem__)
+
+        statistics = self.statistics
+        campaigns = self.campaigns
+        matched: List[CompiledCampaign] = []
+        for position in positions:
+            if position not in active:
+                continue
+            campaign = campaigns[position]
+            if campaign.campaign_id in view.campaign_ids:
+                continue
+            if selection:
+                limit = selection.limit(
+                    bisect_left(held, priority_key(campaign)), len(held))
+                if limit is not None and len(matched) >= limit:
+                    # Lower ranked matches would be discarded
+                    metrics.incr('campaign_selection.early_exits')
+                    break
+            if statistics.sample():
+                eligible = statistics.evaluate(campaign, view, now)
+            else:
+                eligible = campaign.matches(view, now)
+            if eligible:
+                matched.append(campaign)
+
+        if statistics.sampled - self._reordered_at >= statistics.reorder_every:
+            self.reorder()
+        return matched
+
+    def candidates(self, view: PlayerView) -> List[CompiledCampaign]:
+        """
+        Return the campaigns selected by the index for a player.
+
+        Records the number of candidates against the total number of
+        campaigns in the campaign_index.* metrics.
+
+        Args:
+            view: PlayerView of the player to look up
+
+        Returns:
+            List[CompiledCampaign]: Candidate campaigns, in catalog order
+        """
+        return [self.campaigns[position]
+                for position in self._candidate_positions(view)]
+
+    def _candidate_positions(self, view: PlayerView) -> List[int]:
+        positions = self.index.candidates(view)
+        metrics.incr('campaign_index.lookups')
+        metrics.incr('campaign_index.candidates', len(positions))
+        metrics.incr('campaign_index.campaigns', len(self.campaigns))
+        return positions
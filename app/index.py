@@ -0,0 +1,118 @@
+"""
+Inverted index over compiled campaigns.
+
+Campaigns are indexed by targeted country, by level band (sorted range
+boundaries) and by one of their required items, so that a lookup only
+intersects posting lists and leaves a small candidate set to evaluate.
+"""
+from bisect import bisect_right
+from collections import Counter
+from typing import (
+    TYPE_CHECKING, Dict, List, Optional, FrozenSet, Iterable, Sequence, Set)
+
+if TYPE_CHECKING:
+    from .engine import CompiledCampaign, PlayerView
+
+
+class CampaignIndex:
+    """Posting lists of campaign positions keyed by matcher values"""
+
+    def __init__(self, campaigns: Sequence['CompiledCampaign']) -> None:
+        self.total: int = len(campaigns)
+        positions = range(self.total)
+
+        # Country: campaigns without a country matcher match every country
+        any_country = frozenset(
+            i for i in positions if campaigns[i].countries is None)
+        by_country: Dict[str, Set[int]] = {}
+        for i in positions:
+            for country in campaigns[i].countries or ():
+                by_country.setdefault(country, set()).add(i)
+        self._any_country: FrozenSet[int] = any_country
+        self._by_country: Dict[str, FrozenSet[int]] = {
+            country: frozenset(members) | any_country
+            for country, members in by_country.items()}
+
+        # Level: elementary intervals between sorted range boundaries
+        any_level = frozenset(
+            i for i in positions if campaigns[i].level_min is None)
+        bounds: Set[int] = set()
+        for i in positions:
+            campaign = campaigns[i]
+            if campaign.level_min is not None:
+                bounds.add(campaign.level_min)
+                if campaign.level_max is not None:
+                    bounds.add(campaign.level_max + 1)
+        self._level_bounds: List[int] = sorted(bounds)
+        segments: List[Set[int]] = [
+            set(any_level) for _ in range(len(self._level_bounds) + 1)]
+        for i in positions:
+            campaign = campaigns[i]
+            if campaign.level_min is None:
+                continue
+            first = bisect_right(self._level_bounds, campaign.level_min)
+            last = len(self._level_bounds)
+            if campaign.level_max is not None:
+                last = bisect_right(self._level_bounds, campaign.level_max)
+            for segment in range(first, last + 1):
+                segments[segment].add(i)
+        self._any_level: FrozenSet[int] = any_level
+        self._level_segments: List[FrozenSet[int]] = [
+            frozenset(segment) for segment in segments]
+
+        # Required items: each campaign is posted under its rarest item
+        frequency = Counter(
+            item for campaign in campaigns for item in campaign.required_items)
+        self._no_required_items: FrozenSet[int] = frozenset(
+            i for i in positions if not campaigns[i].required_items)
+        by_item: Dict[str, Set[int]] = {}
+        for i in positions:
+            required = campaigns[i].required_items
+            if required:
+                key_item = min(required, key=lambda item: (frequency[item], item))
+                by_item.setdefault(key_item, set()).add(i)
+        self._by_item: Dict[str, FrozenSet[int]] = {
+            item: frozenset(members) for item, members in by_item.items()}
+
+    def _level_candidates(self, level: Optional[int]) -> FrozenSet[int]:
+        if level is None:
+            return self._any_level
+        return self._level_segments[bisect_right(self._level_bounds, level)]
+
+    def _item_candidates(self, item_names: FrozenSet[str]) -> Set[int]:
+        result: Set[int] = set(self._no_required_items)
+        if len(item_names) < len(self._by_item):
+            postings: Iterable[FrozenSet[int]] = (
+                self._by_item[item] for item in item_names
+                if item in self._by_item)
+        else:
+            postings = (
+                members for item, members in self._by_item.items()
+                if item in item_names)
+        for members in postings:
+            result.update(members)
+        return result
+
+    def candidates(self, view: 'PlayerView') -> List[int]:
+        """
+        Return the positions of the campaigns a player may match.
+
+        Every campaign matching the player is a candidate; candidates still
+        need a full evaluation of their matchers.
+
+        Args:
+            view: PlayerView of the player to look up
+
+        Returns:
+            List[int]: Sorted campaign positions
+        """
+        by_country = self._by_country.get(view.country, self._any_country)
+        by_level = self._level_candidates(view.level)
+        if len(by_level) < len(by_country):
+            narrowed = by_level & by_country
+        else:
+            narrowed = by_country & by_level
+        if not narrowed:
+            return []
+        return sorted(narrowed.intersection(
+            self._item_candidates(view.item_names)))
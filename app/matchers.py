@@ -0,0 +1,398 @@
+"""
+Registry of campaign matcher types.
+
+A matcher type declares where its value lives in a campaign's matchers
+document and how that value is validated, and compiles the value into a
+Rule: a scalar test over one PlayerView and a batch test over PlayerColumns
+(NumPy). Cost and pass-rate hints let the engine run the cheapest, most
+selective rules of a campaign first and stop at the first rejection.
+
+Adding a rule type means registering a Matcher here; the engine, the
+columnar matcher and MatcherSchema pick it up.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import (
+    TYPE_CHECKING, Any, Callable, Dict, FrozenSet, Iterator, List,
+    NamedTuple, Optional, Tuple)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from marshmallow import RAISE, Schema, fields, validate
+from .bitsets import WORD_BITS, item_dictionary, words
+
+if TYPE_CHECKING:
+    from .columnar import PlayerColumns
+    from .engine import PlayerView
+
+ScalarTest = Callable[['PlayerView', Optional[datetime]], bool]
+BatchTest = Callable[['PlayerColumns', Optional[datetime]], 'np.ndarray']
+
+
+class Rule(NamedTuple):
+    """One compiled matcher of a campaign"""
+    name: str
+    test: ScalarTest
+    test_columns: BatchTest
+    cost: float
+    pass_rate: float
+    # PlayerView attributes the tests read
+    attributes: FrozenSet[str] = frozenset()
+
+    @property
+    def rank(self) -> float:
+        """Expected cost per rejected player; lower ranks run first"""
+        return self.cost / max(1.0 - self.pass_rate, 1e-6)
+
+
+class Matcher:
+    """Base class of the matcher types
+
+    Subclasses set section (the key in the matchers document), key (the
+    sub-key inside sections such as "has", or None), attribute (the
+    PlayerView attribute tested) and the cost and pass-rate hints, and
+    implement field and compile.
+    """
+    section: str = ''
+    key: Optional[str] = None
+    # Relative cost of a scalar test, and share of players it lets through
+    cost: float = 1.0
+    pass_rate: float = 0.5
+
+    attribute: str = ''
+
+    @property
+    def name(self) -> str:
+        return f'{self.section}.{self.key}' if self.key else self.section
+
+    @property
+    def attributes(self) -> FrozenSet[str]:
+        """PlayerView attributes the rules of this type depend on"""
+        return frozenset((self.attribute,))
+
+    def field(self) -> fields.Field:
+        """marshmallow field validating the matcher value"""
+        raise NotImplementedError
+
+    def compile(self, value: Any) -> Optional[Rule]:
+        """Compile a matcher value, or return None if it has no effect"""
+        raise NotImplementedError
+
+    def rule(self, test: ScalarTest, test_columns: BatchTest) -> Rule:
+        return Rule(self.name, test, test_columns, self.cost, self.pass_rate,
+                    self.attributes)
+
+
+class RangeMatcher(Matcher):
+    """{"min": x, "max": y} bounds on a numeric player attribute
+
+    A player without a value never matches a range.
+    """
+    pass_rate = 0.6
+
+    def __init__(self, section: str, attribute: str, value_field: type,
+                 default_min: Optional[float] = None) -> None:
+        self.section = section
+        self.attribute = attribute
+        self.value_field = value_field
+        self.default_min = default_min
+
+    def field(self) -> fields.Field:
+        return fields.Dict(keys=fields.Str(validate=validate.OneOf(
+                           ['min', 'max'])), values=self.value_field())
+
+    def compile(self, value: Optional[Dict[str, Any]]) -> Optional[Rule]:
+        if not value:
+            return None
+        low = value.get("min", self.default_min)
+        high = value.get("max")
+        if high == float('inf'):
+            high = None
+        attribute = self.attribute
+
+        def test(view: 'PlayerView', now: Optional[datetime]) -> bool:
+            actual = getattr(view, attribute)
+            return actual is not None \
+                and (low is None or actual >= low) \
+                and (high is None or actual <= high)
+
+        def test_columns(columns: 'PlayerColumns',
+                         now: Optional[datetime]) -> 'np.ndarray':
+            values, present = columns.numeric(attribute)
+            mask = present.copy()
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+            return mask
+
+        return self.rule(test, test_columns)
+
+
+class ValueInMatcher(Matcher):
+    """List of accepted values of a single-valued player attribute"""
+    pass_rate = 0.3
+
+    def __init__(self, section: str, key: str, attribute: str) -> None:
+        self.section = section
+        self.key = key
+        self.attribute = attribute
+
+    def field(self) -> fields.Field:
+        return fields.List(fields.Str())
+
+    def compile(self, value: Optional[List[str]]) -> Optional[Rule]:
+        if not value:
+            return None
+        accepted = frozenset(value)
+        attribute = self.attribute
+
+        def test(view: 'PlayerView', now: Optional[datetime]) -> bool:
+            return getattr(view, attribute) in accepted
+
+        def test_columns(columns: 'PlayerColumns',
+                         now: Optional[datetime]) -> 'np.ndarray':
+            codes, dictionary = columns.categorical(attribute)
+            # Lookup table over codes; the extra last slot is hit by code -1
+            allowed = np.zeros(len(dictionary) + 1, dtype=bool)
+            allowed[[dictionary[value] for value in accepted
+                     if value in dictionary]] = True
+            return allowed[codes]
+
+        return self.rule(test, test_columns)
+
+
+class AnyOfMatcher(Matcher):
+    """List of values, one of which a set-valued player attribute must hold
+    (e.g. the models of the player's devices)"""
+    cost = 2.0
+    pass_rate = 0.3
+
+    def __init__(self, section: str, key: str, attribute: str) -> None:
+        self.section = section
+        self.key = key
+        self.attribute = attribute
+
+    def field(self) -> fields.Field:
+        return fields.List(fields.Str())
+
+    def compile(self, value: Optional[List[str]]) -> Optional[Rule]:
+        if not value:
+            return None
+        accepted = frozenset(value)
+        attribute = self.attribute
+
+        def test(view: 'PlayerView', now: Optional[datetime]) -> bool:
+            return not accepted.isdisjoint(getattr(view, attribute))
+
+        def test_columns(columns: 'PlayerColumns',
+                         now: Optional[datetime]) -> 'np.ndarray':
+            values = columns.sets(attribute)
+            return np.fromiter(
+                (not accepted.isdisjoint(v) for v in values),
+                dtype=bool, count=len(values))
+
+        return self.rule(test, test_columns)
+
+
+class ItemsMatcher(Matcher):
+    """Item names the player must all own (has.items) or must own none of
+    (does_not_have.items), tested on the ownership bitsets"""
+    key = 'items'
+    # item_bits encodes item_names
+    attribute = 'item_names'
+
+    def __init__(self, section: str, required: bool) -> None:
+        self.section = section
+        self.required = required
+        self.pass_rate = 0.2 if required else 0.8
+
+    def field(self) -> fields.Field:
+        return fields.List(fields.Str())
+
+    def compile(self, value: Optional[List[str]]) -> Optional[Rule]:
+        if not value:
+            return None
+        mask = item_dictionary.mask(value)
+
+        if self.required:
+            def test(view: 'PlayerView', now: Optional[datetime]) -> bool:
+                return view.item_bits & mask == mask
+        else:
+            def test(view: 'PlayerView', now: Optional[datetime]) -> bool:
+                return not view.item_bits & mask
+
+        required = self.required
+
+        def test_columns(columns: 'PlayerColumns',
+                         now: Optional[datetime]) -> 'np.ndarray':
+            bits = columns.item_bits
+            word_count = bits.shape[1]
+            result = np.ones(len(columns), dtype=bool)
+            if required and mask >> (WORD_BITS * word_count):
+                # Requires an item registered after the columns were built
+                result[:] = False
+                return result
+            for word, word_bits in words(mask):
+                if word >= word_count:
+                    break
+                word_bits = np.uint64(word_bits)
+                if required:
+                    result &= (bits[:, word] & word_bits) == word_bits
+                else:
+                    result &= (bits[:, word] & word_bits) == 0
+            return result
+
+        return self.rule(test, test_columns)
+
+
+class RecencyMatcher(Matcher):
+    """{"within_days": n, "older_than_days": m} on the age of a timestamp
+    attribute, such as the last session; naive timestamps are UTC"""
+    pass_rate = 0.5
+
+    def __init__(self, section: str, attribute: str) -> None:
+        self.section = section
+        self.attribute = attribute
+
+    def field(self) -> fields.Field:
+        return fields.Dict(
+            keys=fields.Str(validate=validate.OneOf(
+                ['within_days', 'older_than_days'])),
+            values=fields.Float())
+
+    def compile(self, value: Optional[Dict[str, float]]) -> Optional[Rule]:
+        if not value:
+            return None
+        within = value.get("within_days")
+        older_than = value.get("older_than_days")
+        attribute = self.attribute
+
+        def bounds(now: Optional[datetime]) -> Tuple[
+                Optional[datetime], Optional[datetime]]:
+            now = now or datetime.now(timezone.utc)
+            return (
+                now - timedelta(days=within) if within is not None else None,
+                now - timedelta(days=older_than)
+                if older_than is not None else None)
+
+        def test(view: 'PlayerView', now: Optional[datetime]) -> bool:
+            moment = getattr(view, attribute)
+            if moment is None:
+                return False
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+            after, before = bounds(now)
+            return (after is None or moment >= after) \
+                and (before is None or moment <= before)
+
+        def test_columns(columns: 'PlayerColumns',
+                         now: Optional[datetime]) -> 'np.ndarray':
+            values, present = columns.numeric(attribute)
+            after, before = bounds(now)
+            mask = present.copy()
+            if after is not None:
+                mask &= values >= after.timestamp()
+            if before is not None:
+                mask &= values <= before.timestamp()
+            return mask
+
+        return self.rule(test, test_columns)
+
+
+class MatcherRegistry:
+    """Matcher types, keyed by their place in the matchers document"""
+
+    def __init__(self) -> None:
+        self._matchers: Dict[Tuple[str, Optional[str]], Matcher] = {}
+
+    def register(self, matcher: Matcher) -> Matcher:
+        """Add a matcher type
+
+        Args:
+            matcher: Matcher instance; its (section, key) must be unused
+
+        Returns:
+            Matcher: The registered matcher
+        """
+        place = (matcher.section, matcher.key)
+        if place in self._matchers:
+            raise ValueError(f"Matcher {matcher.name} is already registered")
+        if (matcher.section, None) in self._matchers or (
+                matcher.key is None and any(
+                    section == matcher.section
+                    for section, _ in self._matchers)):
+            raise ValueError(
+                f"Section {matcher.section} mixes keyed and plain matchers")
+        self._matchers[place] = matcher
+        return matcher
+
+    def __iter__(self) -> Iterator[Matcher]:
+        return iter(self._matchers.values())
+
+    def schema(self, base: type = Schema) -> type:
+        """Build the marshmallow schema of a matchers document
+
+        Plain matchers are fields of their own; the keyed matchers of a
+        section are the fields of a nested schema. Unknown sections and keys
+        are rejected rather than ignored, since a misspelled matcher would
+        otherwise match every player.
+
+        Args:
+            base: Schema class to derive from
+
+        Returns:
+            type: Schema class
+        """
+        declared: Dict[str, fields.Field] = {}
+        sections: Dict[str, List[Matcher]] = {}
+        for matcher in self:
+            if matcher.key is None:
+                declared[matcher.section] = matcher.field()
+            else:
+                sections.setdefault(matcher.section, []).append(matcher)
+        for section, matchers in sections.items():
+            declared[section] = fields.Nested(base.from_dict(
+                {matcher.key: matcher.field() for matcher in matchers},
+                name=f'{section.title().replace("_", "")}MatcherSchema'),
+                unknown=RAISE)
+        return base.from_dict(declared, name='MatcherSchema')
+
+    def compile(self, matchers: Optional[Dict[str, Any]]) -> Tuple[Rule, ...]:
+        """
+        Compile a validated matchers document.
+
+        Args:
+            matchers: Matchers of a campaign, loaded through MatcherSchema
+
+        Returns:
+            Tuple[Rule, ...]: Effective rules, in ascending rank order
+        """
+        matchers = matchers or {}
+        rules: List[Rule] = []
+        for (section, key), matcher in self._matchers.items():
+            value = matchers.get(section)
+            if key is not None:
+                value = (value or {}).get(key)
+            rule = matcher.compile(value)
+            if rule is not None:
+                rules.append(rule)
+        rules.sort(key=lambda rule: rule.rank)
+        return tuple(rules)
+
+
+# Process-wide registry and the built-in matcher types
+registry = MatcherRegistry()
+registry.register(RangeMatcher('level', 'level', fields.Int, default_min=1))
+registry.register(ValueInMatcher('has', 'country', 'country'))
+registry.register(ItemsMatcher('has', required=True))
+registry.register(ValueInMatcher('has', 'language', 'language'))
+registry.register(ValueInMatcher('has', 'clan', 'clan_id'))
+registry.register(AnyOfMatcher('has', 'device_model', 'device_models'))
+registry.register(AnyOfMatcher('has', 'firmware', 'firmwares'))
+registry.register(ItemsMatcher('does_not_have', required=False))
+registry.register(RangeMatcher('total_spent', 'total_spent', fields.Float))
+registry.register(RangeMatcher('xp', 'xp', fields.Int))
+registry.register(RecencyMatcher('last_session', 'last_session'))
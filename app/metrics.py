@@ -0,0 +1,54 @@
+"""
+In-process metrics registry
+"""
+from threading import Lock
+from typing import Dict, Union
+
+Number = Union[int, float]
+
+
+class Metrics:
+    """Thread-safe registry of named counters and gauges"""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._values: Dict[str, Number] = {}
+
+    def incr(self, name: str, value: Number = 1) -> None:
+        """Increment a counter
+
+        Args:
+            name: Name of the counter
+            value: Amount to add
+        """
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + value
+
+    def set(self, name: str, value: Number) -> None:
+        """Set a gauge to an absolute value
+
+        Args:
+            name: Name of the gauge
+            value: New value
+        """
+        with self._lock:
+            self._values[name] = value
+
+    def get(self, name: str) -> Number:
+        """Return the current value of a counter or gauge (0 if unset)"""
+        with self._lock:
+            return self._values.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Number]:
+        """Return a copy of all current values"""
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self) -> None:
+        """Clear all values"""
+        with self._lock:
+            self._values.clear()
+
+
+# Process-wide registry
+metrics = Metrics()
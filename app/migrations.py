@@ -0,0 +1,204 @@
+"""
+Versioned schema migrations.
+
+Migrations are numbered functions applied in order, each in a transaction of
+its own, and recorded in the schema_migrations table. The current models
+describe the latest schema, so a fresh database ends up the same whether it
+was created by create_all or migrated from scratch. Migrations spell out
+their DDL rather than reading it from the models, so that they keep
+producing the same schema as the models change.
+
+Usage: python migrate.py [--target VERSION] (or make migrate)
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple, Optional
+from sqlalchemy import inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from .models import db
+from .models.player import create_count_triggers
+
+logger = logging.getLogger(__name__)
+
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String, nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False))
+
+
+class Migration(NamedTuple):
+    """Schema change, applied once"""
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str
+              ) -> Callable[[Callable[[Connection], None]],
+                            Callable[[Connection], None]]:
+    """Register the decorated function as migration number version"""
+    def register(upgrade: Callable[[Connection], None]
+                 ) -> Callable[[Connection], None]:
+        if version != len(MIGRATIONS) + 1:
+            raise ValueError(
+                f"Migration {version} registered after {len(MIGRATIONS)}")
+        MIGRATIONS.append(Migration(version, description, upgrade))
+        return upgrade
+    return register
+
+
+def current_version(engine: Engine) -> int:
+    """Last migration applied to the database of engine, 0 if none"""
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(schema_migrations.name):
+            return 0
+        versions = connection.execute(
+            select(schema_migrations.c.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """
+    Apply the pending migrations.
+
+    Args:
+        engine: Engine of the database to migrate
+        target: Last migration to apply, the latest one if None
+
+    Returns:
+        List[int]: Versions applied
+    """
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+
+    applied: List[int] = []
+    version = current_version(engine)
+    for pending in MIGRATIONS[version:target]:
+        logger.info("Applying migration %d: %s",
+                    pending.version, pending.description)
+        with engine.begin() as connection:
+            pending.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=pending.version,
+                description=pending.description,
+                applied_at=datetime.now(timezone.utc)))
+        applied.append(pending.version)
+    return applied
+
+
+# Tables created by db.create_all() before migrations existed
+BASELINE_TABLES = (
+    'CREATE TABLE IF NOT EXISTS items ('
+    'id INTEGER NOT NULL, '
+    '"key" VARCHAR NOT NULL, '
+    'name VARCHAR, '
+    'description VARCHAR, '
+    'PRIMARY KEY (id), '
+    'UNIQUE ("key"))',
+    'CREATE TABLE IF NOT EXISTS devices ('
+    'id INTEGER NOT NULL, '
+    'device_id INTEGER NOT NULL, '
+    'model VARCHAR, '
+    'carrier VARCHAR, '
+    'firmware VARCHAR, '
+    'PRIMARY KEY (id), '
+    'CONSTRAINT uix_device_id_model UNIQUE (device_id, model))',
+    'CREATE TABLE IF NOT EXISTS campaigns ('
+    'id INTEGER NOT NULL, '
+    'campaign_id VARCHAR NOT NULL, '
+    'name VARCHAR NOT NULL, '
+    'PRIMARY KEY (id), '
+    'UNIQUE (campaign_id))',
+    'CREATE TABLE IF NOT EXISTS clans ('
+    'clan_id VARCHAR NOT NULL, '
+    'name VARCHAR NOT NULL, '
+    'PRIMARY KEY (clan_id))',
+    'CREATE TABLE IF NOT EXISTS players ('
+    'id INTEGER NOT NULL, '
+    'player_id VARCHAR NOT NULL, '
+    'credential VARCHAR, '
+    'created DATETIME, '
+    'modified DATETIME, '
+    'last_session DATETIME, '
+    'total_spent FLOAT, '
+    'total_refund FLOAT, '
+    'total_transactions INTEGER, '
+    'last_purchase DATETIME, '
+    'level INTEGER, '
+    'xp INTEGER, '
+    'total_playtime INTEGER, '
+    'country VARCHAR, '
+    'language VARCHAR, '
+    'birthdate DATETIME, '
+    'gender VARCHAR, '
+    'clan_id VARCHAR, '
+    'custom_field VARCHAR, '
+    'PRIMARY KEY (id), '
+    'UNIQUE (player_id), '
+    'FOREIGN KEY(clan_id) REFERENCES clans (clan_id))',
+    'CREATE TABLE IF NOT EXISTS player_campaign ('
+    'player_id VARCHAR NOT NULL, '
+    'campaign_id VARCHAR NOT NULL, '
+    'PRIMARY KEY (player_id, campaign_id), '
+    'FOREIGN KEY(player_id) REFERENCES players (player_id), '
+    'FOREIGN KEY(campaign_id) REFERENCES campaigns (campaign_id))',
+    'CREATE TABLE IF NOT EXISTS player_device ('
+    'player_id VARCHAR NOT NULL, '
+    'device_id INTEGER NOT NULL, '
+    'PRIMARY KEY (player_id, device_id), '
+    'FOREIGN KEY(player_id) REFERENCES players (player_id), '
+    'FOREIGN KEY(device_id) REFERENCES devices (id))',
+    'CREATE TABLE IF NOT EXISTS player_item ('
+    'player_id VARCHAR NOT NULL, '
+    'item_id INTEGER NOT NULL, '
+    'quantity INTEGER NOT NULL, '
+    'PRIMARY KEY (player_id, item_id), '
+    'FOREIGN KEY(player_id) REFERENCES players (player_id), '
+    'FOREIGN KEY(item_id) REFERENCES items (id))',
+)
+
+
+@migration(1, "Baseline schema")
+def create_tables(connection: Connection) -> None:
+    for statement in BASELINE_TABLES:
+        connection.execute(text(statement))
+
+
+@migration(2, "Indexes for the matcher and reverse lookups")
+def create_lookup_indexes(connection: Connection) -> None:
+    for statement in (
+            # Players of a campaign
+            'CREATE INDEX IF NOT EXISTS '
+            'ix_player_campaign_campaign_id_player_id '
+            'ON player_campaign (campaign_id, player_id)',
+            # Owners of an item
+            'CREATE INDEX IF NOT EXISTS '
+            'ix_player_item_item_id_quantity_player_id '
+            'ON player_item (item_id, quantity, player_id)',
+            # Matcher prefilters: country and level ranges, clan
+            'CREATE INDEX IF NOT EXISTS ix_players_country_level '
+            'ON players (country, level)',
+            'CREATE INDEX IF NOT EXISTS ix_players_level ON players (level)',
+            'CREATE INDEX IF NOT EXISTS ix_players_clan_id '
+            'ON players (clan_id)'):
+        connection.execute(text(statement))
+
+
+@migration(3, "Per-campaign player counters")
+def create_player_counts(connection: Connection) -> None:
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS campaign_player_count ('
+        'campaign_id VARCHAR NOT NULL PRIMARY KEY '
+        'REFERENCES campaigns (campaign_id), '
+        'players INTEGER NOT NULL)'))
+    create_count_triggers(connection)
+    # Backfill, in the transaction creating the triggers
+    connection.execute(text('DELETE FROM campaign_player_count'))
+    connection.execute(text(
+        'INSERT INTO campaign_player_count (campaign_id, players) '
+        'SELECT campaign_id, COUNT(*) FROM player_campaign '
+        'GROUP BY campaign_id'))
@@ -2,11 +2,13 @@
 Database models package
 """
 from flask_sqlalchemy import SQLAlchemy
+from ..database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Import models to make them available when importing the package
-from .player import Player, player_campaign, player_device
+from .player import (
+    Player, campaign_player_count, player_campaign, player_device)
 from .player_item import PlayerItem
 from .item import Item
 from .device import Device
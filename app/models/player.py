@@ -2,7 +2,12 @@
 Player model and related association tables
 """
 from . import db
-from typing import List, Dict
+from .player_item import PlayerItem
+from ..bitsets import item_dictionary
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import object_session
+from typing import Any, List, Dict, FrozenSet, NamedTuple, Tuple
 
 # Association tables
 player_campaign = db.Table(
@@ -16,7 +21,47 @@ player_campaign = db.Table(
         'campaign_id',
         db.String,
         db.ForeignKey('campaigns.campaign_id'),
-        primary_key=True))
+        primary_key=True),
+    # Reverse lookup, players of a campaign (covering)
+    db.Index('ix_player_campaign_campaign_id_player_id',
+             'campaign_id', 'player_id'))
+
+# Number of player_campaign rows of each campaign, maintained by triggers
+campaign_player_count = db.Table(
+    'campaign_player_count',
+    db.Column(
+        'campaign_id',
+        db.String,
+        db.ForeignKey('campaigns.campaign_id'),
+        primary_key=True),
+    db.Column('players', db.Integer, nullable=False, default=0))
+
+# Assignments are only inserted and deleted, never updated
+COUNT_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS player_campaign_count_insert '
+    'AFTER INSERT ON player_campaign BEGIN '
+    'INSERT INTO campaign_player_count (campaign_id, players) '
+    'VALUES (NEW.campaign_id, 1) '
+    'ON CONFLICT (campaign_id) DO UPDATE SET players = players + 1; END',
+    'CREATE TRIGGER IF NOT EXISTS player_campaign_count_delete '
+    'AFTER DELETE ON player_campaign BEGIN '
+    'UPDATE campaign_player_count SET players = players - 1 '
+    'WHERE campaign_id = OLD.campaign_id; END',
+)
+
+
+def create_count_triggers(connection: Connection) -> None:
+    """Create the triggers maintaining campaign_player_count"""
+    for statement in COUNT_TRIGGERS:
+        connection.execute(text(statement))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_count_triggers(target: Any, connection: Connection,
+                           tables: Any = (), **kwargs: Any) -> None:
+    if campaign_player_count in tables:
+        create_count_triggers(connection)
+
 
 player_device = db.Table(
     'player_device',
@@ -32,6 +77,15 @@ player_device = db.Table(
         primary_key=True))
 
 
+class InventoryView(NamedTuple):
+    """Materialized view of a player inventory, computed once per instance"""
+    items: Dict[str, int]
+    item_names: Tuple[str, ...]
+    owned_item_names: FrozenSet[str]
+    owned_item_keys: FrozenSet[str]
+    owned_item_bits: int
+
+
 class Player(db.Model):
     """Player model representing user profiles"""
     __tablename__ = 'players'
@@ -56,6 +110,13 @@ class Player(db.Model):
     clan_id = db.Column(db.String, db.ForeignKey('clans.clan_id'))
     custom_field = db.Column(db.String)
 
+    # Matcher access paths: country and level ranges, clan
+    __table_args__ = (
+        db.Index('ix_players_country_level', 'country', 'level'),
+        db.Index('ix_players_level', 'level'),
+        db.Index('ix_players_clan_id', 'clan_id'),
+    )
+
     # Relationships
     devices = db.relationship(
         'Device',
@@ -76,13 +137,64 @@ class Player(db.Model):
             lazy=True))
     clan = db.relationship('Clan', backref='players')
 
+    # Non-mapped, per-instance caches (see get_inventory_view and
+    # assigned_campaign_ids)
+    _inventory_view = None
+    _assigned_campaign_ids = None
+
+    def get_inventory_view(self) -> InventoryView:
+        """Materialize the inventory once and reuse it until it changes.
+
+        The view is dropped when the inventory collection is modified or the
+        instance is expired (e.g. on commit), so it lives for the request.
+
+        Returns:
+            InventoryView: Item quantities and owned item names, keys and bits
+        """
+        view = self._inventory_view
+        if view is None:
+            items: Dict[str, int] = {}
+            names: List[str] = []
+            keys: List[str] = []
+            for player_item in self.inventory:
+                item = player_item.item
+                if not item:
+                    continue
+                items[item.key] = player_item.quantity
+                if player_item.quantity > 0:
+                    names.append(item.name)
+                    keys.append(item.key)
+            view = InventoryView(
+                items=items,
+                item_names=tuple(names),
+                owned_item_names=frozenset(names),
+                owned_item_keys=frozenset(keys),
+                owned_item_bits=item_dictionary.mask(names))
+            self._inventory_view = view
+        return view
+
+    def invalidate_inventory_view(self) -> None:
+        """Drop the materialized inventory view"""
+        self._inventory_view = None
+
+    @property
+    def owned_item_names(self) -> FrozenSet[str]:
+        """Names of the items the player has with quantity > 0"""
+        return self.get_inventory_view().owned_item_names
+
+    @property
+    def owned_item_keys(self) -> FrozenSet[str]:
+        """Keys of the items the player has with quantity > 0"""
+        return self.get_inventory_view().owned_item_keys
+
+    @property
+    def owned_item_bits(self) -> int:
+        """Bitset (see app.bitsets) of the items with quantity > 0"""
+        return self.get_inventory_view().owned_item_bits
+
     def get_items_dict(self) -> Dict[str, int]:
         """Convert player items to a dictionary mapping item keys to quantities."""
-        result = {}
-        for player_item in self.inventory:
-            if player_item.item:
-                result[player_item.item.key] = player_item.quantity
-        return result
+        return dict(self.get_inventory_view().items)
 
     def get_item_names(self) -> List[str]:
         """Get a list of item names that the player has with quantity > 0
@@ -90,8 +202,7 @@ class Player(db.Model):
         Returns:
             List[str]: List of item names
         """
-        return [player_item.item.name for player_item in self.inventory
-                if player_item.item and player_item.quantity > 0]
+        return list(self.get_inventory_view().item_names)
 
     def has_all_items(self, item_names: List[str]) -> bool:
         """Check if player has all the specified items with quantity > 0
@@ -102,8 +213,7 @@ class Player(db.Model):
         Returns:
             bool: True if player has all items, False otherwise
         """
-        player_items = self.get_item_names()
-        return all(item in player_items for item in item_names)
+        return self.owned_item_names.issuperset(item_names)
 
     def has_any_items(self, item_names: List[str]) -> bool:
         """Check if player has any of the specified items with quantity > 0
@@ -114,8 +224,25 @@ class Player(db.Model):
         Returns:
             bool: True if player has any of the items, False otherwise
         """
-        player_items = self.get_item_names()
-        return any(item in player_items for item in item_names)
+        return not self.owned_item_names.isdisjoint(item_names)
+
+    @property
+    def assigned_campaign_ids(self) -> FrozenSet[str]:
+        """Identifiers of the campaigns the player is assigned to
+
+        Computed once and kept until the campaigns collection changes or the
+        instance is expired.
+        """
+        campaign_ids = self._assigned_campaign_ids
+        if campaign_ids is None:
+            campaign_ids = frozenset(
+                campaign.campaign_id for campaign in self.campaigns)
+            self._assigned_campaign_ids = campaign_ids
+        return campaign_ids
+
+    def invalidate_assigned_campaign_ids(self) -> None:
+        """Drop the cached set of assigned campaign identifiers"""
+        self._assigned_campaign_ids = None
 
     def has_campaign(self, campaign_id: str) -> bool:
         """Check if player is already assigned to a campaign
@@ -126,5 +253,39 @@ class Player(db.Model):
         Returns:
             bool: True if player is already assigned to the campaign, False otherwise
         """
-        return any(
-            campaign_id == campaign.campaign_id for campaign in self.campaigns)
+        return campaign_id in self.assigned_campaign_ids
+
+
+@db.event.listens_for(Player.inventory, 'append')
+@db.event.listens_for(Player.inventory, 'remove')
+def _inventory_changed(player: Player, *args) -> None:
+    player.invalidate_inventory_view()
+
+
+@db.event.listens_for(PlayerItem.quantity, 'set')
+def _quantity_changed(player_item: PlayerItem, value: Any, previous: Any,
+                      initiator: Any) -> None:
+    # The owner is set by inventory appends; a loaded inventory row does not
+    # load its player, which is looked up in the session instead
+    player = player_item.__dict__.get('player')
+    session = object_session(player_item)
+    if player is None and session is not None:
+        player = next((
+            instance for instance in session.identity_map.values()
+            if isinstance(instance, Player)
+            and instance.player_id == player_item.player_id), None)
+    if player is not None:
+        player.invalidate_inventory_view()
+
+
+@db.event.listens_for(Player.campaigns, 'append')
+@db.event.listens_for(Player.campaigns, 'remove')
+def _campaigns_changed(player: Player, *args) -> None:
+    player.invalidate_assigned_campaign_ids()
+
+
+@db.event.listens_for(Player, 'expire')
+@db.event.listens_for(Player, 'refresh')
+def _player_reloaded(player: Player, *args) -> None:
+    player.invalidate_inventory_view()
+    player.invalidate_assigned_campaign_ids()
@@ -20,3 +20,9 @@ class PlayerItem(db.Model):
 
     # Relationship to Item
     item = db.relationship("Item")
+
+    # Reverse lookup, owners of an item (covering, quantity > 0)
+    __table_args__ = (
+        db.Index('ix_player_item_item_id_quantity_player_id',
+                 'item_id', 'quantity', 'player_id'),
+    )
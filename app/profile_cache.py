@@ -0,0 +1,312 @@
+"""
+Read-through cache of player profiles.
+
+A cached entry is a compact, immutable snapshot of one player: the matching
+attributes (a PlayerView) and the encoded JSON response body, with a content
+hash of the body used as the profile version in ETags. Entries are
+stored encoded as bytes, either in a bounded in-process LRU or in a shared
+Redis-compatible server, and are invalidated when a transaction writing the
+player (its players row, inventory or campaign assignments) commits.
+Invalidations also advance a per-player generation: a snapshot built from a
+profile loaded before a concurrent invalidation is not stored.
+
+Redis is an optional dependency, only needed for the shared backend.
+"""
+import hashlib
+import json
+from datetime import datetime
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Iterable, List, NamedTuple, Optional, Set
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .engine import PlayerView
+from .metrics import metrics
+from .models import Player, PlayerItem
+
+# Session.info key of the player_ids to invalidate once the session commits
+PENDING_KEY = 'profile_cache.pending'
+# Session.info key of the player_ids invalidated by the last commit
+COMMITTED_KEY = 'profile_cache.committed'
+# Number of invalidation generations, shared by the players hashed together
+GENERATION_SLOTS = 4096
+
+
+class ProfileSnapshot(NamedTuple):
+    """Immutable cached form of a player profile"""
+    view: PlayerView
+    body: bytes
+    version: str
+
+    @classmethod
+    def create(cls, view: PlayerView, body: bytes) -> 'ProfileSnapshot':
+        """Build a snapshot, versioning the profile by its response body"""
+        return cls(view, body, hashlib.blake2b(body, digest_size=8).hexdigest())
+
+    def etag(self, catalog_version: int) -> str:
+        """ETag of the response served under a campaign catalog version"""
+        return f'{self.version}-{catalog_version}'
+
+    def encode(self) -> bytes:
+        """Encode the snapshot for storage in a cache backend
+
+        A JSON header holding the view, then a newline, then the body as is.
+        """
+        view = self.view
+        header = json.dumps({
+            "player_id": view.player_id,
+            "level": view.level,
+            "country": view.country,
+            "item_names": sorted(view.item_names),
+            "campaign_ids": sorted(view.campaign_ids),
+            "total_spent": view.total_spent,
+            "last_session": view.last_session.isoformat()
+            if view.last_session else None,
+            "language": view.language,
+            "clan_id": view.clan_id,
+            "xp": view.xp,
+            "device_models": sorted(view.device_models),
+            "firmwares": sorted(view.firmwares),
+            "version": self.version,
+        }, separators=(',', ':')).encode()
+        return header + b'\n' + self.body
+
+    @classmethod
+    def decode(cls, data: bytes) -> 'ProfileSnapshot':
+        """Decode a snapshot encoded by ProfileSnapshot.encode"""
+        header, body = data.split(b'\n', 1)
+        values = json.loads(header)
+        return cls(
+            view=PlayerView.create(
+                player_id=values["player_id"],
+                level=values["level"],
+                country=values["country"],
+                item_names=values["item_names"],
+                campaign_ids=values["campaign_ids"],
+                total_spent=values["total_spent"],
+                last_session=datetime.fromisoformat(values["last_session"])
+                if values["last_session"] else None,
+                language=values["language"],
+                clan_id=values["clan_id"],
+                xp=values["xp"],
+                device_models=values["device_models"],
+                firmwares=values["firmwares"]),
+            body=body,
+            version=values["version"])
+
+
+class LRUBackend:
+    """Bounded in-process cache of encoded entries, evicting the least
+    recently used"""
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                metrics.incr('profile_cache.evictions')
+            self._publish()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+                self._publish()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._publish()
+
+    def _publish(self) -> None:
+        metrics.set('profile_cache.entries', len(self._entries))
+        metrics.set('profile_cache.bytes', self._bytes)
+
+
+class RedisBackend:
+    """Cache entries stored in a Redis-compatible server
+
+    Any client exposing get, set (with the ex keyword) and delete can be
+    used, which lets tests and local setups plug in a stand-in.
+    """
+
+    def __init__(self, client: Any, prefix: str = 'profile:',
+                 ttl: Optional[int] = None) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> 'RedisBackend':
+        """Connect to the Redis server at url"""
+        if redis is None:
+            raise RuntimeError(
+                "The Redis profile cache requires redis to be installed")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        """Entries of a shared server expire through their ttl only"""
+
+
+class ProfileCache:
+    """Read-through cache of player profile snapshots keyed by player_id"""
+
+    def __init__(self, backend: Optional[Any] = None) -> None:
+        """
+        Args:
+            backend: Cache backend, defaults to an LRUBackend
+        """
+        self.backend = backend if backend is not None else LRUBackend()
+        self.enabled = True
+        self._generations: List[int] = [0] * GENERATION_SLOTS
+        self._lock = Lock()
+
+    def init_app(self, app: Any) -> None:
+        """Read the cache configuration from a Flask app
+
+        Uses PROFILE_CACHE_REDIS_URL when set, otherwise an in-process LRU
+        of PROFILE_CACHE_SIZE entries (0 disables the cache).
+
+        Args:
+            app: Flask application
+        """
+        url = app.config.get('PROFILE_CACHE_REDIS_URL')
+        size = int(app.config.get('PROFILE_CACHE_SIZE', 10000))
+        if url:
+            self.backend = RedisBackend.from_url(url)
+        else:
+            self.backend = LRUBackend(size)
+        self.enabled = bool(url) or size > 0
+        app.extensions['profile_cache'] = self
+
+    def get(self, player_id: str) -> Optional[ProfileSnapshot]:
+        """Return the cached snapshot of a player, or None on a miss"""
+        if not self.enabled:
+            return None
+        data = self.backend.get(player_id)
+        metrics.incr(
+            'profile_cache.misses' if data is None else 'profile_cache.hits')
+        hits = metrics.get('profile_cache.hits')
+        lookups = hits + metrics.get('profile_cache.misses')
+        metrics.set('profile_cache.hit_ratio', hits / lookups)
+        return ProfileSnapshot.decode(data) if data is not None else None
+
+    def generation(self, player_id: str) -> int:
+        """Invalidation generation of a player, to read before loading the
+        profile a snapshot is built from"""
+        return self._generations[hash(player_id) % GENERATION_SLOTS]
+
+    def put(self, snapshot: ProfileSnapshot,
+            generation: Optional[int] = None,
+            session: Optional[Session] = None) -> None:
+        """Store the snapshot of a player
+
+        Args:
+            snapshot: Snapshot to store
+            generation: Generation of the player read before loading the
+                profile; the snapshot is dropped if the player was
+                invalidated since, by another writer than session
+            session: Session whose last commit wrote the profile snapshot
+                was built from
+        """
+        if not self.enabled:
+            return
+        player_id = snapshot.view.player_id
+        if generation is not None and session is not None and \
+                player_id in session.info.pop(COMMITTED_KEY, ()):
+            generation += 1
+        with self._lock:
+            if generation is not None and \
+                    self.generation(player_id) != generation:
+                metrics.incr('profile_cache.stale_puts')
+                return
+            self.backend.set(player_id, snapshot.encode())
+
+    def invalidate(self, player_ids: Iterable[str]) -> None:
+        """Drop the snapshots of players, right away"""
+        player_ids = set(player_ids)
+        with self._lock:
+            for slot in {hash(player_id) % GENERATION_SLOTS
+                         for player_id in player_ids}:
+                self._generations[slot] += 1
+            for player_id in player_ids:
+                self.backend.delete(player_id)
+                metrics.incr('profile_cache.invalidations')
+
+    def invalidate_on_commit(
+            self, session: Session, player_ids: Iterable[str]) -> None:
+        """Drop the snapshots of players once session commits
+
+        For writes the session does not track itself, such as Core inserts.
+        Dropping on commit rather than now keeps a concurrent reader from
+        caching the previous committed state again after the drop; readers
+        that loaded it before are turned away by the generation check of
+        put.
+        """
+        session.info.setdefault(PENDING_KEY, set()).update(player_ids)
+
+    def clear(self) -> None:
+        """Drop every snapshot"""
+        self.backend.clear()
+
+
+# Process-wide cache
+profile_cache = ProfileCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_players(session: Session, flush_context: Any) -> None:
+    player_ids: Set[str] = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, (Player, PlayerItem)):
+            player_ids.add(instance.player_id)
+    if player_ids:
+        profile_cache.invalidate_on_commit(session, player_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_players(session: Session) -> None:
+    player_ids = session.info.pop(PENDING_KEY, None) or set()
+    session.info[COMMITTED_KEY] = player_ids
+    if player_ids:
+        profile_cache.invalidate(player_ids)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_players(session: Session, previous_transaction) -> None:
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,74 @@
+"""
+Player profile loading.
+
+Loads a player together with everything matching and serialization need
+in a fixed number of queries, instead of letting the lazy relationships
+of the models fan out into one statement per relationship and item.
+"""
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.sql import Select
+from .models import db, Item, Player, PlayerItem
+
+
+def profile_query() -> Select:
+    """
+    Build the eager-loading select used for player profiles.
+
+    Issues one statement for the player and its clan, and one per
+    collection: devices, inventory (joined with the item key and name) and
+    campaigns.
+
+    Returns:
+        Select: Statement selecting Player entities
+    """
+    return select(Player).options(
+        joinedload(Player.clan),
+        selectinload(Player.devices),
+        selectinload(Player.inventory)
+        .joinedload(PlayerItem.item)
+        .load_only(Item.key, Item.name),
+        selectinload(Player.campaigns))
+
+
+def load_player_profile(player_id: str) -> Optional[Player]:
+    """
+    Load a player profile in a bounded number of queries.
+
+    Args:
+        player_id: Public identifier of the player
+
+    Returns:
+        Optional[Player]: The player with its relationships loaded, or None
+    """
+    return db.session.execute(
+        profile_query().where(Player.player_id == player_id)
+    ).unique().scalar_one_or_none()
+
+
+def load_player_profiles(
+        player_ids: Iterable[str], chunk_size: int = 500) -> Dict[str, Player]:
+    """
+    Load many player profiles with IN queries.
+
+    Each chunk of identifiers costs the same fixed number of statements as
+    load_player_profile.
+
+    Args:
+        player_ids: Public identifiers of the players
+        chunk_size: Maximum number of identifiers per IN clause
+
+    Returns:
+        Dict[str, Player]: Loaded players keyed by player_id; unknown
+        identifiers are absent
+    """
+    ids: List[str] = list(dict.fromkeys(player_ids))
+    players: Dict[str, Player] = {}
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        for player in db.session.execute(
+                profile_query().where(Player.player_id.in_(chunk))
+        ).unique().scalars():
+            players[player.player_id] = player
+    return players
@@ -0,0 +1,304 @@
+"""
+Offline cohort re-match: evaluate every player against the campaign set.
+
+Players are streamed in keyset-paginated chunks of plain rows (no ORM
+instances), so memory stays flat whatever the size of the players table.
+Each chunk is matched, its assignments are written with one batched
+insert and a checkpoint is saved, so an interrupted run resumes where it
+stopped.
+
+The campaign ids to evaluate again after catalog changes are read from the
+diffs of a catalog, in process or through GET /admin/catalog/changes.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set,
+    Tuple)
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from sqlalchemy import select
+from .catalog import CampaignCatalog, CatalogDiff
+from .columnar import PlayerColumns, match_columns
+from .engine import CompiledCampaign, CompiledCampaignSet, PlayerView
+from .models import (
+    db, Device, Item, Player, PlayerItem, player_campaign, player_device)
+from .services import write_assignment_rows
+
+
+class RematchReport(NamedTuple):
+    """Outcome of a re-match run"""
+    players: int
+    assignments: int
+    seconds: float
+    last_id: int
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.players / self.seconds if self.seconds else 0.0
+
+
+def read_checkpoint(path: Optional[str]) -> int:
+    """Return the last processed players.id stored at path, or 0"""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as checkpoint:
+        return int(json.load(checkpoint)["last_id"])
+
+
+def campaigns_checkpoint(path: Optional[str],
+                         campaign_ids: Iterable[str]) -> Optional[str]:
+    """Checkpoint path of a run over some campaigns only
+
+    A digest of the campaign ids is added before the extension of path, so
+    that runs over different campaigns, or over every campaign, never
+    resume from each other's checkpoint.
+    """
+    if not path:
+        return path
+    digest = hashlib.blake2b(
+        '\n'.join(sorted(campaign_ids)).encode(), digest_size=6).hexdigest()
+    root, extension = os.path.splitext(path)
+    return f'{root}.{digest}{extension}'
+
+
+def write_checkpoint(path: Optional[str], last_id: int) -> None:
+    """Atomically store the last processed players.id at path"""
+    if not path:
+        return
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as checkpoint:
+        json.dump({"last_id": last_id}, checkpoint)
+    os.replace(temporary, path)
+
+
+def stream_player_views(
+        after_id: int = 0, chunk_size: int = 1000
+) -> Iterator[Tuple[int, List[PlayerView]]]:
+    """
+    Stream players as PlayerView chunks, ordered by players.id.
+
+    Each chunk costs four statements: the players page, their owned item
+    names, their devices and their assigned campaigns. Pages are read whole;
+    the keyset on id, not a server-side cursor (pysqlite has none), is what
+    keeps memory flat whatever the size of the table.
+
+    Args:
+        after_id: Only players with a greater players.id are returned
+        chunk_size: Number of players per chunk
+
+    Yields:
+        Tuple[int, List[PlayerView]]: Last players.id of the chunk and the
+        views of its players
+    """
+    last_id = after_id
+    while True:
+        rows = db.session.execute(
+            select(Player.id, Player.player_id, Player.level, Player.country,
+                   Player.total_spent, Player.last_session, Player.language,
+                   Player.clan_id, Player.xp)
+            .where(Player.id > last_id)
+            .order_by(Player.id)
+            .limit(chunk_size)).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        player_ids = [row.player_id for row in rows]
+
+        items: Dict[str, Set[str]] = {}
+        for player_id, name in db.session.execute(
+                select(PlayerItem.player_id, Item.name)
+                .join(Item, Item.id == PlayerItem.item_id)
+                .where(PlayerItem.player_id.in_(player_ids))
+                .where(PlayerItem.quantity > 0)):
+            items.setdefault(player_id, set()).add(name)
+
+        models: Dict[str, Set[str]] = {}
+        firmwares: Dict[str, Set[str]] = {}
+        for player_id, model, firmware in db.session.execute(
+                select(player_device.c.player_id, Device.model,
+                       Device.firmware)
+                .join(Device, Device.id == player_device.c.device_id)
+                .where(player_device.c.player_id.in_(player_ids))):
+            if model:
+                models.setdefault(player_id, set()).add(model)
+            if firmware:
+                firmwares.setdefault(player_id, set()).add(firmware)
+
+        campaigns: Dict[str, Set[str]] = {}
+        for player_id, campaign_id in db.session.execute(
+                select(player_campaign.c.player_id,
+                       player_campaign.c.campaign_id)
+                .where(player_campaign.c.player_id.in_(player_ids))):
+            campaigns.setdefault(player_id, set()).add(campaign_id)
+
+        views = [
+            PlayerView.create(
+                player_id=row.player_id,
+                level=row.level,
+                country=row.country,
+                item_names=items.get(row.player_id, ()),
+                campaign_ids=campaigns.get(row.player_id, ()),
+                total_spent=row.total_spent,
+                last_session=row.last_session,
+                language=row.language,
+                clan_id=row.clan_id,
+                xp=row.xp,
+                device_models=models.get(row.player_id, ()),
+                firmwares=firmwares.get(row.player_id, ()))
+            for row in rows]
+        yield last_id, views
+
+
+def rematch_players(
+        campaign_set: CompiledCampaignSet,
+        chunk_size: int = 1000,
+        checkpoint: Optional[str] = None,
+        progress: Optional[Callable[[RematchReport], None]] = None,
+        columnar: bool = False,
+        campaign_ids: Optional[Iterable[str]] = None
+) -> RematchReport:
+    """
+    Evaluate every player against a campaign set and store assignments.
+
+    Args:
+        campaign_set: Compiled campaigns to match against
+        chunk_size: Number of players per chunk and per insert batch
+        checkpoint: Path of the checkpoint file; the run resumes after the
+            players.id it contains and removes it once complete. With
+            campaign_ids, the path of campaigns_checkpoint is used instead
+        progress: Called with a RematchReport after each chunk
+        columnar: Evaluate each chunk with the vectorized NumPy matcher
+        campaign_ids: Only evaluate these campaigns of the set; when none
+            of them is in the set, no player is read
+
+    Returns:
+        RematchReport: Totals of this run
+    """
+    if campaign_ids is not None:
+        campaign_set = campaign_set.subset(campaign_ids)
+        if not campaign_set.campaigns:
+            return RematchReport(0, 0, 0.0, 0)
+        checkpoint = campaigns_checkpoint(
+            checkpoint, [c.campaign_id for c in campaign_set.campaigns])
+    start = time.perf_counter()
+    last_id = read_checkpoint(checkpoint)
+    processed = 0
+    assigned = 0
+
+    for chunk_last_id, views in stream_player_views(last_id, chunk_size):
+        now = campaign_set.now()
+        values: List[Dict[str, str]] = []
+        matched: Dict[str, CompiledCampaign] = {}
+        if columnar:
+            by_id = {c.campaign_id: c for c in campaign_set.campaigns}
+            eligible = match_columns(
+                PlayerColumns.from_views(views), campaign_set, now)
+            for campaign_id, rows in eligible.items():
+                values.extend(
+                    {"player_id": views[row].player_id,
+                     "campaign_id": campaign_id}
+                    for row in rows.tolist())
+                matched[campaign_id] = by_id[campaign_id]
+        else:
+            for view in views:
+                for campaign in campaign_set.match(view, now):
+                    values.append({
+                        "player_id": view.player_id,
+                        "campaign_id": campaign.campaign_id})
+                    matched[campaign.campaign_id] = campaign
+
+        # Assignments made concurrently by the online route are kept
+        write_assignment_rows(values, matched.values())
+        db.session.commit()
+        db.session.expunge_all()
+
+        last_id = chunk_last_id
+        write_checkpoint(checkpoint, last_id)
+        processed += len(views)
+        assigned += len(values)
+        if progress:
+            progress(RematchReport(
+                processed, assigned, time.perf_counter() - start, last_id))
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return RematchReport(
+        processed, assigned, time.perf_counter() - start, last_id)
+
+
+def rematch_catalog_changes(
+        catalog: CampaignCatalog, since: int, **options: Any
+) -> Tuple[int, RematchReport]:
+    """
+    Evaluate every player against the campaigns added or changed since a
+    catalog version, as a consumer of the catalog diffs.
+
+    Changed campaigns are evaluated again, since their new matchers may
+    accept players the previous ones rejected; removed ones are skipped.
+
+    Args:
+        catalog: Campaign catalog to read the snapshot and diffs from
+        since: Last catalog version processed, 0 for none
+        options: Keyword arguments of rematch_players
+
+    Returns:
+        Tuple[int, RematchReport]: Catalog version processed up to, to pass
+        as since on the next run, and the totals of this run
+
+    Raises:
+        LookupError: If the catalog no longer holds the diffs after since;
+            run rematch_players on the whole set then
+    """
+    snapshot = catalog.snapshot()
+    campaign_ids = changed_campaign_ids(
+        diff for diff in catalog.changes(since)
+        if diff.version <= snapshot.version)
+    return snapshot.version, rematch_players(
+        snapshot.campaign_set, campaign_ids=campaign_ids, **options)
+
+
+def changed_campaign_ids(diffs: Iterable[CatalogDiff]) -> Set[str]:
+    """Campaigns added or changed by successive diffs and still present"""
+    campaign_ids: Set[str] = set()
+    for diff in diffs:
+        campaign_ids.update(diff.added, diff.changed)
+        campaign_ids.difference_update(diff.removed)
+    return campaign_ids
+
+
+def fetch_catalog_changes(url: str, since: int,
+                          timeout: float = 30.0) -> Tuple[int, Set[str]]:
+    """
+    Read the catalog changes since a version from a running server.
+
+    Catalog versions are numbered by each server process, so url must reach
+    the process whose versions since was read from.
+
+    Args:
+        url: Base URL of the server, e.g. http://localhost:5000
+        since: Last catalog version processed, 0 for none
+        timeout: Seconds to wait for the response
+
+    Returns:
+        Tuple[int, Set[str]]: Catalog version of the server, to pass as
+        since on the next run, and the campaign ids to evaluate again
+
+    Raises:
+        LookupError: If the server no longer holds the diffs after since;
+            run rematch_players on the whole set then
+    """
+    query = urlencode({"since": since})
+    try:
+        with urlopen(f'{url.rstrip("/")}/admin/catalog/changes?{query}',
+                     timeout=timeout) as response:
+            changes = json.load(response)
+    except HTTPError as error:
+        if error.code == 410:
+            raise LookupError(json.load(error)["error"]) from error
+        raise
+    return changes["version"], changed_campaign_ids(
+        CatalogDiff(**diff) for diff in changes["changes"])
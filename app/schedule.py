@@ -0,0 +1,154 @@
+"""
+Activity schedule of a compiled campaign set.
+
+Campaigns start and end at known instants, so the set of running campaigns
+only changes at those boundaries. A CampaignSchedule computes the active
+campaigns once, remembers the window of time during which that answer
+holds, and computes it again only when the clock leaves the window: on the
+first lookup past the boundary, or ahead of time from a timer thread.
+
+The time source is injectable, so that tests can move time deterministically.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from threading import Timer
+from typing import (
+    TYPE_CHECKING, Callable, FrozenSet, List, NamedTuple, Optional, Sequence)
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .engine import CompiledCampaign
+
+Clock = Callable[[], datetime]
+
+# Campaigns are active up to and including their end date
+END_RESOLUTION = timedelta(microseconds=1)
+# Longest wait of the timer, which re-arms itself until the next boundary
+MAX_TIMER_DELAY = 3600.0
+
+
+def utc_now() -> datetime:
+    """Current time, in UTC"""
+    return datetime.now(timezone.utc)
+
+
+class ActiveWindow(NamedTuple):
+    """Positions of the active campaigns, valid from since until until"""
+    since: Optional[datetime]
+    until: Optional[datetime]
+    active: FrozenSet[int]
+
+    def covers(self, now: datetime) -> bool:
+        return (self.since is None or now >= self.since) \
+            and (self.until is None or now < self.until)
+
+
+class CampaignSchedule:
+    """Start and end boundaries of campaigns, with the active subset"""
+
+    def __init__(self, campaigns: Sequence['CompiledCampaign'],
+                 clock: Optional[Clock] = None) -> None:
+        """
+        Args:
+            campaigns: Compiled campaigns; the active subset holds their
+                positions in this sequence
+            clock: Time source returning aware datetimes, defaults to the
+                current UTC time
+        """
+        self.campaigns = campaigns
+        self.clock: Clock = clock or utc_now
+        boundaries = set()
+        for campaign in campaigns:
+            # Same rule as CompiledCampaign.is_active: dates only apply
+            # when both are set
+            if campaign.enabled and campaign.start_date \
+                    and campaign.end_date:
+                boundaries.add(campaign.start_date)
+                boundaries.add(campaign.end_date + END_RESOLUTION)
+        self.boundaries: List[datetime] = sorted(boundaries)
+        self._timer: Optional[Timer] = None
+        self._running = False
+        self._window = self._publish(self._compute(self.clock()))
+
+    @property
+    def next_change(self) -> Optional[datetime]:
+        """Next instant at which a campaign starts or ends, if any"""
+        return self._window.until
+
+    def active(self, now: Optional[datetime] = None) -> FrozenSet[int]:
+        """
+        Return the positions of the campaigns running at a given time.
+
+        Lookups inside the current window are a comparison; a time past the
+        window moves the window forward, and any other time is computed
+        without replacing it.
+
+        Args:
+            now: Time of the lookup, defaults to the clock
+
+        Returns:
+            FrozenSet[int]: Positions of the enabled, running campaigns
+        """
+        if now is None:
+            now = self.clock()
+        window = self._window
+        if window.covers(now):
+            return window.active
+        computed = self._compute(now)
+        if window.until is not None and now >= window.until:
+            self._publish(computed)
+        return computed.active
+
+    def refresh(self) -> None:
+        """Recompute the active subset at the current clock time"""
+        self._publish(self._compute(self.clock()))
+
+    def start(self) -> None:
+        """Refresh the active subset from a timer at each boundary"""
+        if not self._running:
+            self._running = True
+            self._arm()
+
+    def stop(self) -> None:
+        """Cancel the timer"""
+        self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _arm(self) -> None:
+        until = self._window.until
+        if until is None or not self._running:
+            self._timer = None
+            return
+        delay = (until - self.clock()).total_seconds()
+        self._timer = Timer(
+            min(max(delay, 0.0), MAX_TIMER_DELAY), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        if self._running:
+            self.refresh()
+            self._arm()
+
+    def _publish(self, window: ActiveWindow) -> ActiveWindow:
+        # Single reference assignment: readers see either window
+        self._window = window
+        metrics.set('campaign_schedule.active', len(window.active))
+        if window.until is not None:
+            metrics.set('campaign_schedule.next_change',
+                        window.until.timestamp())
+        return window
+
+    def _compute(self, now: datetime) -> ActiveWindow:
+        position = bisect_right(self.boundaries, now)
+        window = ActiveWindow(
+            since=self.boundaries[position - 1] if position else None,
+            until=self.boundaries[position]
+            if position < len(self.boundaries) else None,
+            active=frozenset(
+                index for index, campaign in enumerate(self.campaigns)
+                if campaign.is_active(now)))
+        metrics.incr('campaign_schedule.recomputes')
+        return window
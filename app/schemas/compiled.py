@@ -0,0 +1,201 @@
+"""
+Serializers generated from marshmallow schemas.
+
+compile_schema turns the dump side of a schema into the source of one flat
+function over a tuple of attribute values, built once, so that a dump no
+longer goes through marshmallow's per-field method calls. The output is the
+same as schema.dump; only the field types used by this package's schemas
+are supported.
+
+orjson is an optional dependency, used to encode when installed.
+"""
+import json
+import math
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+from marshmallow import Schema, fields
+
+HOOKS = ('pre_dump', 'post_dump')
+
+
+def _has_attribute(model: Any, attribute: str) -> bool:
+    # marshmallow omits fields whose attribute the object does not have
+    return model is None or hasattr(model, attribute)
+
+
+class _Generator:
+    """Builds the source of a dump function, one expression per field"""
+
+    def __init__(self) -> None:
+        self.namespace: Dict[str, Any] = {}
+        self.float_keys: List[str] = []
+        self.floats = 0
+        self._loops = 0
+
+    def constant(self, value: Any) -> str:
+        name = f'_c{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    def schema(self, schema: Schema, value: str) -> str:
+        """Expression building the dict of a (nested) schema from value"""
+        model = getattr(schema.opts, 'model', None)
+        items = []
+        for name, field in schema.dump_fields.items():
+            attribute = field.attribute or name
+            if not _has_attribute(model, attribute):
+                continue
+            items.append('%r: %s' % (
+                field.data_key or name,
+                self.field(field, f'{value}.{attribute}')))
+        return '{' + ', '.join(items) + '}'
+
+    def field(self, field: fields.Field, value: str) -> str:
+        """Expression serializing value with field"""
+        if field.dump_default is not fields.missing_:
+            raise NotImplementedError(
+                f"dump_default is not supported ({field.name})")
+        if isinstance(field, fields.Float):
+            self.floats += 1
+            expression = f'float({value})'
+        elif isinstance(field, fields.Integer):
+            expression = f'int({value})'
+        elif isinstance(field, fields.String):
+            expression = f'str({value})'
+        elif isinstance(field, fields.DateTime) and not isinstance(
+                field, (fields.NaiveDateTime, fields.AwareDateTime)):
+            data_format = field.format or field.DEFAULT_FORMAT
+            function = field.SERIALIZATION_FUNCS.get(data_format)
+            if function is not None:
+                expression = f'{self.constant(function)}({value})'
+            else:
+                expression = f'{value}.strftime({data_format!r})'
+        elif isinstance(field, fields.Nested):
+            schema = field.schema
+            if schema.many:
+                expression = self.loop(value, lambda item: self.schema(
+                    schema, item))
+            else:
+                expression = self.schema(schema, value)
+        elif isinstance(field, fields.List):
+            expression = self.loop(
+                value, lambda item: self.field(field.inner, item))
+        else:
+            raise NotImplementedError(
+                f"{type(field).__name__} fields are not supported")
+        return f'(None if {value} is None else {expression})'
+
+    def loop(self, value: str, element: Callable[[str], str]) -> str:
+        item = f'_i{self._loops}'
+        self._loops += 1
+        return f'[{element(item)} for {item} in {value}]'
+
+
+class CompiledSerializer:
+    """Flat dump function generated from a schema, with a JSON encoder"""
+
+    def __init__(self, schema: Schema, ignore_hooks: Sequence[str] = ()):
+        """
+        Args:
+            schema: Schema to compile (its dump side only)
+            ignore_hooks: Names of pre/post_dump hooks known not to change
+                the output; any other dump hook is refused
+        """
+        for (tag, _), names in schema._hooks.items():
+            if tag in HOOKS and set(names) - set(ignore_hooks):
+                raise NotImplementedError(
+                    f"{tag} hooks are not supported: {names}")
+
+        generator = _Generator()
+        model = getattr(schema.opts, 'model', None)
+        self.attributes: Tuple[str, ...] = ()
+        items: List[str] = []
+        for name, field in schema.dump_fields.items():
+            attribute = field.attribute or name
+            if not _has_attribute(model, attribute):
+                continue
+            value = f'_v{len(self.attributes)}'
+            self.attributes += (attribute,)
+            key = field.data_key or name
+            if isinstance(field, fields.Float):
+                generator.float_keys.append(key)
+            items.append('%r: %s' % (key, generator.field(field, value)))
+
+        self.source = (
+            'def dump_row(_r):\n'
+            f'    {", ".join(f"_v{i}" for i in range(len(self.attributes)))},'
+            ' = _r\n'
+            '    return {\n        ' + ',\n        '.join(items) + '}\n')
+        exec(compile(self.source, f'<{type(schema).__name__} serializer>',
+                     'exec'), generator.namespace)
+        self.dump_row: Callable[[Tuple], Dict[str, Any]] = \
+            generator.namespace['dump_row']
+        self._float_keys = tuple(generator.float_keys)
+        # Floats of nested objects are not checked, they rule orjson out
+        self._orjson = orjson is not None and \
+            generator.floats == len(self._float_keys)
+        getter = attrgetter(*self.attributes)
+        self.row: Callable[[Any], Tuple] = (
+            getter if len(self.attributes) > 1
+            else lambda obj: (getter(obj),))
+
+    def dump(self, obj: Any) -> Dict[str, Any]:
+        """Same result as schema.dump(obj)"""
+        return self.dump_row(self.row(obj))
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        """
+        Encode a dump as Flask's jsonify does outside debug mode: sorted
+        keys, compact separators, ASCII only and a trailing newline.
+
+        Uses orjson when installed and the output would be identical,
+        that is unless the data holds non-ASCII text, DEL characters or
+        floats that Python writes in exponent notation.
+
+        Args:
+            data: Result of dump
+
+        Returns:
+            bytes: The response body
+        """
+        if self._orjson and all(
+                _plain_float(data.get(key)) for key in self._float_keys):
+            try:
+                body = orjson.dumps(data, option=(
+                    orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE))
+            except TypeError:
+                pass
+            else:
+                if body.isascii() and b'\x7f' not in body:
+                    return body
+        return (json.dumps(data, sort_keys=True, separators=(',', ':'))
+                + '\n').encode()
+
+
+def _plain_float(value: Any) -> bool:
+    # Python's repr switches to exponent notation outside [1e-4, 1e16)
+    return value is None or value == 0 or (
+        math.isfinite(value) and 1e-4 <= abs(value) < 1e16)
+
+
+def compile_schema(
+        schema: Schema, ignore_hooks: Sequence[str] = ()
+) -> CompiledSerializer:
+    """
+    Generate the flat serializer of a schema.
+
+    Args:
+        schema: Schema to compile
+        ignore_hooks: Dump hooks known not to change the output
+
+    Returns:
+        CompiledSerializer: Serializer producing the same output as
+        schema.dump
+    """
+    return CompiledSerializer(schema, ignore_hooks)
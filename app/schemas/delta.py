@@ -0,0 +1,23 @@
+"""
+Player delta schema for deserialization
+"""
+from marshmallow import fields, validate
+from . import ma
+
+
+class PlayerDeltaSchema(ma.Schema):
+    """Schema for a change of player state: new attribute values, and new
+    quantities of items keyed by item key"""
+    level = fields.Int()
+    xp = fields.Int()
+    country = fields.Str()
+    language = fields.Str()
+    total_spent = fields.Float()
+    clan_id = fields.Str(allow_none=True)
+    last_session = fields.DateTime(format="%Y-%m-%d %H:%M:%S%z")
+    items = fields.Dict(
+        keys=fields.Str(), values=fields.Int(validate=validate.Range(min=0)))
+
+
+# Initialize schemas
+player_delta_schema = PlayerDeltaSchema()
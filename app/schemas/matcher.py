@@ -2,13 +2,12 @@
 Matcher and API Campaign schemas for serialization
 """
 from . import ma
+from ..matchers import registry
 
 
-class MatcherSchema(ma.Schema):
-    """Schema for campaign matcher criteria"""
-    level = ma.Dict(keys=ma.Str(enum=['min', 'max']), values=ma.Int())
-    has = ma.Dict(keys=ma.Str(enum=['country', 'items']), values=ma.List(ma.Str()))
-    does_not_have = ma.Dict(keys=ma.Str(enum=['items']), values=ma.List(ma.Str()))
+class MatcherSchema(registry.schema(ma.Schema)):
+    """Schema for campaign matcher criteria, one field per section of the
+    matcher types registered in app.matchers"""
 
 
 class APICampaignSchema(ma.Schema):
@@ -7,6 +7,7 @@ from ..models.player import Player
 from .device import DeviceSchema
 from .clan import ClanSchema
 from .campaign import CampaignSchema
+from .compiled import compile_schema
 
 
 class PlayerSchema(ma.SQLAlchemyAutoSchema):
@@ -60,3 +61,7 @@ class PlayerSchema(ma.SQLAlchemyAutoSchema):
 # Initialize schemas
 player_schema = PlayerSchema()
 players_schema = PlayerSchema(many=True)
+
+# Generated equivalent of player_schema.dump. process_items leaves the output
+# unchanged: self.instance is only set when loading, never during a dump.
+player_serializer = compile_schema(player_schema, ignore_hooks=('process_items',))
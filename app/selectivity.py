@@ -0,0 +1,181 @@
+"""
+Runtime statistics of matcher rules, and the evaluation order derived from
+them.
+
+One campaign evaluation in sample_every runs every rule of the campaign,
+without short-circuiting, and records for each rule whether it rejected the
+player and how long it took; sampled rules therefore see the unconditional
+rejection rate. Every reorder_every sampled evaluations, campaign sets sort
+the rules of each campaign by observed cost per rejection, so that the
+checks rejecting most players for the least time run first.
+
+Counters are updated without a lock: concurrent requests may lose a few
+increments, which only blurs statistics used for ordering.
+"""
+import itertools
+import time
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple)
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .engine import CompiledCampaign, PlayerView
+    from .matchers import Rule
+
+
+class RuleStats:
+    """Sampled outcomes of one rule of one campaign"""
+    __slots__ = ('evaluations', 'rejections', 'nanoseconds')
+
+    def __init__(self) -> None:
+        self.evaluations = 0
+        self.rejections = 0
+        self.nanoseconds = 0
+
+    @property
+    def rejection_rate(self) -> float:
+        return self.rejections / self.evaluations if self.evaluations else 0.0
+
+    @property
+    def mean_ns(self) -> float:
+        return self.nanoseconds / self.evaluations if self.evaluations else 0.0
+
+    @property
+    def rank(self) -> float:
+        """Observed cost per rejected player; lower ranks run first"""
+        if not self.rejections:
+            return float('inf')
+        return self.nanoseconds / self.rejections
+
+
+class MatcherStatistics:
+    """Rejection rate and cost of each (campaign, rule) pair"""
+
+    def __init__(self, sample_every: int = 64, reorder_every: int = 1000,
+                 min_samples: int = 32) -> None:
+        """
+        Args:
+            sample_every: One campaign evaluation in sample_every is
+                measured; 0 disables sampling
+            reorder_every: Number of sampled evaluations between two
+                reorderings of a campaign set
+            min_samples: Evaluations a rule needs before its statistics
+                override the static cost hints
+        """
+        self.sample_every = sample_every
+        self.reorder_every = reorder_every
+        self.min_samples = min_samples
+        self.sampled = 0
+        self._counter = itertools.count()
+        self._stats: Dict[Tuple[str, str], RuleStats] = {}
+
+    def init_app(self, app: Any) -> None:
+        """Read the sampling configuration from a Flask app
+
+        Args:
+            app: Flask application
+        """
+        self.sample_every = int(app.config['MATCHER_SAMPLE_EVERY'])
+        self.reorder_every = int(app.config['MATCHER_REORDER_EVERY'])
+        app.extensions['matcher_statistics'] = self
+
+    def sample(self) -> bool:
+        """Whether the next campaign evaluation should be measured"""
+        return bool(self.sample_every) \
+            and next(self._counter) % self.sample_every == 0
+
+    def evaluate(self, campaign: 'CompiledCampaign', view: 'PlayerView',
+                 now: Optional[datetime] = None) -> bool:
+        """
+        Evaluate every rule of a campaign, recording each outcome.
+
+        Args:
+            campaign: Compiled campaign
+            view: PlayerView of the player
+            now: Reference time of time-based rules
+
+        Returns:
+            bool: Same result as campaign.matches(view, now)
+        """
+        matched = True
+        clock = time.perf_counter_ns
+        for rule in campaign.rules:
+            start = clock()
+            passed = rule.test(view, now)
+            elapsed = clock() - start
+            stats = self._stats.get((campaign.campaign_id, rule.name))
+            if stats is None:
+                stats = self._stats.setdefault(
+                    (campaign.campaign_id, rule.name), RuleStats())
+            stats.evaluations += 1
+            stats.nanoseconds += elapsed
+            if not passed:
+                stats.rejections += 1
+                matched = False
+        self.sampled += 1
+        metrics.incr('matcher_stats.sampled')
+        return matched
+
+    def get(self, campaign_id: str, rule_name: str) -> RuleStats:
+        """Statistics of a rule of a campaign (empty if never sampled)"""
+        return self._stats.get((campaign_id, rule_name)) or RuleStats()
+
+    def order(self, campaign: 'CompiledCampaign') -> Tuple['Rule', ...]:
+        """
+        Return the rules of a campaign in their preferred order.
+
+        Sorted by observed cost per rejection once every rule has at least
+        min_samples evaluations; in their current (hint-based) order until
+        then.
+
+        Args:
+            campaign: Compiled campaign
+
+        Returns:
+            Tuple[Rule, ...]: The campaign rules, reordered
+        """
+        stats = [self.get(campaign.campaign_id, rule.name)
+                 for rule in campaign.rules]
+        if any(s.evaluations < self.min_samples for s in stats):
+            return campaign.rules
+        ranked = sorted(zip(stats, range(len(stats)), campaign.rules),
+                        key=lambda entry: (entry[0].rank, entry[1]))
+        return tuple(rule for _, _, rule in ranked)
+
+    def report(self, campaigns: Iterable['CompiledCampaign']
+               ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Describe the rules of campaigns, in their evaluation order.
+
+        Args:
+            campaigns: Compiled campaigns
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: For each campaign_id, one entry
+            per rule: name, evaluations, rejection_rate, mean_ns and the
+            static cost and pass_rate hints
+        """
+        report: Dict[str, List[Dict[str, Any]]] = {}
+        for campaign in campaigns:
+            report[campaign.campaign_id] = [
+                {
+                    "rule": rule.name,
+                    "evaluations": stats.evaluations,
+                    "rejection_rate": stats.rejection_rate,
+                    "mean_ns": stats.mean_ns,
+                    "cost": rule.cost,
+                    "pass_rate": rule.pass_rate,
+                }
+                for rule in campaign.rules
+                for stats in [self.get(campaign.campaign_id, rule.name)]]
+        return report
+
+    def reset(self) -> None:
+        """Forget all statistics"""
+        self._stats = {}
+        self.sampled = 0
+
+
+# Process-wide statistics, shared by the successive campaign sets
+matcher_statistics = MatcherStatistics()
@@ -1,6 +1,15 @@
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional
-from .models import Player
+from typing import (
+    Callable, Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple)
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from .engine import CompiledCampaign, CompiledCampaignSet, PlayerView
+from .models import db, Campaign, Item, Player, PlayerItem, player_campaign
+from .profile_cache import profile_cache
+from .profiles import load_player_profiles
+from .schemas import player_schema
 
 
 def filter_eligible_campaigns(
@@ -99,4 +108,317 @@ def check_campaign_is_active(campaign: Dict[str, Any]) -> bool:
         if current_time < start_date or current_time > end_date:
             return False
 
-    return True
\ No newline at end of file
+    return True
+
+
+# Session.info key of the campaign rows to record once the session commits
+PENDING_ROWS_KEY = 'campaign_rows.pending'
+
+
+class CampaignRowCache:
+    """
+    Process-wide record of the campaigns known to exist in the campaigns
+    table, keyed by campaign_id. A campaign whose name changed is not
+    considered stored; removed campaigns are forgotten when the catalog
+    drops them.
+    """
+
+    def __init__(self) -> None:
+        self._names: Dict[str, str] = {}
+
+    def __contains__(self, campaign: CompiledCampaign) -> bool:
+        return self._names.get(campaign.campaign_id) == campaign.name
+
+    def add(self, campaign: CompiledCampaign) -> None:
+        self._names[campaign.campaign_id] = campaign.name
+
+    def update(self, names: Dict[str, str]) -> None:
+        """Record stored campaign names keyed by campaign_id"""
+        self._names.update(names)
+
+    def add_on_commit(self, session: Session,
+                      campaigns: Iterable[CompiledCampaign]) -> None:
+        """Record campaigns once session commits
+
+        A row upserted by a transaction that rolls back was never stored,
+        so it is only recorded when the transaction commits.
+        """
+        session.info.setdefault(PENDING_ROWS_KEY, {}).update(
+            (campaign.campaign_id, campaign.name) for campaign in campaigns)
+
+    def discard(self, campaign_ids: Iterable[str]) -> None:
+        for campaign_id in campaign_ids:
+            self._names.pop(campaign_id, None)
+
+    def clear(self) -> None:
+        self._names = {}
+
+
+campaign_rows = CampaignRowCache()
+
+
+@event.listens_for(Session, 'after_commit')
+def _record_committed_campaign_rows(session: Session) -> None:
+    names = session.info.pop(PENDING_ROWS_KEY, None)
+    if names:
+        campaign_rows.update(names)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_campaign_rows(
+        session: Session, previous_transaction) -> None:
+    session.info.pop(PENDING_ROWS_KEY, None)
+
+
+def ensure_campaign_rows(campaigns: Iterable[CompiledCampaign]) -> None:
+    """
+    Upsert the campaigns table rows of compiled campaigns.
+
+    Campaigns already recorded in campaign_rows cost nothing; the others are
+    written with a single INSERT ... ON CONFLICT DO UPDATE, which keeps the
+    stored name in sync with the catalog, and recorded once the session
+    commits.
+
+    Args:
+        campaigns: Compiled campaigns about to be assigned
+    """
+    missing: Dict[str, CompiledCampaign] = {
+        campaign.campaign_id: campaign
+        for campaign in campaigns if campaign not in campaign_rows}
+    if not missing:
+        return
+
+    statement = insert(Campaign).values([
+        {"campaign_id": campaign_id, "name": campaign.name}
+        for campaign_id, campaign in missing.items()])
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[Campaign.campaign_id],
+        set_={"name": statement.excluded.name}))
+    campaign_rows.add_on_commit(db.session, missing.values())
+
+
+def assign_campaigns(
+        assignments: Dict[Player, List[CompiledCampaign]]) -> int:
+    """
+    Persist new player/campaign assignments with one bulk insert.
+
+    Rows of the campaigns table are upserted first. player_campaign rows are
+    inserted directly with INSERT ... ON CONFLICT DO NOTHING, so concurrent
+    assignments of the same campaign do not fail. The players' campaigns
+    collections are updated in place so that they can be serialized without
+    being reloaded, and their cached profiles are dropped on commit. The
+    caller commits.
+
+    Args:
+        assignments: Newly matched campaigns for each player
+
+    Returns:
+        int: Number of player_campaign rows written
+    """
+    matched: Dict[str, CompiledCampaign] = {
+        campaign.campaign_id: campaign
+        for campaigns in assignments.values()
+        for campaign in campaigns}
+    if not matched:
+        return 0
+
+    values: List[Dict[str, str]] = [
+        {"player_id": player.player_id, "campaign_id": campaign.campaign_id}
+        for player, campaigns in assignments.items()
+        for campaign in campaigns]
+    write_assignment_rows(values, matched.values())
+
+    attach_campaigns(assignments, {
+        campaign.campaign_id: campaign
+        for campaign in Campaign.query.filter(
+            Campaign.campaign_id.in_(matched))})
+
+    return len(values)
+
+
+def attach_campaigns(
+        assignments: Dict[Player, List[CompiledCampaign]],
+        rows: Dict[str, Campaign]) -> None:
+    """
+    Add campaigns to the players' campaigns collections, as already stored.
+
+    The collections are set as committed state: the session does not write
+    them, the caller persists the assignments its own way.
+
+    Args:
+        assignments: Newly matched campaigns for each player
+        rows: Campaign objects keyed by campaign_id
+    """
+    for player, campaigns in assignments.items():
+        assigned = player.assigned_campaign_ids
+        set_committed_value(player, 'campaigns', list(player.campaigns) + [
+            rows[campaign.campaign_id] for campaign in campaigns
+            if campaign.campaign_id not in assigned])
+        player.invalidate_assigned_campaign_ids()
+
+
+def write_assignment_rows(rows: List[Dict[str, str]],
+                          campaigns: Iterable[CompiledCampaign]) -> int:
+    """
+    Persist player/campaign assignments made outside of a loaded session.
+
+    Same writes as assign_campaigns, without touching loaded players. The
+    caller commits.
+
+    Args:
+        rows: player_campaign rows, as player_id and campaign_id
+        campaigns: Assigned campaigns, or any objects with their
+            campaign_id and name
+
+    Returns:
+        int: Number of player_campaign rows written
+    """
+    if not rows:
+        return 0
+    ensure_campaign_rows(campaigns)
+    db.session.execute(insert(player_campaign).on_conflict_do_nothing(), rows)
+    profile_cache.invalidate_on_commit(
+        db.session, {row["player_id"] for row in rows})
+    return len(rows)
+
+
+# Player columns a delta may set, each read by matchers under the same name
+DELTA_ATTRIBUTES = (
+    'level', 'xp', 'country', 'language', 'total_spent', 'clan_id',
+    'last_session')
+
+
+def _naive_utc(value: Any) -> Any:
+    """Convert an aware datetime to the naive UTC form stored by SQLite"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def apply_player_delta(
+        player: Player, delta: Dict[str, Any],
+        campaign_set: CompiledCampaignSet) -> List[CompiledCampaign]:
+    """
+    Apply a change of a player's state and assign the campaigns it unlocks.
+
+    Only the campaigns whose rules read a changed attribute are evaluated,
+    through the dependency map of the campaign set. A new item quantity
+    changes the item_names attribute only when the item becomes owned or
+    stops being owned. The caller commits.
+
+    Args:
+        player: Player profile, loaded by load_player_profile
+        delta: Change loaded through PlayerDeltaSchema: new attribute values
+            and an "items" dictionary of new quantities by item key; aware
+            datetimes are stored as naive UTC, like the database columns
+        campaign_set: Compiled campaigns to match against
+
+    Returns:
+        List[CompiledCampaign]: Newly assigned campaigns
+
+    Raises:
+        LookupError: If an item key is unknown; nothing is changed then
+    """
+    items: Dict[str, int] = delta.get("items") or {}
+    inventory: Dict[str, PlayerItem] = {
+        player_item.item.key: player_item for player_item in player.inventory
+        if player_item.item}
+    missing: Set[str] = set(items) - set(inventory)
+    new_items: Dict[str, Item] = {}
+    if missing:
+        new_items = {item.key: item for item in
+                     Item.query.filter(Item.key.in_(missing))}
+        if len(new_items) < len(missing):
+            raise LookupError(
+                f"Unknown items: {sorted(missing - set(new_items))}")
+
+    values: Dict[str, Any] = {
+        name: _naive_utc(delta[name])
+        for name in DELTA_ATTRIBUTES if name in delta}
+    changed: Set[str] = {
+        name for name, value in values.items()
+        if getattr(player, name) != value}
+    for name in changed:
+        setattr(player, name, values[name])
+
+    if items:
+        owned = player.owned_item_names
+        for key, quantity in items.items():
+            if key in inventory:
+                inventory[key].quantity = quantity
+            else:
+                player.inventory.append(
+                    PlayerItem(item=new_items[key], quantity=quantity))
+        if player.owned_item_names != owned:
+            changed.add('item_names')
+
+    if not changed and not items:
+        return []
+    profile_cache.invalidate_on_commit(db.session, [player.player_id])
+    if not changed:
+        return []
+
+    matched = campaign_set.match_changed(
+        PlayerView.from_player(player), changed)
+    if matched:
+        assign_campaigns({player: matched})
+    return matched
+
+
+def get_client_configs(
+        player_ids: Iterable[str],
+        campaign_set: CompiledCampaignSet,
+        chunk_size: int = 500,
+        dump: Callable[[Player], Dict[str, Any]] = player_schema.dump
+) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Match, assign and serialize many players, one chunk at a time.
+
+    Each chunk is loaded with a few IN queries, matched against the shared
+    campaign set, assigned with a single bulk insert and committed before
+    its results are yielded.
+
+    Args:
+        player_ids: Public identifiers of the players
+        campaign_set: Compiled campaigns to match against
+        chunk_size: Number of players per chunk
+        dump: Player serializer, player_schema.dump or an equivalent
+
+    Yields:
+        Tuple[str, Optional[Dict[str, Any]]]: Player identifier and its
+        serialized profile, or None if the player does not exist
+    """
+    chunk: List[str] = []
+    for player_id in player_ids:
+        chunk.append(player_id)
+        if len(chunk) >= chunk_size:
+            yield from _get_client_configs_chunk(chunk, campaign_set, dump)
+            chunk = []
+    if chunk:
+        yield from _get_client_configs_chunk(chunk, campaign_set, dump)
+
+
+def _get_client_configs_chunk(
+        player_ids: List[str],
+        campaign_set: CompiledCampaignSet,
+        dump: Callable[[Player], Dict[str, Any]]
+) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    players: Dict[str, Player] = load_player_profiles(player_ids)
+    now: datetime = campaign_set.now()
+
+    assignments: Dict[Player, List[CompiledCampaign]] = {}
+    for player in players.values():
+        matched = campaign_set.match(PlayerView.from_player(player), now)
+        if matched:
+            assignments[player] = matched
+
+    assign_campaigns(assignments)
+
+    # Serialize before committing: the commit expires the loaded players
+    results: List[Tuple[str, Optional[Dict[str, Any]]]] = [
+        (player_id,
+         dump(players[player_id])
+         if player_id in players else None)
+        for player_id in player_ids]
+    db.session.commit()
+    return results
@@ -0,0 +1,80 @@
+"""
+Single-flight execution: concurrent calls with the same key share one
+execution of the function, and all receive its result (or its exception).
+
+Calls are only shared while in flight; a call starting after the previous
+one returned executes again, so results are never served stale.
+"""
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+from .metrics import metrics
+
+T = TypeVar('T')
+
+
+class _Call:
+    """Execution in flight, awaited by the coalesced callers"""
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    """Coalesces concurrent calls by key"""
+
+    def __init__(self, name: str) -> None:
+        """
+        Args:
+            name: Prefix of the metrics: <name>.calls counts every call,
+                <name>.coalesced the calls answered by another one's
+                execution, and the <name>.in_flight gauge the executions
+                in progress
+        """
+        self.name = name
+        self._lock = Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, function: Callable[[], T]) -> T:
+        """
+        Call function, unless a call with the same key is in flight, in
+        which case wait for it and return its result.
+
+        Args:
+            key: Identity of the call
+            function: Computation to run, without arguments
+
+        Returns:
+            T: Result of the shared execution
+
+        Raises:
+            Exception: Whatever the shared execution raised
+        """
+        metrics.incr(f'{self.name}.calls')
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                metrics.set(f'{self.name}.in_flight', len(self._calls))
+
+        if not leader:
+            metrics.incr(f'{self.name}.coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                metrics.set(f'{self.name}.in_flight', len(self._calls))
+            call.done.set()
+        return call.result
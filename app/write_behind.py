@@ -0,0 +1,324 @@
+"""
+Write-behind queue of campaign assignments.
+
+When enabled, get_client_config acknowledges a new assignment once it is
+appended to a local log file (fsync'd), and answers with the player's
+collections updated in memory; a background thread writes the queued
+assignments to player_campaign in batched transactions, then drops the
+cached profiles of their players. Assignments are idempotent, so the log is
+replayed as a whole after a crash; after each batch it is rewritten with
+the assignments still pending, which keeps it as small as the queue. The
+log is locked by the process that opened it: another process of the same
+application, such as a script, keeps writing synchronously.
+
+The queue is bounded: a request finding it full waits for room, up to a
+timeout, and then falls back to a synchronous write.
+"""
+import atexit
+import json
+import logging
+import os
+from collections import deque
+from threading import Condition, Event, Lock, Thread
+from typing import Any, Deque, Dict, Iterable, List, NamedTuple, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from .engine import CompiledCampaign
+from .metrics import metrics
+from .models import db, Campaign, Player
+from .services import attach_campaigns, write_assignment_rows
+
+logger = logging.getLogger(__name__)
+
+
+class AssignmentLogLockedError(RuntimeError):
+    """Raised when another process holds the assignment log"""
+
+
+class PendingAssignment(NamedTuple):
+    """Assignment acknowledged but not written to the database yet"""
+    player_id: str
+    campaign_id: str
+    name: str
+
+
+class AssignmentLog:
+    """Append-only file of the pending assignments, one JSON line each
+
+    The log is held under an exclusive lock on a companion .lock file until
+    it is closed.
+    """
+
+    def __init__(self, path: str, fsync: bool = True) -> None:
+        """
+        Args:
+            path: Log file, created if missing
+            fsync: Sync every append to disk before acknowledging it
+
+        Raises:
+            AssignmentLogLockedError: If another log holds the file
+        """
+        self.path = path
+        self.fsync = fsync
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(path + '.lock', 'ab')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock_file.close()
+                raise AssignmentLogLockedError(
+                    f"Assignment log {path} is in use") from None
+        self._file = open(path, 'ab')
+
+    def append(self, assignments: Iterable[PendingAssignment]) -> None:
+        self._file.write(self._encode(assignments))
+        self._sync(self._file)
+
+    def read(self) -> List[PendingAssignment]:
+        """Logged assignments; a line torn by a crash is skipped"""
+        assignments: List[PendingAssignment] = []
+        with open(self.path, 'rb') as file:
+            for line in file:
+                try:
+                    assignments.append(PendingAssignment(**json.loads(line)))
+                except (ValueError, TypeError):
+                    logger.warning("Skipping torn assignment log line")
+        return assignments
+
+    def rewrite(self, assignments: Iterable[PendingAssignment]) -> None:
+        """Replace the content of the log, atomically"""
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(self._encode(assignments))
+            self._sync(file)
+        os.replace(temporary, self.path)
+        self._file.close()
+        self._file = open(self.path, 'ab')
+
+    def close(self) -> None:
+        self._file.close()
+        self._lock_file.close()
+
+    @staticmethod
+    def _encode(assignments: Iterable[PendingAssignment]) -> bytes:
+        return b''.join(
+            json.dumps(assignment._asdict()).encode() + b'\n'
+            for assignment in assignments)
+
+    def _sync(self, file: Any) -> None:
+        file.flush()
+        if self.fsync:
+            os.fsync(file.fileno())
+
+
+class AssignmentQueue:
+    """Bounded queue of assignments, written by a background thread"""
+
+    def __init__(self, max_depth: int = 10000, batch_size: int = 500,
+                 timeout: float = 1.0, linger: float = 0.05) -> None:
+        """
+        Args:
+            max_depth: Most pending assignments before submit waits
+            batch_size: Most assignments written per transaction
+            timeout: Seconds submit waits for room before giving up
+            linger: Seconds the writer waits for a batch to fill up
+        """
+        self.max_depth = max_depth
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.linger = linger
+        self.enabled = False
+        self.app: Any = None
+        self.log: Optional[AssignmentLog] = None
+        self._pending: Deque[PendingAssignment] = deque()
+        self._keys: Set[tuple] = set()
+        self._changed = Condition()
+        self._flush_lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def init_app(self, app: Any) -> None:
+        """Enable the queue if ASSIGNMENT_WRITE_BEHIND is set
+
+        Args:
+            app: Flask application; ASSIGNMENT_LOG_PATH is the log file,
+                ASSIGNMENT_QUEUE_MAX_DEPTH, ASSIGNMENT_BATCH_SIZE and
+                ASSIGNMENT_QUEUE_TIMEOUT bound the queue
+        """
+        app.extensions['assignment_queue'] = self
+        if not app.config.get('ASSIGNMENT_WRITE_BEHIND'):
+            return
+        self.max_depth = int(app.config['ASSIGNMENT_QUEUE_MAX_DEPTH'])
+        self.batch_size = int(app.config['ASSIGNMENT_BATCH_SIZE'])
+        self.timeout = float(app.config['ASSIGNMENT_QUEUE_TIMEOUT'])
+        try:
+            log = AssignmentLog(app.config['ASSIGNMENT_LOG_PATH'])
+        except AssignmentLogLockedError as error:
+            logger.warning("%s, assignments are written synchronously", error)
+            return
+        self.open(app, log)
+        self.start()
+        atexit.register(self.stop)
+
+    def open(self, app: Any, log: AssignmentLog) -> int:
+        """
+        Enable the queue, queuing the assignments left in the log.
+
+        Args:
+            app: Flask application the writer runs in
+            log: Log of the pending assignments
+
+        Returns:
+            int: Number of assignments recovered from the log
+        """
+        self.app = app
+        self.log = log
+        recovered = log.read()
+        with self._changed:
+            for assignment in recovered:
+                self._queue(assignment)
+        if recovered:
+            logger.info("Recovered %d pending assignments", len(recovered))
+        metrics.incr('write_behind.recovered', len(recovered))
+        self.enabled = True
+        return len(recovered)
+
+    @property
+    def depth(self) -> int:
+        """Number of pending assignments"""
+        return len(self._pending)
+
+    def submit(self, assignments: Dict[Player, List[CompiledCampaign]]
+               ) -> bool:
+        """
+        Queue new assignments and reflect them in the players' collections.
+
+        Args:
+            assignments: Newly matched campaigns for each player
+
+        Returns:
+            bool: False if the queue is disabled or stayed full for the
+            whole timeout; the caller then writes the assignments itself
+        """
+        if not self.enabled:
+            return False
+        new = [
+            PendingAssignment(
+                player.player_id, campaign.campaign_id, campaign.name)
+            for player, campaigns in assignments.items()
+            for campaign in campaigns]
+
+        with self._changed:
+            new = [assignment for assignment in new
+                   if assignment[:2] not in self._keys]
+            if not self._changed.wait_for(
+                    lambda: not self._pending
+                    or len(self._pending) + len(new) <= self.max_depth,
+                    self.timeout):
+                metrics.incr('write_behind.rejected')
+                return False
+            self.log.append(new)
+            for assignment in new:
+                self._queue(assignment)
+            self._changed.notify_all()
+
+        attach_campaigns(assignments, {
+            campaign.campaign_id: Campaign(
+                campaign_id=campaign.campaign_id, name=campaign.name)
+            for campaigns in assignments.values() for campaign in campaigns})
+        metrics.incr('write_behind.submitted', len(new))
+        return True
+
+    def flush(self) -> int:
+        """
+        Write one batch of pending assignments to the database.
+
+        Returns:
+            int: Number of assignments written
+        """
+        with self._flush_lock:
+            with self._changed:
+                batch = [self._pending[index] for index in range(
+                    min(self.batch_size, len(self._pending)))]
+            if not batch:
+                return 0
+
+            with self.app.app_context():
+                try:
+                    write_assignment_rows(
+                        [{"player_id": assignment.player_id,
+                          "campaign_id": assignment.campaign_id}
+                         for assignment in batch],
+                        {assignment.campaign_id: assignment
+                         for assignment in batch}.values())
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    metrics.incr('write_behind.failures')
+                    raise
+                finally:
+                    db.session.remove()
+
+            with self._changed:
+                for assignment in batch:
+                    self._pending.popleft()
+                    self._keys.discard(assignment[:2])
+                # Only the assignments still pending need to be replayed
+                self.log.rewrite(self._pending)
+                metrics.set('write_behind.depth', len(self._pending))
+                self._changed.notify_all()
+            metrics.incr('write_behind.written', len(batch))
+            metrics.incr('write_behind.batches')
+            return len(batch)
+
+    def start(self) -> None:
+        """Start the writer thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(
+            target=self._run, name='assignment-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the writer thread, writing what is still pending"""
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.enabled:
+            while self._pending:
+                self.flush()
+
+    def _queue(self, assignment: PendingAssignment) -> None:
+        if assignment[:2] not in self._keys:
+            self._keys.add(assignment[:2])
+            self._pending.append(assignment)
+        metrics.set('write_behind.depth', len(self._pending))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: self._pending or self._stop.is_set())
+            # Let concurrent requests fill the batch
+            self._stop.wait(self.linger)
+            try:
+                while self.flush() == self.batch_size:
+                    pass
+            except Exception:
+                logger.exception("Writing queued assignments failed")
+                self._stop.wait(1.0)
+
+
+# Process-wide queue, enabled by init_app
+assignment_queue = AssignmentQueue()
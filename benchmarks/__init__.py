@@ -0,0 +1,3 @@
+"""
+Benchmarks and synthetic data generation
+"""
@@ -0,0 +1,176 @@
+"""
+Load test of get_client_config: Flask (WSGI) vs. the ASGI entry point.
+
+Usage: python -m benchmarks.bench_asgi [players] [requests] [concurrency]
+(defaults to 2000 players, 6000 requests and 32 concurrent clients)
+
+       python -m benchmarks.bench_asgi --url http://127.0.0.1:5000 \\
+           --url http://127.0.0.1:8000 [requests] [concurrency]
+(against running servers, e.g. `flask run` and `uvicorn app.asgi:application`
+on a database seeded with init_db.py)
+
+Clients fire each player's request burst (3 parallel calls, as SDK modules do
+at startup) and the harness reports p50/p99 latency and requests/second. The
+in-process mode calls the WSGI application from a thread per client, and the
+ASGI application from one event loop.
+"""
+import argparse
+import asyncio
+import http.client
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+from urllib.parse import urlsplit
+
+DB_DIR = tempfile.mkdtemp()
+os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = (
+    f'sqlite:///{os.path.join(DB_DIR, "bench.db")}')
+os.environ['FLASK_CAMPAIGN_REFRESH_INTERVAL'] = '0'
+
+from app.app import app  # noqa: E402
+from app.asgi import ProfileASGIApp  # noqa: E402
+from app.campaigns import CampaignAPIStub  # noqa: E402
+from app.catalog import catalog  # noqa: E402
+from app.models import db  # noqa: E402
+from app.profile_cache import profile_cache  # noqa: E402
+from app.services import campaign_rows  # noqa: E402
+from benchmarks.synthetic import (  # noqa: E402
+    generate_campaigns, generate_players, seed_database)
+
+BURST = 3
+
+
+def workload(player_ids: List[str], requests: int) -> List[str]:
+    """Paths of the requests, each player appearing in a burst"""
+    paths: List[str] = []
+    for index in range(requests // BURST):
+        player_id = player_ids[index % len(player_ids)]
+        paths.extend([f'/get_client_config/{player_id}'] * BURST)
+    return paths
+
+
+def report(label: str, results: List[Tuple[float, int]],
+           seconds: float) -> None:
+    """Print latency percentiles, throughput and failed requests"""
+    cuts = statistics.quantiles([latency for latency, _ in results], n=100)
+    errors = sum(status != 200 for _, status in results)
+    print(f"  {label:<8} p50 {cuts[49] * 1000:8.2f} ms"
+          f"   p99 {cuts[98] * 1000:8.2f} ms"
+          f"   {len(results) / seconds:10,.0f} req/s   {errors} errors")
+
+
+def run_threads(paths: List[str], concurrency: int,
+                get: Callable[[str], int]) -> List[Tuple[float, int]]:
+    """Issue the requests from concurrency threads, returning the latency
+    and status of each"""
+    def timed(path: str) -> Tuple[float, int]:
+        start = time.perf_counter()
+        status = get(path)
+        return time.perf_counter() - start, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(timed, paths))
+
+
+async def run_asgi(application: ProfileASGIApp, paths: List[str],
+                   concurrency: int) -> List[Tuple[float, int]]:
+    """Issue the requests from concurrency tasks, returning the latency
+    and status of each"""
+    results: List[Tuple[float, int]] = []
+    pending = iter(paths)
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def client() -> None:
+        for path in pending:
+            statuses: List[int] = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            start = time.perf_counter()
+            await application({
+                'type': 'http', 'method': 'GET', 'path': path,
+                'query_string': b'', 'headers': []}, receive, send)
+            results.append((time.perf_counter() - start, statuses[0]))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results
+
+
+def reset(player_count: int, campaign_count: int) -> List[str]:
+    """Seed a fresh database and catalog, with an empty profile cache"""
+    db.drop_all()
+    db.create_all()
+    players = generate_players(player_count)
+    seed_database(players)
+    catalog.fetcher = CampaignAPIStub(generate_campaigns(campaign_count))
+    catalog.refresh()
+    campaign_rows.clear()
+    profile_cache.clear()
+    return [player["player_id"] for player in players]
+
+
+def run_in_process(player_count: int, requests: int, concurrency: int,
+                   campaign_count: int = 200) -> None:
+    print(f"{requests} requests on {player_count} players, "
+          f"{concurrency} concurrent clients (in process)")
+    with app.app_context():
+        paths = workload(reset(player_count, campaign_count), requests)
+        start = time.perf_counter()
+        results = run_threads(
+            paths, concurrency,
+            lambda path: app.test_client().get(path).status_code)
+        report("flask", results, time.perf_counter() - start)
+
+        paths = workload(reset(player_count, campaign_count), requests)
+        application = ProfileASGIApp(app, catalog, workers=concurrency)
+        try:
+            start = time.perf_counter()
+            results = asyncio.run(run_asgi(application, paths, concurrency))
+            report("asgi", results, time.perf_counter() - start)
+        finally:
+            application.close()
+
+
+def run_http(urls: List[str], requests: int, concurrency: int) -> None:
+    from init_db import PLAYER_ID
+    paths = workload([PLAYER_ID], requests)
+    print(f"{requests} requests, {concurrency} concurrent clients (HTTP)")
+    for url in urls:
+        parts = urlsplit(url)
+
+        def get(path: str) -> int:
+            connection = http.client.HTTPConnection(parts.netloc, timeout=30)
+            try:
+                connection.request('GET', parts.path.rstrip('/') + path)
+                response = connection.getresponse()
+                response.read()
+                return response.status
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        results = run_threads(paths, concurrency, get)
+        report(parts.netloc, results, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', action='append', default=[],
+                        help="base URL of a running server (repeatable)")
+    parser.add_argument('numbers', nargs='*', type=int)
+    args = parser.parse_args()
+    if args.url:
+        requests, concurrency = (
+            args.numbers + [6000, 32][len(args.numbers):])[:2]
+        run_http(args.url, requests, concurrency)
+    else:
+        player_count, requests, concurrency = (
+            args.numbers + [2000, 6000, 32][len(args.numbers):])[:3]
+        run_in_process(player_count, requests, concurrency)
@@ -0,0 +1,51 @@
+"""
+Item ownership encodings: memory per million players and check throughput.
+
+Usage: python -m benchmarks.bench_bitsets
+"""
+import sys
+import timeit
+from app.bitsets import ItemDictionary
+from benchmarks.synthetic import item_name
+
+PLAYERS = 1000000
+OWNED = 12
+
+
+def frozenset_bytes(owned: int) -> int:
+    """Per-player size of a frozenset of names (the names are shared)"""
+    return sys.getsizeof(frozenset(item_name(i) for i in range(owned)))
+
+
+def run() -> None:
+    print(f"Memory per {PLAYERS} players owning {OWNED} items:")
+    print(f"  {'items':>6} {'frozenset':>12} {'python int':>12} "
+          f"{'packed':>12}")
+    for item_count in (64, 256, 1024, 4096):
+        dictionary = ItemDictionary()
+        dictionary.mask(item_name(i) for i in range(item_count))
+        footprint = dictionary.footprint(PLAYERS)
+        print(f"  {item_count:>6} "
+              f"{PLAYERS * frozenset_bytes(OWNED) / 2**20:>10.1f}MB "
+              f"{footprint['int_bytes'] / 2**20:>10.1f}MB "
+              f"{footprint['packed_bytes'] / 2**20:>10.1f}MB")
+
+    dictionary = ItemDictionary()
+    owned_names = frozenset(item_name(i) for i in range(0, 2 * OWNED, 2))
+    required_names = frozenset([item_name(0), item_name(4)])
+    excluded_names = frozenset([item_name(1)])
+    owned = dictionary.mask(owned_names)
+    required = dictionary.mask(required_names)
+    excluded = dictionary.mask(excluded_names)
+    sets = timeit.timeit(
+        lambda: required_names <= owned_names
+        and excluded_names.isdisjoint(owned_names), number=PLAYERS)
+    bits = timeit.timeit(
+        lambda: owned & required == required and not owned & excluded,
+        number=PLAYERS)
+    print(f"Item rule checks: frozenset {PLAYERS / sets:,.0f}/s, "
+          f"bitset {PLAYERS / bits:,.0f}/s")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,57 @@
+"""
+Per-player route vs. bulk endpoint for pre-warming player configs.
+
+Usage: python -m benchmarks.bench_bulk_configs [players ...]
+(defaults to 1000 and 100000 players)
+"""
+import os
+import sys
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp()
+os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = (
+    f'sqlite:///{os.path.join(DB_DIR, "bench.db")}')
+os.environ['FLASK_CAMPAIGN_REFRESH_INTERVAL'] = '0'
+
+from app.app import app  # noqa: E402
+from app.campaigns import CampaignAPIStub  # noqa: E402
+from app.catalog import catalog  # noqa: E402
+from app.models import db  # noqa: E402
+from benchmarks.synthetic import (  # noqa: E402
+    generate_campaigns, generate_players, seed_database)
+
+
+def run(player_count: int, campaign_count: int = 200) -> None:
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        players = generate_players(player_count)
+        seed_database(players)
+        catalog.fetcher = CampaignAPIStub(generate_campaigns(campaign_count))
+        catalog.refresh()
+        player_ids = [player["player_id"] for player in players]
+
+        client = app.test_client()
+        half = player_count // 2
+
+        start = time.perf_counter()
+        for player_id in player_ids[:half]:
+            client.get(f'/get_client_config/{player_id}')
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post(
+            '/get_client_configs', json={"player_ids": player_ids[half:]})
+        lines = response.data.count(b"\n")
+        bulk = time.perf_counter() - start
+        assert lines == player_count - half
+
+        print(f"{player_count} players, {campaign_count} campaigns")
+        print(f"  per-player route: {half / single:10.0f} players/s")
+        print(f"  bulk endpoint:    {lines / bulk:10.0f} players/s")
+
+
+if __name__ == '__main__':
+    for count in [int(arg) for arg in sys.argv[1:]] or [1000, 100000]:
+        run(count)
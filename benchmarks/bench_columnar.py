@@ -0,0 +1,86 @@
+"""
+Scalar vs. vectorized (NumPy) matching throughput on synthetic players.
+
+Usage: python -m benchmarks.bench_columnar [players] [campaigns]
+(defaults to 1000000 players and 200 campaigns)
+"""
+import sys
+import time
+import numpy as np
+from app.bitsets import item_dictionary
+from app.columnar import PlayerColumns, match_columns
+from app.engine import CompiledCampaignSet, PlayerView
+from app.schemas import api_campaigns_schema
+from benchmarks.synthetic import COUNTRIES, generate_campaigns, item_name
+
+ITEM_COUNT = 100
+SCALAR_SAMPLE = 100000
+
+
+def synthetic_columns(count: int, seed: int = 0) -> PlayerColumns:
+    """Columns drawn with the same distributions as synthetic.py
+
+    Expects "Item i" to be at bit position i of the item dictionary.
+    """
+    rng = np.random.default_rng(seed)
+    countries, weights = zip(*COUNTRIES)
+    weights = np.asarray(weights, dtype=float) / sum(weights)
+    levels = np.minimum(100, 1 + rng.exponential(12, count).astype(np.int64))
+    codes = rng.choice(len(countries), size=count, p=weights).astype(np.int32)
+    words = -(-ITEM_COUNT // 64)
+    bits = np.zeros((count, words), dtype=np.uint64)
+    for _ in range(6):
+        owned = np.minimum(ITEM_COUNT - 1, rng.pareto(1.2, count).astype(int))
+        word, bit = np.divmod(owned, 64)
+        for w in range(words):
+            rows = word == w
+            bits[rows, w] |= np.left_shift(
+                np.uint64(1), bit[rows].astype(np.uint64))
+    return PlayerColumns(
+        ["synthetic-%08d" % i for i in range(count)],
+        levels, np.ones(count, dtype=bool), codes,
+        {country: code for code, country in enumerate(countries)},
+        bits)
+
+
+def to_views(columns: PlayerColumns, count: int):
+    countries = {code: country for country, code in columns.countries.items()}
+    for row in range(count):
+        bits = sum(int(word) << (64 * index)
+                   for index, word in enumerate(columns.item_bits[row]))
+        yield PlayerView.create(
+            columns.player_ids[row], int(columns.levels[row]),
+            countries[int(columns.country_codes[row])],
+            item_dictionary.names(bits))
+
+
+def run(player_count: int, campaign_count: int) -> None:
+    for index in range(ITEM_COUNT):
+        assert item_dictionary.position(item_name(index)) == index
+    campaign_set = CompiledCampaignSet(api_campaigns_schema.load(
+        generate_campaigns(campaign_count, ITEM_COUNT)))
+    columns = synthetic_columns(player_count)
+
+    start = time.perf_counter()
+    eligible = match_columns(columns, campaign_set)
+    vectorized = time.perf_counter() - start
+
+    sample = min(SCALAR_SAMPLE, player_count)
+    views = list(to_views(columns, sample))
+    start = time.perf_counter()
+    for view in views:
+        campaign_set.match(view)
+    scalar = time.perf_counter() - start
+
+    assignments = sum(len(rows) for rows in eligible.values())
+    print(f"{player_count} players, {campaign_count} campaigns, "
+          f"{assignments} assignments")
+    print(f"  scalar (sample of {sample}): "
+          f"{sample / scalar:12.0f} players/s")
+    print(f"  vectorized:                {player_count / vectorized:12.0f} "
+          f"players/s")
+
+
+if __name__ == '__main__':
+    arguments = [int(arg) for arg in sys.argv[1:]]
+    run(*(arguments + [1000000, 200][len(arguments):]))
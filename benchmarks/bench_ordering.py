@@ -0,0 +1,71 @@
+"""
+Static cost hints vs. learned (selectivity-driven) matcher order.
+
+Usage: python -m benchmarks.bench_ordering [players] [campaigns]
+(defaults to 20000 players and 100 campaigns)
+"""
+import sys
+import time
+from typing import List, Sequence
+from app.engine import CompiledCampaign, CompiledCampaignSet, PlayerView
+from app.schemas import api_campaigns_schema
+from app.selectivity import MatcherStatistics
+from benchmarks.synthetic import (
+    REFERENCE_TIME, generate_players, generate_targeted_campaigns, item_name)
+
+WARMUP = 2000
+
+
+def to_views(players) -> List[PlayerView]:
+    return [
+        PlayerView.create(
+            player["player_id"], player["level"], player["country"],
+            [item_name(i) for i in player["items"]],
+            total_spent=player["total_spent"], xp=player["xp"],
+            language=player["language"],
+            last_session=player["last_session"],
+            device_models=[player["device_model"]])
+        for player in players]
+
+
+def measure(campaigns: Sequence[CompiledCampaign],
+            views: Sequence[PlayerView]) -> float:
+    """Mean nanoseconds per campaign evaluation"""
+    start = time.perf_counter_ns()
+    for view in views:
+        for campaign in campaigns:
+            campaign.matches(view, REFERENCE_TIME)
+    return (time.perf_counter_ns() - start) / (len(views) * len(campaigns))
+
+
+def run(player_count: int, campaign_count: int) -> None:
+    views = to_views(generate_players(player_count))
+    campaign_set = CompiledCampaignSet(
+        api_campaigns_schema.load(generate_targeted_campaigns(campaign_count)),
+        statistics=MatcherStatistics(sample_every=0))
+    hinted = campaign_set.campaigns
+
+    statistics = MatcherStatistics()
+    for view in views[:WARMUP]:
+        for campaign in hinted:
+            statistics.evaluate(campaign, view, REFERENCE_TIME)
+    learned = [campaign._replace(rules=statistics.order(campaign))
+               for campaign in hinted]
+    changed = sum(a.rules != b.rules for a, b in zip(hinted, learned))
+
+    for a, b in zip(hinted, learned):
+        assert all(a.matches(v, REFERENCE_TIME) == b.matches(v, REFERENCE_TIME)
+                   for v in views[:200])
+
+    static = measure(hinted, views)
+    ordered = measure(learned, views)
+    print(f"{player_count} players, {campaign_count} campaigns, "
+          f"{changed} reordered after {WARMUP} sampled players")
+    print(f"  static hint order: {static:8.0f} ns/evaluation")
+    print(f"  learned order:     {ordered:8.0f} ns/evaluation "
+          f"({100 * (1 - ordered / static):.0f}% less)")
+
+
+if __name__ == '__main__':
+    arguments = [int(arg) for arg in sys.argv[1:]]
+    run(*(arguments + [20000, 100][len(arguments):]))
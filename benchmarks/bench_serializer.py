@@ -0,0 +1,69 @@
+"""
+Marshmallow PlayerSchema vs. the generated player serializer.
+
+Usage: python -m benchmarks.bench_serializer [players]
+(defaults to 20000 players)
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from app.app import app
+from app.models import Campaign, Clan, Device, Player
+from app.schemas import player_schema, player_serializer
+
+
+def make_players(count: int) -> List[Player]:
+    """Transient players shaped like the sample profile"""
+    created = datetime(2021, 1, 10, 13, 37, 17)
+    clan = Clan(clan_id="123456", name="Hello world clan")
+    campaigns = [
+        Campaign(campaign_id="campaign-%03d" % i, name="Campaign %d" % i)
+        for i in range(3)]
+    return [
+        Player(
+            id=index, player_id="player-%08d" % index,
+            credential="apple_credential", created=created,
+            modified=created + timedelta(days=13),
+            last_session=created + timedelta(days=13),
+            total_spent=400.0, total_refund=0.0, total_transactions=5,
+            last_purchase=created + timedelta(days=12), level=index % 50,
+            xp=1000, total_playtime=144, country="CA", language="fr",
+            birthdate=datetime(2000, 1, 10, 13, 37, 17), gender="male",
+            clan=clan, campaigns=campaigns[:index % 4],
+            devices=[Device(device_id=1, model="apple iphone 11",
+                            carrier="vodafone", firmware="123")])
+        for index in range(count)]
+
+
+def measure(label: str, players: List[Player],
+            serialize: Callable[[Player], object]) -> float:
+    start = time.perf_counter()
+    for player in players:
+        serialize(player)
+    seconds = time.perf_counter() - start
+    print(f"  {label:<34} {len(players) / seconds:>12,.0f} players/s")
+    return seconds
+
+
+def run(player_count: int) -> None:
+    with app.app_context():
+        players = make_players(player_count)
+        print(f"Serializing {player_count} players:")
+        schema = measure("marshmallow dump", players, player_schema.dump)
+        compiled = measure("compiled dump", players, player_serializer.dump)
+        schema_body = measure(
+            "marshmallow dump + jsonify body", players,
+            lambda player: app.json.response(
+                player_schema.dump(player)).get_data())
+        compiled_body = measure(
+            "compiled dump + encode", players,
+            lambda player: player_serializer.encode(
+                player_serializer.dump(player)))
+        print(f"Speedup: dump x{schema / compiled:.1f}, "
+              f"body x{schema_body / compiled_body:.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
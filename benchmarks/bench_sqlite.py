@@ -0,0 +1,108 @@
+"""
+Concurrent reads and writes on SQLite: default configuration vs. the tuned
+one (WAL and pragmas, query-only read pool and a single writer).
+
+Usage: python -m benchmarks.bench_sqlite [readers] [writers] [seconds]
+(defaults to 8 readers, 4 writers and 5 seconds per configuration)
+
+Readers load random player profiles, writers update a player row and commit,
+each in a session of its own. Failed operations ("database is locked") are
+counted, not retried.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from flask import Flask
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from app.database import DEFAULT_PRAGMAS, DatabaseTuning
+from app.models import db, Player
+from app.profiles import load_player_profile
+from benchmarks.synthetic import generate_players, seed_database
+
+
+def make_app(path: str, tuned: bool) -> Flask:
+    """Application on a fresh, seeded database file"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    if tuned:
+        app.config['SQLITE_PRAGMAS'] = dict(DEFAULT_PRAGMAS)
+        app.config['SQLITE_READ_POOL_SIZE'] = 8
+        DatabaseTuning().init_app(app)
+    db.init_app(app)
+    return app
+
+
+def hammer(app: Flask, operation: Callable[[random.Random], None],
+           stop: threading.Event, counts: Dict[str, int],
+           seed: int) -> None:
+    rng = random.Random(seed)
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                operation(rng)
+                counts['ok'] += 1
+            except OperationalError:
+                counts['errors'] += 1
+            finally:
+                db.session.remove()
+
+
+def run(label: str, tuned: bool, player_ids: List[str],
+        players: List[Dict[str, Any]], readers: int, writers: int,
+        seconds: float) -> None:
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(path, tuned)
+    with app.app_context():
+        db.create_all()
+        seed_database(players)
+
+    def read(rng: random.Random) -> None:
+        load_player_profile(rng.choice(player_ids))
+
+    def write(rng: random.Random) -> None:
+        db.session.execute(
+            update(Player)
+            .where(Player.player_id == rng.choice(player_ids))
+            .values(xp=Player.xp + 1))
+        db.session.commit()
+
+    stop = threading.Event()
+    read_counts = [{'ok': 0, 'errors': 0} for _ in range(readers)]
+    write_counts = [{'ok': 0, 'errors': 0} for _ in range(writers)]
+    threads = [
+        threading.Thread(target=hammer, args=(app, read, stop, counts, i))
+        for i, counts in enumerate(read_counts)] + [
+        threading.Thread(target=hammer, args=(app, write, stop, counts, -i))
+        for i, counts in enumerate(write_counts)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    def total(counts: List[Dict[str, int]], key: str) -> int:
+        return sum(count[key] for count in counts)
+
+    print(f"  {label:<8} reads {total(read_counts, 'ok') / seconds:8,.0f}/s"
+          f" ({total(read_counts, 'errors')} failed)"
+          f"   writes {total(write_counts, 'ok') / seconds:8,.0f}/s"
+          f" ({total(write_counts, 'errors')} failed)")
+    with app.app_context():
+        db.engine.dispose()
+
+
+if __name__ == '__main__':
+    readers, writers, seconds = ([int(arg) for arg in sys.argv[1:]]
+                                 + [8, 4, 5][len(sys.argv[1:]):])[:3]
+    players = generate_players(5000)
+    player_ids = [player["player_id"] for player in players]
+    print(f"{readers} readers, {writers} writers, {seconds}s each")
+    run("default", False, player_ids, players, readers, writers, seconds)
+    run("tuned", True, player_ids, players, readers, writers, seconds)
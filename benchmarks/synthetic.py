@@ -0,0 +1,166 @@
+"""
+Synthetic players and campaigns with realistic, skewed distributions.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+from app.campaigns import create_campaign
+from app.models import db, Item, Player, PlayerItem
+
+# Weighted country distribution: a few large markets and a long tail
+COUNTRIES: List[Tuple[str, int]] = [
+    ("US", 30), ("BR", 10), ("IN", 10), ("DE", 6), ("FR", 6), ("GB", 6),
+    ("CA", 4), ("RO", 2), ("JP", 5), ("KR", 3), ("MX", 4), ("ES", 3),
+    ("IT", 3), ("PL", 2), ("TR", 2), ("AU", 2), ("NL", 1), ("SE", 1)]
+
+LANGUAGES: List[Tuple[str, int]] = [
+    ("en", 45), ("es", 12), ("pt", 10), ("fr", 8), ("de", 7), ("ja", 6),
+    ("ko", 4), ("it", 3), ("pl", 3), ("ro", 2)]
+
+DEVICE_MODELS: List[Tuple[str, int]] = [
+    ("apple iphone 13", 20), ("apple iphone 11", 15),
+    ("samsung galaxy s21", 15), ("google pixel 6", 8),
+    ("xiaomi redmi 9", 12), ("oppo a15", 6)]
+
+# Player activity is expressed relative to this instant
+REFERENCE_TIME = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def item_name(index: int) -> str:
+    return "Item %d" % index
+
+
+def random_level(rng: random.Random) -> int:
+    """Most players are low level, few reach the cap"""
+    return min(100, 1 + int(rng.expovariate(1 / 12)))
+
+
+def random_items(rng: random.Random, item_count: int) -> List[int]:
+    """Popular items are owned by many players (Zipf-like)"""
+    owned = set()
+    for _ in range(rng.randint(0, 12)):
+        owned.add(min(item_count - 1, int(rng.paretovariate(1.2)) - 1))
+    return sorted(owned)
+
+
+def random_spending(rng: random.Random) -> float:
+    """Most players never pay, a few whales spend a lot"""
+    if rng.random() < 0.85:
+        return 0.0
+    return round(rng.lognormvariate(3, 1.2), 2)
+
+
+def generate_players(count: int, item_count: int = 100,
+                     seed: int = 0) -> List[Dict[str, Any]]:
+    """Return synthetic player attributes: player_id, level, country, items,
+    total_spent, xp, language, last_session (naive UTC) and device_model"""
+    rng = random.Random(seed)
+    countries, weights = zip(*COUNTRIES)
+    languages, language_weights = zip(*LANGUAGES)
+    models, model_weights = zip(*DEVICE_MODELS)
+    players = []
+    for index in range(count):
+        level = random_level(rng)
+        players.append({
+            "player_id": "synthetic-%08d" % index,
+            "level": level,
+            "country": rng.choices(countries, weights)[0],
+            "items": random_items(rng, item_count),
+            "total_spent": random_spending(rng),
+            "xp": level * 100 + rng.randint(0, 99),
+            "language": rng.choices(languages, language_weights)[0],
+            "last_session": (REFERENCE_TIME - timedelta(
+                days=rng.expovariate(1 / 10))).replace(tzinfo=None),
+            "device_model": rng.choices(models, model_weights)[0],
+        })
+    return players
+
+
+def generate_campaigns(count: int, item_count: int = 100,
+                       seed: int = 0) -> List[Dict[str, Any]]:
+    """Return raw campaigns as served by the campaign API"""
+    rng = random.Random(seed)
+    countries = [country for country, _ in COUNTRIES]
+    campaigns = []
+    for index in range(count):
+        level_min = rng.randint(1, 40)
+        campaigns.append(create_campaign(
+            campaign_id="synthetic-campaign-%05d" % index,
+            name="Synthetic campaign %d" % index,
+            level_min=level_min,
+            level_max=level_min + rng.randint(0, 30),
+            countries=rng.sample(countries, rng.randint(0, 4)),
+            required_items=[
+                item_name(i) for i in rng.sample(
+                    range(min(item_count, 20)), rng.randint(0, 2))],
+            excluded_items=[
+                item_name(i) for i in rng.sample(
+                    range(item_count), rng.randint(0, 2))],
+            start_date="2020-01-01 00:00:00Z",
+            end_date="2999-01-01 00:00:00Z"))
+    return campaigns
+
+
+def generate_targeted_campaigns(count: int, seed: int = 0
+                                ) -> List[Dict[str, Any]]:
+    """Return raw campaigns mixing every matcher type
+
+    Their static cost hints are often wrong on the synthetic players:
+    required items are popular ones, languages are the common ones, while
+    spending and recency rules reject most players.
+    """
+    rng = random.Random(seed)
+    countries = [country for country, _ in COUNTRIES]
+    languages = [language for language, _ in LANGUAGES]
+    models = [model for model, _ in DEVICE_MODELS]
+    campaigns = []
+    for index in range(count):
+        campaign = create_campaign(
+            campaign_id="targeted-campaign-%05d" % index,
+            name="Targeted campaign %d" % index,
+            level_min=1,
+            level_max=rng.choice([50, 100]),
+            countries=rng.sample(countries, rng.randint(0, 12)),
+            required_items=[item_name(i) for i in rng.sample(
+                range(3), rng.randint(0, 1))],
+            excluded_items=[item_name(i) for i in rng.sample(
+                range(50, 100), rng.randint(0, 2))],
+            start_date="2020-01-01 00:00:00Z",
+            end_date="2999-01-01 00:00:00Z")
+        matchers = campaign["matchers"]
+        if rng.random() < 0.6:
+            matchers["has"]["language"] = languages[:rng.randint(3, 8)]
+        if rng.random() < 0.4:
+            matchers["has"]["device_model"] = rng.sample(models, 4)
+        if rng.random() < 0.5:
+            matchers["total_spent"] = {"min": rng.choice([10, 50, 100])}
+        if rng.random() < 0.5:
+            matchers["last_session"] = {"within_days": rng.choice([1, 3, 7])}
+        if rng.random() < 0.4:
+            matchers["xp"] = {"min": rng.choice([100, 500, 1000])}
+        campaigns.append(campaign)
+    return campaigns
+
+
+def seed_database(players: List[Dict[str, Any]], item_count: int = 100,
+                  batch_size: int = 10000) -> None:
+    """Insert items, players and inventories with bulk statements"""
+    db.session.execute(Item.__table__.insert(), [
+        {"id": index + 1, "key": "item_%d" % index, "name": item_name(index)}
+        for index in range(item_count)])
+    for start in range(0, len(players), batch_size):
+        batch = players[start:start + batch_size]
+        db.session.execute(Player.__table__.insert(), [
+            {"player_id": player["player_id"], "level": player["level"],
+             "country": player["country"],
+             "total_spent": player["total_spent"], "xp": player["xp"],
+             "language": player["language"],
+             "last_session": player["last_session"]}
+            for player in batch])
+        rows = [
+            {"player_id": player["player_id"], "item_id": index + 1,
+             "quantity": 1}
+            for player in batch for index in player["items"]]
+        if rows:
+            db.session.execute(PlayerItem.__table__.insert(), rows)
+    db.session.commit()
@@ -6,14 +6,15 @@ from app.models import (
     Player,
     PlayerItem
 )
+from app.migrations import migrate
 from datetime import datetime
 
 PLAYER_ID = '97983be2-98b7-11e7-90cf-082e5f28d836'
 
 
 def init_db():
-    """Initialize the database and create tables"""
-    db.create_all()
+    """Initialize the database: migrate the schema, add the sample data"""
+    migrate(db.engine)
 
     # Check if sample data already exists
     if not Player.query.filter_by(player_id=PLAYER_ID).first():
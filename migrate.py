@@ -0,0 +1,24 @@
+import argparse
+from app.app import app
+from app.migrations import MIGRATIONS, current_version, migrate
+from app.models import db
+
+
+def main() -> None:
+    """Apply the pending schema migrations"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--target', type=int, default=None,
+                        help='last migration to apply (default: latest)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        applied = migrate(db.engine, args.target)
+        version = current_version(db.engine)
+    for number in applied:
+        print(f'Applied migration {number}: '
+              f'{MIGRATIONS[number - 1].description}')
+    print(f'Schema at version {version} of {len(MIGRATIONS)}')
+
+
+if __name__ == '__main__':
+    main()
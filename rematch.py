@@ -0,0 +1,57 @@
+import argparse
+from app.app import app
+from app.catalog import catalog
+from app.rematch import RematchReport, fetch_catalog_changes, rematch_players
+
+
+def print_progress(report: RematchReport) -> None:
+    print(f'{report.players} players, {report.assignments} assignments, '
+          f'{report.rows_per_second:.0f} rows/s (last id {report.last_id})')
+
+
+def main() -> None:
+    """Re-match every player against the current campaigns"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help='players per chunk and per insert batch')
+    parser.add_argument('--checkpoint', default='rematch.checkpoint.json',
+                        help='checkpoint file used to resume interrupted runs')
+    parser.add_argument('--columnar', action='store_true',
+                        help='evaluate chunks with the NumPy matcher')
+    changes = parser.add_mutually_exclusive_group()
+    changes.add_argument('--campaigns', nargs='+', metavar='CAMPAIGN_ID',
+                         help='only evaluate these campaigns')
+    changes.add_argument('--since', type=int, metavar='VERSION',
+                         help='only evaluate the campaigns added or changed '
+                              'since this catalog version of the server')
+    parser.add_argument('--server', default='http://localhost:5000',
+                        help='server to read the catalog changes from with '
+                             '--since; versions are numbered per process')
+    parser.add_argument('--quiet', action='store_true',
+                        help='only print the final report')
+    args = parser.parse_args()
+
+    campaign_ids = args.campaigns
+    if args.since is not None:
+        try:
+            version, campaign_ids = fetch_catalog_changes(
+                args.server, args.since)
+        except LookupError as error:
+            parser.exit(1, f'{error}: run a full re-match instead\n')
+        print(f'Catalog changes up to version {version}: '
+              f'{len(campaign_ids)} campaigns')
+
+    with app.app_context():
+        report = rematch_players(
+            catalog.snapshot().campaign_set,
+            chunk_size=args.chunk_size,
+            checkpoint=args.checkpoint,
+            progress=None if args.quiet else print_progress,
+            columnar=args.columnar,
+            campaign_ids=campaign_ids)
+    print('Re-match complete:')
+    print_progress(report)
+
+
+if __name__ == '__main__':
+    main()
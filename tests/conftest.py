@@ -0,0 +1,72 @@
+"""
+Shared fixtures: an in-memory database seeded with the sample data
+"""
+import os
+
+os.environ.setdefault('FLASK_SQLALCHEMY_DATABASE_URI', 'sqlite://')
+os.environ.setdefault('FLASK_CAMPAIGN_REFRESH_INTERVAL', '0')
+
+from contextlib import contextmanager
+from typing import Iterator, List
+import pytest
+from sqlalchemy import event
+from app.app import app as flask_app
+from app.models import db
+from app.profile_cache import profile_cache
+from app.services import campaign_rows
+from init_db import init_db, PLAYER_ID
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        init_db()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+        campaign_rows.clear()
+        profile_cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def player_id():
+    return PLAYER_ID
+
+
+@pytest.fixture
+def count_queries(app):
+    """Context manager collecting the SQL statements executed inside it"""
+    @contextmanager
+    def counter() -> Iterator[List[str]]:
+        statements: List[str] = []
+
+        def before_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_execute)
+
+    return counter
+
+
+@pytest.fixture
+def campaign_api(app):
+    """Campaign API stub plugged into the application catalog"""
+    from app.campaigns import CampaignAPIStub
+    from app.catalog import catalog
+
+    api = CampaignAPIStub()
+    fetcher = catalog.fetcher
+    catalog.fetcher = api
+    yield api
+    catalog.fetcher = fetcher
@@ -0,0 +1,151 @@
+"""
+Tests for the HTTP routes
+"""
+import json
+from app.campaigns import create_campaign
+from app.catalog import catalog
+from app.models import db, Player
+
+
+def active_campaign(campaign_id, **kwargs):
+    return create_campaign(
+        campaign_id=campaign_id, name=campaign_id, level_max=10,
+        start_date="2020-01-01 00:00:00Z", end_date="2999-01-01 00:00:00Z",
+        **kwargs)
+
+
+class TestGetClientConfig:
+    """Tests for the get_client_config route"""
+
+    def test_returns_404_for_unknown_player(self, client, campaign_api):
+        # Act
+        response = client.get('/get_client_config/unknown')
+
+        # Assert
+        assert response.status_code == 404
+
+    def test_assigns_matching_campaigns(
+            self, client, player_id, campaign_api):
+        # Arrange
+        campaign_api.campaigns = [
+            active_campaign("campaign-001", countries=["CA"],
+                            required_items=["Item 1"]),
+            active_campaign("campaign-002", countries=["US"]),
+        ]
+        catalog.refresh()
+
+        # Act
+        response = client.get(f'/get_client_config/{player_id}')
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json["campaigns"] == [
+            {"campaign_id": "campaign-001", "name": "campaign-001"}]
+
+    def test_loads_profile_in_bounded_statements(
+            self, client, player_id, campaign_api, count_queries):
+        # Arrange
+        catalog.refresh()
+        db.session.expunge_all()
+
+        # Act
+        with count_queries() as statements:
+            response = client.get(f'/get_client_config/{player_id}')
+
+        # Assert
+        assert response.status_code == 200
+        assert len(statements) == 4
+
+
+class TestGetClientConfigsBulk:
+    """Tests for the bulk get_client_configs route"""
+
+    def test_rejects_invalid_body(self, client, campaign_api):
+        # Act
+        response = client.post('/get_client_configs', json={"player_ids": 1})
+
+        # Assert
+        assert response.status_code == 400
+
+    def test_streams_profiles_and_bulk_inserts_assignments(
+            self, client, player_id, campaign_api, count_queries):
+        # Arrange
+        db.session.add(Player(player_id="player-2", level=2, country="US"))
+        db.session.commit()
+        campaign_api.campaigns = [
+            active_campaign("campaign-001", countries=["CA", "US"]),
+            active_campaign("campaign-002", countries=["US"]),
+        ]
+        catalog.refresh()
+
+        # Act
+        with count_queries() as statements:
+            response = client.post('/get_client_configs', json={
+                "player_ids": [player_id, "unknown", "player-2"]})
+            lines = [json.loads(line) for line in response.data.splitlines()]
+
+        # Assert
+        assert response.mimetype == 'application/x-ndjson'
+        assert [line["player_id"] for line in lines] == [
+            player_id, "unknown", "player-2"]
+        assert lines[1]["error"] == "Player not found"
+        assert [c["campaign_id"] for c in lines[0]["profile"]["campaigns"]] \
+            == ["campaign-001"]
+        assert [c["campaign_id"] for c in lines[2]["profile"]["campaigns"]] \
+            == ["campaign-001", "campaign-002"]
+        assert len([s for s in statements
+                    if s.startswith("INSERT INTO player_campaign")]) == 1
+        assert Player.query.filter_by(
+            player_id="player-2").one().has_campaign("campaign-002")
+
+    def test_players_matching_same_campaign_share_one_campaign_row(
+            self, client, player_id, campaign_api, count_queries):
+        # Arrange
+        db.session.add(Player(player_id="player-2", level=2, country="CA"))
+        db.session.commit()
+        campaign_api.campaigns = [active_campaign("campaign-001")]
+        catalog.refresh()
+        client.get(f'/get_client_config/{player_id}')
+
+        # Act
+        with count_queries() as statements:
+            response = client.get('/get_client_config/player-2')
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json["campaigns"] == [
+            {"campaign_id": "campaign-001", "name": "campaign-001"}]
+        assert not [s for s in statements if s.startswith("INSERT INTO campaigns")]
+
+
+class TestGetCatalogChanges:
+    """Tests for the get_catalog_changes route"""
+
+    def test_lists_diffs_after_version(self, client, campaign_api):
+        # Arrange
+        campaign_api.campaigns = [active_campaign("campaign-001")]
+        catalog.refresh()
+        since = catalog.snapshot().version
+        campaign_api.campaigns = [active_campaign("campaign-002")]
+        catalog.refresh()
+
+        # Act
+        response = client.get(f'/admin/catalog/changes?since={since}')
+
+        # Assert
+        assert response.json == {
+            "version": since + 1,
+            "changes": [{"version": since + 1, "added": ["campaign-002"],
+                         "changed": [], "removed": ["campaign-001"]}]}
+
+    def test_version_ahead_of_restarted_server_is_gone(
+            self, client, campaign_api):
+        # Arrange
+        catalog.refresh()
+        since = catalog.snapshot().version + 56
+
+        # Act
+        response = client.get(f'/admin/catalog/changes?since={since}')
+
+        # Assert
+        assert response.status_code == 410
@@ -0,0 +1,199 @@
+"""
+Tests for the ASGI entry point
+"""
+import asyncio
+import json
+import time
+import pytest
+from app.asgi import ProfileASGIApp
+from app.campaigns import CampaignAPIStub
+from app.catalog import CampaignCatalog, catalog
+from app.metrics import metrics
+
+
+@pytest.fixture
+def asgi(app):
+    application = ProfileASGIApp(app, catalog, workers=2)
+    yield application
+    application.close()
+
+
+async def call(application, method, path, headers=(), body=b''):
+    """Send one HTTP request to an ASGI application"""
+    scope = {
+        'type': 'http', 'method': method, 'path': path,
+        'query_string': b'', 'root_path': '', 'http_version': '1.1',
+        'scheme': 'http', 'server': ('testserver', 80),
+        'client': ('127.0.0.1', 12345),
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in headers]}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    start = messages[0]
+    return (
+        start['status'],
+        {name.decode(): value.decode() for name, value in start['headers']},
+        b''.join(message.get('body', b'') for message in messages[1:]))
+
+
+class TestProfileASGIApp:
+    """Tests for the ProfileASGIApp class"""
+
+    def test_serves_same_profile_as_flask(self, asgi, client, player_id):
+        # Arrange
+        path = f'/get_client_config/{player_id}'
+
+        # Act
+        status, headers, body = asyncio.run(call(asgi, 'GET', path))
+        expected = client.get(path)
+
+        # Assert
+        assert status == 200
+        assert headers['content-type'] == 'application/json'
+        assert body == expected.data
+        assert headers['etag'] == expected.headers['ETag']
+
+    def test_answers_not_modified(self, asgi, player_id):
+        # Arrange
+        path = f'/get_client_config/{player_id}'
+        _, headers, _ = asyncio.run(call(asgi, 'GET', path))
+
+        # Act
+        status, not_modified, body = asyncio.run(call(
+            asgi, 'GET', path, headers=[('If-None-Match', headers['etag'])]))
+
+        # Assert
+        assert status == 304
+        assert body == b''
+        assert 'content-type' not in not_modified
+
+    def test_coalesces_concurrent_requests(self, asgi, player_id):
+        # Arrange
+        path = f'/get_client_config/{player_id}'
+        coalesced = metrics.get('asgi.coalesced')
+        lookups = metrics.get('response_cache.misses') \
+            + metrics.get('response_cache.hits')
+
+        async def burst():
+            return await asyncio.gather(
+                *(call(asgi, 'GET', path) for _ in range(5)))
+
+        # Act
+        responses = asyncio.run(burst())
+
+        # Assert
+        assert {body for _, _, body in responses} == {responses[0][2]}
+        assert metrics.get('asgi.coalesced') - coalesced == 4
+        assert metrics.get('response_cache.misses') \
+            + metrics.get('response_cache.hits') - lookups == 1
+
+    def test_unknown_player(self, asgi):
+        # Act
+        status, _, body = asyncio.run(
+            call(asgi, 'GET', '/get_client_config/unknown'))
+
+        # Assert
+        assert status == 404
+        assert json.loads(body) == {"error": "Player not found"}
+
+    def test_streams_bulk_endpoint(self, asgi, player_id):
+        # Act
+        status, headers, body = asyncio.run(call(
+            asgi, 'POST', '/get_client_configs',
+            headers=[('Content-Type', 'application/json')],
+            body=json.dumps({"player_ids": [player_id, "unknown"]}).encode()))
+
+        # Assert
+        lines = [json.loads(line) for line in body.splitlines()]
+        assert status == 200
+        assert headers['content-type'] == 'application/x-ndjson'
+        assert [line["player_id"] for line in lines] == [player_id, "unknown"]
+
+    def test_slow_campaign_api_times_out(self, app):
+        # Arrange
+        api = CampaignAPIStub()
+
+        def slow_api():
+            time.sleep(0.5)
+            return api()
+
+        application = ProfileASGIApp(
+            app, CampaignCatalog(slow_api, refresh_interval=0),
+            workers=1, fetch_timeout=0.05)
+
+        # Act
+        try:
+            status, _, body = asyncio.run(
+                call(application, 'GET', '/admin/matcher_stats'))
+        finally:
+            application.close()
+
+        # Assert
+        assert status == 503
+        assert json.loads(body) == {"error": "Campaigns unavailable"}
+
+    @pytest.mark.parametrize('method, path, status', [
+        ('PATCH', '/players/{}', 503),
+        ('GET', '/admin/catalog/changes', 503),
+    ])
+    def test_routes_never_load_the_catalog(
+            self, asgi, player_id, monkeypatch,
+            method, path, status):
+        # Arrange
+        fetches = []
+
+        def failing_api():
+            fetches.append(time.monotonic())
+            raise RuntimeError("campaign API down")
+        monkeypatch.setattr(catalog, 'fetcher', failing_api)
+        monkeypatch.setattr(catalog, '_snapshot', None)
+        monkeypatch.setattr(catalog, 'refresh_interval', 60.0)
+        asgi.fetch_timeout = 0.05
+
+        # Act
+        try:
+            status_code, _, _ = asyncio.run(call(
+                asgi, method, path.format(player_id),
+                headers=[('Content-Type', 'application/json')],
+                body=b'{"level": 5}'))
+            refresh_thread = catalog._thread
+        finally:
+            catalog.stop()
+
+        # Assert
+        assert status_code == status
+        assert len(fetches) == 1
+        assert refresh_thread is None
+
+    def test_lifespan_loads_catalog(self, app):
+        # Arrange
+        campaign_catalog = CampaignCatalog(CampaignAPIStub(),
+                                           refresh_interval=0)
+        application = ProfileASGIApp(app, campaign_catalog, workers=1)
+        messages = iter([{'type': 'lifespan.startup'},
+                         {'type': 'lifespan.shutdown'}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        # Act
+        try:
+            asyncio.run(application({'type': 'lifespan'}, receive, send))
+        finally:
+            application.close()
+
+        # Assert
+        assert campaign_catalog.loaded
+        assert sent == ['lifespan.startup.complete',
+                        'lifespan.shutdown.complete']
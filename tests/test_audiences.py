@@ -0,0 +1,133 @@
+"""
+Tests for the reverse lookup of the players assigned to a campaign
+"""
+import json
+import pytest
+from sqlalchemy import delete, insert, text
+from app.audiences import campaign_player_total, iter_campaign_players
+from app.catalog import catalog
+from app.models import db, Campaign, player_campaign
+
+PLAYERS = [f"player-{number}" for number in range(5)]
+
+
+@pytest.fixture
+def audience(app):
+    """campaign-001 assigned to the five PLAYERS"""
+    db.session.add(Campaign(campaign_id="campaign-001", name="campaign-001"))
+    db.session.execute(insert(player_campaign), [
+        {"player_id": player_id, "campaign_id": "campaign-001"}
+        for player_id in reversed(PLAYERS)])
+    db.session.commit()
+    return PLAYERS
+
+
+class TestCampaignPlayers:
+    """Tests for the audiences functions"""
+
+    def test_pages_issue_one_query_each(self, audience, count_queries):
+        # Act
+        with count_queries() as statements:
+            pages = list(iter_campaign_players("campaign-001", page_size=2))
+
+        # Assert
+        assert pages == [audience[0:2], audience[2:4], audience[4:]]
+        assert len(statements) == 3
+
+    def test_counter_follows_inserts_and_deletes(self, audience):
+        # Act
+        db.session.execute(delete(player_campaign).where(
+            player_campaign.c.player_id == "player-0"))
+        db.session.execute(insert(player_campaign).values(
+            player_id="player-9", campaign_id="campaign-002"))
+        db.session.commit()
+
+        # Assert
+        assert campaign_player_total("campaign-001") == 4
+        assert campaign_player_total("campaign-002") == 1
+        assert campaign_player_total("campaign-003") == 0
+
+    def test_keyset_page_searches_covering_index(self, app):
+        # Act
+        plan = [row[-1] for row in db.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT player_id FROM player_campaign '
+            'WHERE campaign_id = :campaign_id AND player_id > :after '
+            'ORDER BY player_id LIMIT 100'),
+            {"campaign_id": "campaign-001", "after": "player-1"})]
+
+        # Assert
+        assert plan == [
+            'SEARCH player_campaign USING COVERING INDEX '
+            'ix_player_campaign_campaign_id_player_id '
+            '(campaign_id=? AND player_id>?)']
+
+
+class TestGetCampaignPlayers:
+    """Tests for the campaign players routes"""
+
+    def test_json_pages_follow_cursor(self, client, audience):
+        # Act
+        first = client.get('/campaigns/campaign-001/players?limit=3').json
+        second = client.get(
+            f'/campaigns/campaign-001/players?limit=3&after={first["next"]}'
+        ).json
+
+        # Assert
+        assert first["players"] == audience[:3]
+        assert first["next"] == "player-2"
+        assert second["players"] == audience[3:]
+        assert second["next"] is None
+
+    def test_streams_ndjson_after_cursor(self, client, audience):
+        # Act
+        response = client.get(
+            '/campaigns/campaign-001/players'
+            '?format=ndjson&limit=2&after=player-0')
+
+        # Assert
+        assert response.mimetype == 'application/x-ndjson'
+        assert response.is_streamed
+        assert [json.loads(line)["player_id"]
+                for line in response.data.splitlines()] == audience[1:]
+
+    def test_streams_csv(self, client, audience):
+        # Act
+        response = client.get(
+            '/campaigns/campaign-001/players?format=csv&limit=2')
+
+        # Assert
+        assert response.mimetype == 'text/csv'
+        assert response.data.decode().splitlines() == ["player_id", *audience]
+
+    def test_counts_players(self, client, audience):
+        # Act
+        response = client.get('/campaigns/campaign-001/players/count')
+
+        # Assert
+        assert response.json == {"campaign_id": "campaign-001", "players": 5}
+
+    def test_does_not_load_the_catalog(
+            self, client, audience, campaign_api, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(catalog, '_snapshot', None)
+
+        # Act
+        response = client.get('/campaigns/campaign-001/players/count')
+
+        # Assert
+        assert response.json == {"campaign_id": "campaign-001", "players": 5}
+        assert campaign_api.calls == 0
+
+    @pytest.mark.parametrize('path, status', [
+        ('/campaigns/unknown/players', 404),
+        ('/campaigns/unknown/players/count', 404),
+        ('/campaigns/campaign-001/players?limit=0', 400),
+        ('/campaigns/campaign-001/players?limit=many', 400),
+        ('/campaigns/campaign-001/players?format=xml', 400),
+    ])
+    def test_rejects_invalid_requests(self, client, audience, path, status):
+        # Act
+        response = client.get(path)
+
+        # Assert
+        assert response.status_code == status
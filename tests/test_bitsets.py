@@ -0,0 +1,49 @@
+"""
+Tests for the item bitset encoding
+"""
+from app.bitsets import ItemDictionary
+
+
+class TestItemDictionary:
+    """Tests for the ItemDictionary class"""
+
+    def test_positions_are_dense_and_stable(self):
+        # Arrange
+        dictionary = ItemDictionary()
+
+        # Act
+        first = dictionary.position("Item 1")
+        second = dictionary.position("Item 2")
+        again = dictionary.position("Item 1")
+
+        # Assert
+        assert (first, second, again) == (0, 1, 0)
+        assert dictionary.get("Item 3") is None
+        assert len(dictionary) == 2
+
+    def test_mask_checks_match_set_semantics(self):
+        # Arrange
+        dictionary = ItemDictionary()
+        owned = dictionary.mask(["Item 1", "Item 2", "Item 3"])
+        required = dictionary.mask(["Item 1", "Item 3"])
+        missing = dictionary.mask(["Item 1", "Item 4"])
+        excluded = dictionary.mask(["Item 5", "Item 2"])
+
+        # Act & Assert
+        assert owned & required == required
+        assert owned & missing != missing
+        assert owned & excluded != 0
+        assert owned & dictionary.mask(["Item 5"]) == 0
+        assert set(dictionary.names(owned)) == {"Item 1", "Item 2", "Item 3"}
+
+    def test_footprint_per_million_players(self):
+        # Arrange
+        dictionary = ItemDictionary()
+        dictionary.mask("Item %d" % i for i in range(100))
+
+        # Act
+        footprint = dictionary.footprint()
+
+        # Assert
+        assert footprint["items"] == 100
+        assert footprint["packed_bytes"] == 16 * 1000000
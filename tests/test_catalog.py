@@ -0,0 +1,184 @@
+"""
+Tests for the campaign catalog
+"""
+import time
+import pytest
+from app.campaigns import CampaignAPIStub, create_campaign
+from app.catalog import (
+    CampaignCatalog, CatalogDiff, CatalogUnavailableError)
+from app.metrics import metrics
+
+
+def make_campaign(campaign_id, **kwargs):
+    return create_campaign(
+        campaign_id=campaign_id, name=campaign_id, level_max=10, **kwargs)
+
+
+@pytest.fixture
+def api():
+    return CampaignAPIStub([
+        make_campaign("campaign-001"),
+        make_campaign("campaign-002"),
+    ])
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+class TestCampaignCatalog:
+    """Tests for the CampaignCatalog class"""
+
+    def test_snapshot_loads_validates_and_compiles_once(self, api):
+        # Arrange
+        catalog = CampaignCatalog(api, refresh_interval=0)
+
+        # Act
+        first = catalog.snapshot()
+        second = catalog.snapshot()
+
+        # Assert
+        assert first is second
+        assert api.calls == 1
+        assert first.version == 1
+        assert len(first.campaign_set) == 2
+        assert first.campaigns[0]["start_date"].year == 2024
+
+    def test_refresh_skips_unchanged_campaigns(self, api):
+        # Arrange
+        catalog = CampaignCatalog(api, refresh_interval=0)
+        first = catalog.snapshot()
+
+        # Act
+        catalog.refresh()
+        unchanged = catalog.snapshot()
+        api.campaigns[1] = make_campaign(
+            "campaign-002", last_updated="2024-08-01 00:00:00Z")
+        catalog.refresh()
+        changed = catalog.snapshot()
+
+        # Assert
+        assert unchanged is first
+        assert changed.version == 2
+        assert changed.campaigns[0] is first.campaigns[0]
+        assert metrics.get('catalog.campaigns_parsed') == 3
+
+    def test_refresh_diffs_and_compiles_changed_campaigns_only(self, api):
+        # Arrange
+        catalog = CampaignCatalog(api, refresh_interval=0)
+        first = catalog.snapshot()
+        api.campaigns = [
+            make_campaign("campaign-002", last_updated="2024-08-01 00:00:00Z"),
+            make_campaign("campaign-003"),
+        ]
+
+        # Act
+        catalog.refresh()
+        second = catalog.snapshot()
+
+        # Assert
+        assert first.diff == CatalogDiff(
+            1, added=("campaign-001", "campaign-002"))
+        assert second.diff == CatalogDiff(
+            2, added=("campaign-003",), changed=("campaign-002",),
+            removed=("campaign-001",))
+        assert metrics.get('catalog.campaigns_compiled') == 4
+        assert [c.campaign_id for c in second.campaign_set.campaigns] == [
+            "campaign-002", "campaign-003"]
+
+    def test_changes_lists_diffs_after_version(self, api):
+        # Arrange
+        catalog = CampaignCatalog(api, refresh_interval=0)
+        catalog.snapshot()
+        api.campaigns = api.campaigns[:1]
+        catalog.refresh()
+
+        # Act
+        everything = catalog.changes(0)
+        latest = catalog.changes(1)
+        current = catalog.changes(2)
+
+        # Assert
+        assert [diff.version for diff in everything] == [1, 2]
+        assert latest == [CatalogDiff(2, removed=("campaign-002",))]
+        assert current == []
+
+    def test_changes_refuses_versions_out_of_history(
+            self, api, monkeypatch):
+        # Arrange
+        monkeypatch.setattr('app.catalog.DIFF_HISTORY', 1)
+        catalog = CampaignCatalog(api, refresh_interval=0)
+        catalog.snapshot()
+        api.campaigns = api.campaigns[:1]
+        catalog.refresh()
+
+        # Act / Assert
+        with pytest.raises(LookupError):
+            catalog.changes(0)
+
+    def test_changes_refuses_versions_ahead_after_restart(self, api):
+        # Arrange
+        restarted = CampaignCatalog(api, refresh_interval=0)
+        restarted.refresh()
+
+        # Act / Assert
+        with pytest.raises(LookupError):
+            restarted.changes(57)
+
+    def test_serves_stale_snapshot_when_api_fails(self, api):
+        # Arrange
+        catalog = CampaignCatalog(api, refresh_interval=0)
+        first = catalog.snapshot()
+        api.failing = True
+
+        # Act
+        refreshed = catalog.refresh()
+        result = catalog.snapshot()
+
+        # Assert
+        assert refreshed is False
+        assert result is first
+        assert catalog.stale is True
+        assert metrics.get('catalog.stale') == 1
+        assert metrics.get('catalog.refresh_failures') == 1
+        assert metrics.get('catalog.stale_reads') == 1
+
+    def test_raises_when_never_loaded(self, api):
+        # Arrange
+        api.failing = True
+        catalog = CampaignCatalog(api, refresh_interval=0)
+
+        # Act & Assert
+        with pytest.raises(CatalogUnavailableError):
+            catalog.snapshot()
+
+    def test_skips_invalid_campaigns(self, api):
+        # Arrange
+        api.campaigns.append(dict(
+            make_campaign("campaign-003"),
+            start_date="not a date"))
+        catalog = CampaignCatalog(api, refresh_interval=0)
+
+        # Act
+        snapshot = catalog.snapshot()
+
+        # Assert
+        assert [c["id"] for c in snapshot.campaigns] == [
+            "campaign-001", "campaign-002"]
+        assert metrics.get('catalog.invalid_campaigns') == 1
+
+    def test_background_refresh_publishes_new_snapshot(self, api):
+        # Arrange
+        catalog = CampaignCatalog(api, refresh_interval=0.01)
+        catalog.snapshot()
+
+        # Act
+        api.campaigns.pop()
+        deadline = time.time() + 2
+        while catalog.snapshot().version == 1 and time.time() < deadline:
+            time.sleep(0.01)
+        catalog.stop()
+
+        # Assert
+        assert len(catalog.snapshot().campaign_set) == 1
@@ -0,0 +1,89 @@
+"""
+Tests for the vectorized columnar matcher
+"""
+import random
+import pytest
+from app.engine import CompiledCampaignSet, PlayerView
+from app.models import Campaign, Item, Player, PlayerItem
+from app.services import check_player_matches_campaign_criteria
+from tests.test_engine import NOW, make_campaign
+from tests.test_index import COUNTRIES, ITEMS, random_campaign
+
+np = pytest.importorskip("numpy")
+
+from app.columnar import (  # noqa: E402
+    PlayerColumns, evaluate_campaign, match_columns)
+
+
+def random_player(rng, index):
+    player = Player(
+        player_id="player-%d" % index,
+        level=rng.choice([None] + list(range(0, 16))),
+        country=rng.choice(COUNTRIES + ["JP", None]))
+    player.inventory = [
+        PlayerItem(item=Item(key=name, name=name),
+                   quantity=rng.choice([0, 1, 3]))
+        for name in rng.sample(ITEMS + ["Item 70", "Item 99"],
+                               rng.randint(0, 6))]
+    player.campaigns = [
+        Campaign(campaign_id="campaign-%03d" % rng.randint(0, 40), name="c")
+        for _ in range(rng.randint(0, 3))]
+    return player
+
+
+class TestColumnarMatching:
+    """Tests for evaluate_campaign and match_columns"""
+
+    def test_masks_equal_scalar_services_bit_for_bit(self):
+        # Arrange
+        rng = random.Random(7)
+        campaigns = [random_campaign(rng, "campaign-%03d" % i)
+                     for i in range(40)]
+        campaign_set = CompiledCampaignSet(campaigns)
+        players = [random_player(rng, i) for i in range(500)]
+        scalar_players = [p for p in players if p.level is not None]
+        columns = PlayerColumns.from_views(
+            PlayerView.from_player(p) for p in scalar_players)
+
+        for campaign, compiled in zip(campaigns, campaign_set.campaigns):
+            # Act
+            mask = evaluate_campaign(columns, compiled)
+
+            # Assert
+            expected = [check_player_matches_campaign_criteria(p, campaign)
+                        for p in scalar_players]
+            assert mask.tolist() == expected
+
+    def test_match_columns_equals_compiled_set(self):
+        # Arrange
+        rng = random.Random(11)
+        campaign_set = CompiledCampaignSet([
+            random_campaign(rng, "campaign-%03d" % i) for i in range(40)])
+        views = [PlayerView.from_player(random_player(rng, i))
+                 for i in range(500)]
+
+        # Act
+        result = match_columns(
+            PlayerColumns.from_views(views), campaign_set, now=NOW)
+
+        # Assert
+        expected = {}
+        for row, view in enumerate(views):
+            for campaign in campaign_set.match(view, now=NOW):
+                expected.setdefault(campaign.campaign_id, []).append(row)
+        assert {campaign_id: rows.tolist()
+                for campaign_id, rows in result.items()} == expected
+
+    def test_item_registered_after_columns_matches_nobody(self):
+        # Arrange
+        columns = PlayerColumns.from_views([PlayerView.create(
+            "player-1", 5, "US", ["Item 1"])])
+        campaign_set = CompiledCampaignSet([make_campaign(
+            has={"items": ["Item %d" % i for i in range(1000, 1100)]},
+            does_not_have={"items": ["Item 2000"]})])
+
+        # Act
+        mask = evaluate_campaign(columns, campaign_set.campaigns[0])
+
+        # Assert
+        assert mask.tolist() == [False]
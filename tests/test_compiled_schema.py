@@ -0,0 +1,76 @@
+"""
+Golden-output tests for the generated player serializer
+"""
+from datetime import datetime, timezone
+import pytest
+from app.models import db, Campaign, Clan, Device, Player
+from app.profile_cache import profile_cache
+from app.schemas import player_schema, player_serializer
+from app.schemas.compiled import compile_schema
+
+
+@pytest.fixture
+def players(app, player_id):
+    sample = Player.query.filter_by(player_id=player_id).one()
+    sample.campaigns.append(Campaign(campaign_id="campaign-001", name="A"))
+    players = [
+        sample,
+        Player(player_id="empty"),
+        Player(player_id="unicode", country="RÖ", language="日本語",
+               gender="\x7f\x1f\"/\\", total_spent=12345678901234567.0,
+               total_refund=0.00001, xp=-3,
+               created=datetime(2024, 2, 1, 8, tzinfo=timezone.utc),
+               clan=Clan(clan_id="clan-2", name="Ünïcode"),
+               devices=[Device(device_id=7, model=None, carrier="été")]),
+        Player(player_id="floats", total_spent=0.1, total_refund=-0.0,
+               birthdate=datetime(1999, 12, 31, 23, 59, 59)),
+    ]
+    db.session.add_all(players)
+    db.session.flush()
+    return players
+
+
+class TestPlayerSerializer:
+    """Tests for the compiled player serializer"""
+
+    def test_dump_equals_marshmallow(self, players):
+        for player in players:
+            # Act
+            result = player_serializer.dump(player)
+
+            # Assert
+            assert result == player_schema.dump(player)
+            assert list(result) == list(player_schema.dump(player))
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_encode_is_byte_identical_to_jsonify(
+            self, app, players, monkeypatch, use_orjson):
+        # Arrange
+        if not use_orjson:
+            monkeypatch.setattr(player_serializer, '_orjson', False)
+
+        for player in players:
+            # Act
+            body = player_serializer.encode(player_serializer.dump(player))
+
+            # Assert
+            assert body == app.json.response(
+                player_schema.dump(player)).get_data()
+
+    def test_route_output_is_identical_with_compiled_serializer(
+            self, app, client, player_id, campaign_api, monkeypatch):
+        # Arrange
+        expected = client.get(f'/get_client_config/{player_id}').data
+        monkeypatch.setitem(app.config, 'PROFILE_SERIALIZER', 'compiled')
+        profile_cache.clear()
+
+        # Act
+        response = client.get(f'/get_client_config/{player_id}')
+
+        # Assert
+        assert response.data == expected
+
+    def test_refuses_unknown_dump_hooks(self):
+        # Act & Assert
+        with pytest.raises(NotImplementedError):
+            compile_schema(player_schema)
@@ -0,0 +1,113 @@
+"""
+Tests for the SQLite configuration: pragmas and read/write split
+"""
+import pytest
+from flask import Flask
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import OperationalError
+from app.database import DEFAULT_PRAGMAS, DatabaseTuning, connection_factory
+from app.models import db, Campaign, Player
+from app.profiles import load_player_profile
+from init_db import init_db, PLAYER_ID
+
+
+@pytest.fixture
+def engines(tmp_path):
+    """Writer and query-only engines of an application on a file database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = (
+        f'sqlite:///{tmp_path / "profiles.db"}')
+    app.config['SQLITE_PRAGMAS'] = dict(DEFAULT_PRAGMAS)
+    app.config['SQLITE_READ_POOL_SIZE'] = 2
+    tuning = DatabaseTuning()
+    tuning.init_app(app)
+    db.init_app(app)
+    with app.app_context():
+        init_db()
+        yield db.engine, tuning.reader(db.engine)
+        db.session.remove()
+        db.engine.dispose()
+        tuning.dispose()
+
+
+def pragma(connection, name):
+    return connection.execute(text(f'PRAGMA {name}')).scalar()
+
+
+class TestConnectionFactory:
+    """Tests for the connection_factory function"""
+
+    def test_applies_pragmas(self, tmp_path):
+        # Arrange
+        factory = connection_factory(DEFAULT_PRAGMAS)
+
+        # Act
+        connection = factory(str(tmp_path / "test.db"))
+
+        # Assert
+        assert connection.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert connection.execute('PRAGMA synchronous').fetchone()[0] == 1
+        assert connection.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+        connection.close()
+
+
+class TestReadWriteSplit:
+    """Tests for the read/write split of file databases"""
+
+    def test_engines_are_configured(self, engines):
+        # Arrange
+        writer, reader = engines
+
+        # Act
+        with writer.connect() as connection:
+            writer_mode = pragma(connection, 'journal_mode')
+        with reader.connect() as connection:
+            query_only = pragma(connection, 'query_only')
+
+        # Assert
+        assert writer_mode == 'wal'
+        assert query_only == 1
+        assert writer.pool.size() == 1
+        assert reader.pool.size() == 2
+
+    def test_reader_refuses_writes(self, engines):
+        # Act / Assert
+        with engines[1].connect() as connection:
+            with pytest.raises(OperationalError):
+                connection.execute(insert(Campaign).values(
+                    campaign_id="campaign-001", name="mycampaign"))
+
+    def test_session_reads_own_writes(self, engines):
+        # Arrange
+        statement = select(Campaign)
+        writer, reader = engines
+
+        # Act
+        before = db.session.get_bind(clause=statement)
+        db.session.execute(insert(Campaign).values(
+            campaign_id="campaign-001", name="mycampaign"))
+        during = db.session.get_bind(clause=statement)
+        rows = db.session.scalars(statement).all()
+        db.session.commit()
+        after = db.session.get_bind(clause=statement)
+
+        # Assert
+        assert before is reader
+        assert during is writer
+        assert [row.campaign_id for row in rows] == ["campaign-001"]
+        assert after is reader
+
+    def test_profile_load_and_assignment(self, engines):
+        # Arrange
+        player = load_player_profile(PLAYER_ID)
+
+        # Act
+        player.campaigns.append(
+            Campaign(campaign_id="campaign-001", name="mycampaign"))
+        db.session.commit()
+        db.session.expunge_all()
+        reloaded = load_player_profile(PLAYER_ID)
+
+        # Assert
+        assert [c.campaign_id for c in reloaded.campaigns] == ["campaign-001"]
+        assert db.session.get_bind(mapper=Player) is engines[1]
@@ -0,0 +1,161 @@
+"""
+Tests for the incremental re-evaluation of players on state changes
+"""
+from datetime import datetime
+import pytest
+from app.catalog import catalog
+from app.engine import CompiledCampaignSet
+from app.metrics import metrics
+from app.models import db, Player
+from app.profile_cache import PENDING_KEY
+from app.profiles import load_player_profile
+from app.schemas import player_delta_schema
+from app.services import apply_player_delta
+from tests.test_app import active_campaign
+from tests.test_engine import NOW, make_campaign, make_view
+
+
+def campaign_set(*campaigns):
+    return CompiledCampaignSet(campaigns, clock=lambda: NOW)
+
+
+class TestDependencyMap:
+    """Tests for the attribute to campaigns dependency map"""
+
+    def test_maps_attributes_to_campaigns_reading_them(self):
+        # Act
+        campaigns = campaign_set(
+            make_campaign("by-level", level={"min": 5}),
+            make_campaign("by-country", has={"country": ["US"]}),
+            make_campaign("by-items", level={"min": 1},
+                          does_not_have={"items": ["Item 1"]}))
+
+        # Assert
+        assert campaigns.dependents == {
+            "level": frozenset({0, 2}),
+            "country": frozenset({1}),
+            "item_names": frozenset({2}),
+        }
+
+    def test_match_changed_evaluates_affected_campaigns_only(self):
+        # Arrange
+        campaigns = campaign_set(
+            make_campaign("by-level", level={"min": 5}),
+            make_campaign("by-country", has={"country": ["US"]}))
+        evaluated = metrics.get('player_delta.evaluated')
+
+        # Act
+        matched = campaigns.match_changed(
+            make_view(level=6, country="US"), ["level"])
+
+        # Assert
+        assert [c.campaign_id for c in matched] == ["by-level"]
+        assert metrics.get('player_delta.evaluated') - evaluated == 1
+
+
+class TestApplyPlayerDelta:
+    """Tests for the apply_player_delta function"""
+
+    def test_assigns_campaigns_unlocked_by_the_change(self, app, player_id):
+        # Arrange
+        player = load_player_profile(player_id)
+        campaigns = campaign_set(
+            make_campaign("by-level", level={"min": 5}),
+            make_campaign("by-country", has={"country": ["CA"]}))
+
+        # Act
+        assigned = apply_player_delta(player, {"level": 5}, campaigns)
+        db.session.commit()
+
+        # Assert
+        assert [c.campaign_id for c in assigned] == ["by-level"]
+        reloaded = Player.query.filter_by(player_id=player_id).one()
+        assert reloaded.level == 5
+        assert reloaded.assigned_campaign_ids == {"by-level"}
+
+    def test_item_ownership_change_reevaluates_item_rules(
+            self, app, player_id):
+        # Arrange
+        player = load_player_profile(player_id)
+        campaigns = campaign_set(
+            make_campaign("without-item-1",
+                          does_not_have={"items": ["Item 1"]}))
+
+        # Act
+        kept = apply_player_delta(player, {"items": {"item_1": 7}}, campaigns)
+        dropped = apply_player_delta(
+            player, {"items": {"item_1": 0}}, campaigns)
+
+        # Assert
+        assert kept == []
+        assert [c.campaign_id for c in dropped] == ["without-item-1"]
+        assert player.get_items_dict()["item_1"] == 0
+
+    def test_aware_last_session_is_stored_as_naive_utc(self, app, player_id):
+        # Arrange
+        player = load_player_profile(player_id)
+        delta = player_delta_schema.load(
+            {"last_session": "2026-10-18 12:00:00+0200"})
+        apply_player_delta(player, delta, campaign_set())
+        db.session.commit()
+        player = load_player_profile(player_id)
+
+        # Act
+        resent = apply_player_delta(player, delta, campaign_set(
+            make_campaign("recent", last_session={"within_days": 1})))
+
+        # Assert
+        assert player.last_session == datetime(2026, 10, 18, 10)
+        assert resent == []
+        assert PENDING_KEY not in db.session.info
+
+    def test_unknown_item_changes_nothing(self, app, player_id):
+        # Arrange
+        player = load_player_profile(player_id)
+
+        # Act
+        with pytest.raises(LookupError):
+            apply_player_delta(
+                player, {"level": 9, "items": {"unknown": 1}},
+                campaign_set())
+
+        # Assert
+        assert player.level == 3
+
+
+class TestUpdatePlayer:
+    """Tests for the update_player route"""
+
+    def test_reevaluates_campaigns_reading_changed_attribute(
+            self, client, player_id, campaign_api):
+        # Arrange
+        campaign_api.campaigns = [
+            active_campaign("campaign-us", countries=["US"]),
+            active_campaign("campaign-any"),
+        ]
+        catalog.refresh()
+
+        # Act
+        response = client.patch(
+            f'/players/{player_id}', json={"country": "US"})
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json == {
+            "player_id": player_id,
+            "assigned": [
+                {"campaign_id": "campaign-us", "name": "campaign-us"}]}
+
+    @pytest.mark.parametrize('path, body, status', [
+        ('/players/{}', {"level": "high"}, 400),
+        ('/players/{}', {"items": {"cash": -1}}, 400),
+        ('/players/{}', {"items": {"unknown": 1}}, 400),
+        ('/players/unknown', {"level": 5}, 404),
+    ])
+    def test_rejects_invalid_deltas(
+            self, client, player_id, campaign_api, path, body, status):
+        # Act
+        response = client.patch(path.format(player_id), json=body)
+
+        # Assert
+        assert response.status_code == status
@@ -0,0 +1,135 @@
+"""
+Tests for the compiled campaign engine
+"""
+import itertools
+from datetime import datetime, timezone
+from app.engine import (
+    CompiledCampaignSet,
+    PlayerView,
+    compile_campaign
+)
+from app.models import Campaign, Item, Player, PlayerItem
+from app.services import filter_eligible_campaigns
+
+NOW = datetime(2024, 2, 15, tzinfo=timezone.utc)
+
+
+def make_campaign(campaign_id="campaign-001", **matchers):
+    return {
+        "id": campaign_id,
+        "name": campaign_id,
+        "priority": 10.5,
+        "matchers": matchers,
+        "start_date": datetime(2024, 2, 1, tzinfo=timezone.utc),
+        "end_date": datetime(2024, 3, 1, tzinfo=timezone.utc),
+        "enabled": True,
+        "last_updated": datetime(2024, 1, 1, tzinfo=timezone.utc),
+    }
+
+
+def make_view(level=5, country="US", items=(), campaigns=()):
+    return PlayerView.create(
+        player_id="player-1",
+        level=level,
+        country=country,
+        item_names=frozenset(items),
+        campaign_ids=frozenset(campaigns))
+
+
+class TestCompileCampaign:
+    """Tests for the compile_campaign function"""
+
+    def test_compiles_matchers_into_immutable_values(self):
+        # Arrange
+        campaign = make_campaign(
+            level={"min": 1, "max": 3},
+            has={"country": ["US", "CA"], "items": ["Item 1"]},
+            does_not_have={"items": ["Item 4"]})
+
+        # Act
+        compiled = compile_campaign(campaign)
+
+        # Assert
+        assert compiled.level_min == 1
+        assert compiled.level_max == 3
+        assert compiled.countries == frozenset({"US", "CA"})
+        assert compiled.required_items == frozenset({"Item 1"})
+        assert compiled.excluded_items == frozenset({"Item 4"})
+
+    def test_empty_matchers_impose_no_constraint(self):
+        # Arrange
+        compiled = compile_campaign(make_campaign())
+
+        # Act
+        result = compiled.matches(make_view(level=None, country=None))
+
+        # Assert
+        assert result is True
+        assert compiled.level_min is None
+        assert compiled.countries is None
+
+    def test_level_min_defaults_to_one(self):
+        # Arrange
+        compiled = compile_campaign(make_campaign(level={"max": 10}))
+
+        # Act & Assert
+        assert compiled.level_min == 1
+        assert compiled.matches(make_view(level=0)) is False
+        assert compiled.matches(make_view(level=10)) is True
+        assert compiled.matches(make_view(level=11)) is False
+
+
+class TestCompiledCampaignSet:
+    """Tests for the CompiledCampaignSet class"""
+
+    def test_match_skips_assigned_and_inactive_campaigns(self):
+        # Arrange
+        disabled = make_campaign("campaign-002")
+        disabled["enabled"] = False
+        campaign_set = CompiledCampaignSet([
+            make_campaign("campaign-001"),
+            disabled,
+            make_campaign("campaign-003")])
+
+        # Act
+        result = campaign_set.match(
+            make_view(campaigns=["campaign-003"]), now=NOW)
+
+        # Assert
+        assert [c.campaign_id for c in result] == ["campaign-001"]
+
+    def test_match_agrees_with_filter_eligible_campaigns(self):
+        # Arrange
+        campaigns = [
+            make_campaign("level", level={"min": 2, "max": 4}),
+            make_campaign("country", has={"country": ["US", "RO"]}),
+            make_campaign("items", has={"items": ["Item 1", "Item 2"]}),
+            make_campaign("excluded", does_not_have={"items": ["Item 3"]}),
+            make_campaign(
+                "combined",
+                level={"min": 3},
+                has={"country": ["CA"], "items": ["Item 1"]},
+                does_not_have={"items": ["Item 4"]}),
+        ]
+        campaign_set = CompiledCampaignSet(campaigns)
+        item_sets = [(), ("Item 1",), ("Item 1", "Item 2"), ("Item 3",),
+                     ("Item 1", "Item 4")]
+
+        for level, country, items in itertools.product(
+                range(0, 6), ["US", "CA", "FR"], item_sets):
+            player = Player(player_id="player-1", level=level, country=country)
+            player.inventory = [
+                PlayerItem(item=Item(key=name, name=name), quantity=1)
+                for name in items]
+            player.campaigns = [Campaign(campaign_id="combined", name="c")]
+
+            # Act
+            expected = [
+                campaign["id"] for campaign in campaigns
+                if filter_eligible_campaigns(player, dict(
+                    campaign, start_date=None, end_date=None))]
+            result = [c.campaign_id for c in campaign_set.match(
+                PlayerView.from_player(player), now=NOW)]
+
+            # Assert
+            assert result == expected
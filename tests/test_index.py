@@ -0,0 +1,103 @@
+"""
+Tests for the campaign inverted index
+"""
+import random
+from app.engine import CompiledCampaignSet, PlayerView
+from app.metrics import metrics
+from tests.test_engine import NOW, make_campaign, make_view
+
+COUNTRIES = ["US", "CA", "RO", "FR", "DE"]
+ITEMS = ["Item %d" % i for i in range(8)]
+
+
+def random_campaign(rng, campaign_id):
+    matchers = {}
+    if rng.random() < 0.8:
+        low = rng.randint(0, 10)
+        level = {"min": low}
+        if rng.random() < 0.7:
+            level["max"] = low + rng.randint(0, 5)
+        matchers["level"] = level
+    has = {}
+    if rng.random() < 0.7:
+        has["country"] = rng.sample(COUNTRIES, rng.randint(1, 2))
+    if rng.random() < 0.5:
+        has["items"] = rng.sample(ITEMS, rng.randint(1, 2))
+    if has:
+        matchers["has"] = has
+    if rng.random() < 0.3:
+        matchers["does_not_have"] = {"items": rng.sample(ITEMS, 1)}
+    return make_campaign(campaign_id, **matchers)
+
+
+class TestCampaignIndex:
+    """Tests for the CampaignIndex class"""
+
+    def test_candidates_prune_by_country_level_and_items(self):
+        # Arrange
+        campaign_set = CompiledCampaignSet([
+            make_campaign("us", has={"country": ["US"]}),
+            make_campaign("ca", has={"country": ["CA"]}),
+            make_campaign("low", level={"min": 1, "max": 3}),
+            make_campaign("high", level={"min": 10}),
+            make_campaign("item", has={"items": ["Item 1", "Item 2"]}),
+        ])
+
+        # Act
+        candidates = campaign_set.candidates(
+            make_view(level=12, country="US", items=["Item 2"]))
+
+        # Assert
+        assert [c.campaign_id for c in candidates] == ["us", "high"]
+
+    def test_candidates_for_unknown_country_and_missing_level(self):
+        # Arrange
+        campaign_set = CompiledCampaignSet([
+            make_campaign("us", has={"country": ["US"]}),
+            make_campaign("any"),
+            make_campaign("leveled", level={"max": 5}),
+        ])
+
+        # Act
+        candidates = campaign_set.candidates(
+            make_view(level=None, country="JP"))
+
+        # Assert
+        assert [c.campaign_id for c in candidates] == ["any"]
+
+    def test_indexed_match_equals_full_scan(self):
+        # Arrange
+        rng = random.Random(42)
+        campaign_set = CompiledCampaignSet([
+            random_campaign(rng, "campaign-%03d" % i) for i in range(300)])
+
+        for _ in range(300):
+            view = PlayerView.create(
+                player_id="player-1",
+                level=rng.randint(0, 16),
+                country=rng.choice(COUNTRIES + ["JP"]),
+                item_names=frozenset(rng.sample(ITEMS, rng.randint(0, 4))),
+                campaign_ids=frozenset())
+
+            # Act
+            result = campaign_set.match(view, now=NOW)
+
+            # Assert
+            expected = [c for c in campaign_set.campaigns if c.matches(view)]
+            assert result == expected
+
+    def test_lookup_records_pruning_metrics(self):
+        # Arrange
+        metrics.reset()
+        campaign_set = CompiledCampaignSet([
+            make_campaign("us", has={"country": ["US"]}),
+            make_campaign("ca", has={"country": ["CA"]}),
+        ])
+
+        # Act
+        campaign_set.match(make_view(country="US"), now=NOW)
+
+        # Assert
+        assert metrics.get('campaign_index.lookups') == 1
+        assert metrics.get('campaign_index.candidates') == 1
+        assert metrics.get('campaign_index.campaigns') == 2
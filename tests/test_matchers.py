@@ -0,0 +1,205 @@
+"""
+Tests for the matcher registry and the built-in matcher types
+"""
+import random
+from datetime import timedelta
+import pytest
+from marshmallow import ValidationError, fields
+from app.engine import CompiledCampaignSet, PlayerView, compile_campaign
+from app.matchers import Matcher, MatcherRegistry, registry
+from app.schemas import MatcherSchema
+from tests.test_engine import NOW, make_campaign
+
+LANGUAGES = ["en", "fr", "ro"]
+MODELS = ["pixel", "iphone", "galaxy"]
+
+
+def make_player(**attributes):
+    values = dict(player_id="player-1", level=5, country="US")
+    values.update(attributes)
+    return PlayerView.create(**values)
+
+
+def random_player(rng, index):
+    return make_player(
+        player_id="player-%d" % index,
+        level=rng.choice([None, 1, 5, 20]),
+        total_spent=rng.choice([None, 0.0, 9.99, 250.0]),
+        last_session=rng.choice([
+            None, NOW - timedelta(days=1),
+            (NOW - timedelta(days=40)).replace(tzinfo=None)]),
+        language=rng.choice(LANGUAGES + [None]),
+        clan_id=rng.choice(["clan-1", "clan-2", None]),
+        xp=rng.choice([None, 0, 500, 5000]),
+        device_models=rng.sample(MODELS, rng.randint(0, 2)),
+        firmwares=rng.sample(["1.0", "2.0"], rng.randint(0, 2)))
+
+
+def random_matchers(rng):
+    matchers = {}
+    if rng.random() < 0.5:
+        matchers["total_spent"] = {"min": rng.choice([0.0, 5.0, 100.0])}
+    if rng.random() < 0.5:
+        matchers["xp"] = {"min": 100, "max": rng.choice([1000, 10000])}
+    if rng.random() < 0.5:
+        matchers["last_session"] = rng.choice([
+            {"within_days": 7}, {"older_than_days": 30}])
+    has = {}
+    if rng.random() < 0.5:
+        has["language"] = rng.sample(LANGUAGES, rng.randint(1, 2))
+    if rng.random() < 0.3:
+        has["clan"] = ["clan-1"]
+    if rng.random() < 0.5:
+        has["device_model"] = rng.sample(MODELS, 1)
+    if rng.random() < 0.3:
+        has["firmware"] = ["2.0"]
+    if has:
+        matchers["has"] = has
+    return matchers
+
+
+class TestMatcherTypes:
+    """Tests for the new rule types of the registry"""
+
+    def test_schema_validates_registered_sections(self):
+        # Act
+        matchers = MatcherSchema().load({
+            "total_spent": {"min": "9.5"},
+            "last_session": {"within_days": 7},
+            "has": {"language": ["en"], "device_model": ["pixel"]},
+        })
+
+        # Assert
+        assert matchers["total_spent"] == {"min": 9.5}
+        assert matchers["has"]["device_model"] == ["pixel"]
+
+    @pytest.mark.parametrize('matchers', [
+        {"has": {"langauge": ["fr"]}},
+        {"level": {"minimum": 3}},
+        {"last_session": {"within": 7}},
+        {"hass": {"country": ["US"]}},
+    ])
+    def test_schema_rejects_unknown_keys(self, matchers):
+        # Act / Assert
+        with pytest.raises(ValidationError):
+            MatcherSchema().load(matchers)
+
+    def test_scalar_rules(self):
+        # Arrange
+        campaign = compile_campaign(make_campaign(
+            total_spent={"min": 10.0},
+            xp={"max": 1000},
+            last_session={"within_days": 7},
+            has={"language": ["en"], "clan": ["clan-1"],
+                 "device_model": ["pixel"], "firmware": ["2.0"]}))
+        player = dict(
+            total_spent=10.0, xp=1000, language="en", clan_id="clan-1",
+            last_session=(NOW - timedelta(days=6)).replace(tzinfo=None),
+            device_models=["iphone", "pixel"], firmwares=["2.0"])
+
+        # Act & Assert
+        assert campaign.matches(make_player(**player), NOW) is True
+        for attribute, value in [
+                ("total_spent", 9.0), ("total_spent", None), ("xp", 1001),
+                ("language", "fr"), ("clan_id", None),
+                ("last_session", NOW - timedelta(days=8)),
+                ("device_models", ["iphone"]), ("firmwares", [])]:
+            assert campaign.matches(
+                make_player(**dict(player, **{attribute: value})), NOW) \
+                is False, attribute
+
+    def test_rules_are_ordered_by_rank(self):
+        # Act
+        campaign = compile_campaign(make_campaign(
+            level={"min": 3},
+            has={"items": ["Item 1"], "device_model": ["pixel"]},
+            does_not_have={"items": ["Item 2"]}))
+
+        # Assert
+        ranks = [rule.rank for rule in campaign.rules]
+        assert ranks == sorted(ranks)
+        assert campaign.rules[0].name == "has.items"
+        assert campaign.rules[-1].name == "does_not_have.items"
+
+    def test_columnar_equals_scalar(self):
+        # Arrange
+        pytest.importorskip("numpy")
+        from app.columnar import PlayerColumns, evaluate_campaign
+        rng = random.Random(3)
+        campaign_set = CompiledCampaignSet([
+            make_campaign("campaign-%03d" % i, **random_matchers(rng))
+            for i in range(60)])
+        views = [random_player(rng, i) for i in range(300)]
+        columns = PlayerColumns.from_views(views)
+
+        for campaign in campaign_set.campaigns:
+            # Act
+            mask = evaluate_campaign(columns, campaign, NOW)
+
+            # Assert
+            assert mask.tolist() == [
+                campaign.matches(view, NOW) for view in views]
+
+
+class TestMatcherRegistry:
+    """Tests for registering new matcher types"""
+
+    def test_registered_matcher_is_validated_compiled_and_evaluated(self):
+        # Arrange
+        class EvenLevel(Matcher):
+            section = "even_level"
+            cost = 0.1
+
+            def field(self):
+                return fields.Boolean()
+
+            def compile(self, value):
+                if not value:
+                    return None
+                return self.rule(
+                    lambda view, now: view.level % 2 == 0,
+                    lambda columns, now: columns.numeric("level")[0] % 2 == 0)
+
+        custom = MatcherRegistry()
+        custom.register(EvenLevel())
+
+        # Act
+        matchers = custom.schema()().load({"even_level": "true"})
+        rules = custom.compile(matchers)
+
+        # Assert
+        assert [rule.name for rule in rules] == ["even_level"]
+        assert rules[0].test(make_player(level=4), NOW) is True
+        assert rules[0].test(make_player(level=3), NOW) is False
+
+    def test_keyed_matchers_validate_their_own_values(self):
+        # Arrange
+        class Tier(Matcher):
+            section, key = "has", "tier"
+
+            def field(self):
+                return fields.Int()
+
+            def compile(self, value):
+                return None
+
+        custom = MatcherRegistry()
+        custom.register(next(m for m in registry if m.name == "has.country"))
+        custom.register(Tier())
+
+        # Act
+        matchers = custom.schema()().load(
+            {"has": {"country": ["US"], "tier": "2"}})
+
+        # Assert
+        assert matchers == {"has": {"country": ["US"], "tier": 2}}
+        with pytest.raises(ValidationError):
+            custom.schema()().load({"has": {"tier": ["US"]}})
+
+    def test_rejects_duplicate_matchers(self):
+        # Arrange
+        matcher = next(iter(registry))
+
+        # Act & Assert
+        with pytest.raises(ValueError):
+            registry.register(matcher)
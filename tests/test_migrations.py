@@ -0,0 +1,170 @@
+"""
+Tests for the schema migrations and the query plans of the hot lookups
+"""
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from app.migrations import MIGRATIONS, current_version, migrate
+from app.models import (
+    db, Device, Item, Player, PlayerItem, campaign_player_count,
+    player_campaign, player_device)
+
+LOOKUP_INDEXES = {
+    ('player_campaign', 'ix_player_campaign_campaign_id_player_id'),
+    ('player_item', 'ix_player_item_item_id_quantity_player_id'),
+    ('players', 'ix_players_country_level'),
+    ('players', 'ix_players_level'),
+    ('players', 'ix_players_clan_id'),
+}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "profiles.db"}')
+    yield engine
+    engine.dispose()
+
+
+def indexes(engine):
+    inspector = inspect(engine)
+    return {(table, index['name'])
+            for table in inspector.get_table_names()
+            for index in inspector.get_indexes(table)}
+
+
+def schema(engine):
+    """Columns, indexes and triggers of the application tables"""
+    inspector = inspect(engine)
+    with engine.connect() as connection:
+        triggers = set(connection.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+    return triggers, {
+        table: ({(column['name'], str(column['type']), column['nullable'])
+                 for column in inspector.get_columns(table)},
+                {index['name'] for index in inspector.get_indexes(table)})
+        for table in inspector.get_table_names()
+        if table != 'schema_migrations'}
+
+
+def query_plan(statement):
+    """Details of the EXPLAIN QUERY PLAN steps of statement"""
+    compiled = statement.compile(
+        db.engine, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in db.session.execute(
+        text(f'EXPLAIN QUERY PLAN {compiled}'))]
+
+
+class TestMigrate:
+    """Tests for the migrate function"""
+
+    def test_migrates_empty_database(self, engine):
+        # Act
+        applied = migrate(engine)
+
+        # Assert
+        assert applied == [migration.version for migration in MIGRATIONS]
+        assert current_version(engine) == len(MIGRATIONS)
+        assert LOOKUP_INDEXES <= indexes(engine)
+
+    def test_upgrades_database_created_before_migrations(self, engine):
+        # Arrange
+        migrate(engine, target=1)
+        with engine.begin() as connection:
+            connection.execute(text('DROP TABLE schema_migrations'))
+        assert not LOOKUP_INDEXES & indexes(engine)
+
+        # Act
+        applied = migrate(engine)
+
+        # Assert
+        assert applied == [migration.version for migration in MIGRATIONS]
+        assert LOOKUP_INDEXES <= indexes(engine)
+
+    def test_migrated_schema_matches_models(self, engine, tmp_path):
+        # Arrange
+        created = create_engine(f'sqlite:///{tmp_path / "created.db"}')
+        db.metadata.create_all(created)
+
+        # Act
+        migrate(engine)
+
+        # Assert
+        assert schema(engine) == schema(created)
+        created.dispose()
+
+    def test_backfills_player_counts(self, engine):
+        # Arrange
+        migrate(engine, target=2)
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO player_campaign (player_id, campaign_id) "
+                "VALUES ('p1', 'c1'), ('p2', 'c1'), ('p1', 'c2')"))
+
+        # Act
+        migrate(engine)
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO player_campaign (player_id, campaign_id) "
+                "VALUES ('p3', 'c1')"))
+            counts = dict(connection.execute(
+                select(campaign_player_count)).all())
+
+        # Assert
+        assert counts == {"c1": 3, "c2": 1}
+
+    def test_applies_nothing_when_up_to_date(self, engine):
+        # Arrange
+        migrate(engine)
+
+        # Act
+        applied = migrate(engine)
+
+        # Assert
+        assert applied == []
+
+
+class TestQueryPlans:
+    """The hot lookups search indexes instead of scanning tables"""
+
+    @pytest.mark.parametrize('statement, index', [
+        (select(player_campaign.c.player_id)
+         .where(player_campaign.c.campaign_id == "campaign-001"),
+         'COVERING INDEX ix_player_campaign_campaign_id_player_id'),
+        (select(PlayerItem.player_id)
+         .where(PlayerItem.item_id == 1, PlayerItem.quantity > 0),
+         'COVERING INDEX ix_player_item_item_id_quantity_player_id'),
+        (select(Player.player_id)
+         .where(Player.country.in_(["US", "CA"]),
+                Player.level.between(1, 10)),
+         'INDEX ix_players_country_level'),
+        (select(Player.player_id).where(Player.level.between(1, 10)),
+         'INDEX ix_players_level'),
+        (select(Player.player_id).where(Player.clan_id == "123456"),
+         'INDEX ix_players_clan_id'),
+    ])
+    def test_reverse_and_matcher_lookups(self, app, statement, index):
+        # Act
+        plan = query_plan(statement)
+
+        # Assert
+        assert len(plan) == 1
+        assert plan[0].startswith('SEARCH ')
+        assert f'USING {index} ' in plan[0]
+
+    @pytest.mark.parametrize('statement', [
+        select(Player.id).where(Player.id > 100).order_by(Player.id).limit(10),
+        select(PlayerItem.player_id, Item.name)
+        .join(Item, Item.id == PlayerItem.item_id)
+        .where(PlayerItem.player_id.in_(["a", "b"]))
+        .where(PlayerItem.quantity > 0),
+        select(player_device.c.player_id, Device.model)
+        .join(Device, Device.id == player_device.c.device_id)
+        .where(player_device.c.player_id.in_(["a", "b"])),
+        select(player_campaign.c.campaign_id)
+        .where(player_campaign.c.player_id.in_(["a", "b"])),
+    ])
+    def test_rematch_chunk_queries(self, app, statement):
+        # Act
+        plan = query_plan(statement)
+
+        # Assert
+        assert all(step.startswith('SEARCH ') for step in plan), plan
@@ -0,0 +1,112 @@
+"""
+Tests for the Player model inventory and campaign helpers
+"""
+from app.models import db, Campaign, Item, Player, PlayerItem
+
+
+def make_player(**quantities):
+    player = Player(player_id="player-1")
+    player.inventory = [
+        PlayerItem(item=Item(key=key, name=key.title()), quantity=quantity)
+        for key, quantity in quantities.items()]
+    return player
+
+
+class TestPlayerInventory:
+    """Tests for the set-based inventory lookups"""
+
+    def test_view_is_materialized_once(self):
+        # Arrange
+        player = make_player(cash=10, coins=0)
+
+        # Act
+        first = player.get_inventory_view()
+        second = player.get_inventory_view()
+
+        # Assert
+        assert first is second
+        assert player.owned_item_names == frozenset({"Cash"})
+        assert player.owned_item_keys == frozenset({"cash"})
+        assert player.get_items_dict() == {"cash": 10, "coins": 0}
+
+    def test_has_all_and_any_items(self):
+        # Arrange
+        player = make_player(cash=10, coins=5, gems=0)
+
+        # Act & Assert
+        assert player.has_all_items(["Cash", "Coins"]) is True
+        assert player.has_all_items(["Cash", "Gems"]) is False
+        assert player.has_all_items([]) is True
+        assert player.has_any_items(["Gems", "Coins"]) is True
+        assert player.has_any_items(["Gems"]) is False
+        assert player.has_any_items([]) is False
+
+    def test_view_is_invalidated_when_inventory_changes(self):
+        # Arrange
+        player = make_player(cash=10)
+        assert player.has_all_items(["Gems"]) is False
+
+        # Act
+        player.inventory.append(
+            PlayerItem(item=Item(key="gems", name="Gems"), quantity=1))
+
+        # Assert
+        assert player.has_all_items(["Gems"]) is True
+        assert player.get_items_dict() == {"cash": 10, "gems": 1}
+
+    def test_view_is_invalidated_when_quantity_changes(self):
+        # Arrange
+        player = make_player(cash=10, coins=0)
+        assert player.owned_item_names == frozenset({"Cash"})
+
+        # Act
+        player.inventory[0].quantity = 0
+        player.inventory[1].quantity = 3
+
+        # Assert
+        assert player.owned_item_names == frozenset({"Coins"})
+        assert player.get_items_dict() == {"cash": 0, "coins": 3}
+
+    def test_loaded_view_is_invalidated_when_quantity_changes(
+            self, app, player_id):
+        # Arrange
+        db.session.expunge_all()
+        player = Player.query.filter_by(player_id=player_id).one()
+        assert "Item 1" in player.owned_item_names
+        player_item = next(player_item for player_item in player.inventory
+                           if player_item.item.key == "item_1")
+
+        # Act
+        player_item.quantity = 0
+
+        # Assert
+        assert "Item 1" not in player.owned_item_names
+
+
+class TestPlayerCampaigns:
+    """Tests for the assigned campaign lookups"""
+
+    def test_has_campaign_uses_cached_set(self):
+        # Arrange
+        player = Player(player_id="player-1")
+        player.campaigns = [Campaign(campaign_id="campaign-001", name="A")]
+
+        # Act
+        first = player.assigned_campaign_ids
+        second = player.assigned_campaign_ids
+
+        # Assert
+        assert first is second
+        assert player.has_campaign("campaign-001") is True
+        assert player.has_campaign("campaign-002") is False
+
+    def test_set_is_invalidated_when_campaigns_change(self):
+        # Arrange
+        player = Player(player_id="player-1")
+        assert player.has_campaign("campaign-001") is False
+
+        # Act
+        player.campaigns.append(Campaign(campaign_id="campaign-001", name="A"))
+
+        # Assert
+        assert player.has_campaign("campaign-001") is True
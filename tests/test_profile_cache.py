@@ -0,0 +1,213 @@
+"""
+Tests for the player profile cache
+"""
+from datetime import datetime
+import app.app as app_module
+from app.catalog import catalog
+from app.engine import PlayerView
+from app.metrics import metrics
+from app.models import db, Player
+from app.profile_cache import (
+    LRUBackend, ProfileCache, ProfileSnapshot, RedisBackend, profile_cache)
+from tests.test_app import active_campaign
+
+
+def make_snapshot(player_id="player-1"):
+    return ProfileSnapshot.create(
+        PlayerView.create(
+            player_id, 5, "US", ["Item 1"], ["campaign-001"],
+            total_spent=12.5, last_session=datetime(2024, 2, 1, 10),
+            language="en", clan_id="clan-1", xp=30,
+            device_models=["pixel"], firmwares=["1.2"]),
+        b'{"player_id":"%s"}\n' % player_id.encode())
+
+
+class FakeRedis:
+    """Stand-in for a Redis client"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class TestProfileCache:
+    """Tests for the ProfileCache class and its backends"""
+
+    def test_snapshot_round_trips_through_bytes(self):
+        # Arrange
+        snapshot = make_snapshot()
+
+        # Act
+        decoded = ProfileSnapshot.decode(snapshot.encode())
+
+        # Assert
+        assert decoded == snapshot
+
+    def test_lru_evicts_least_recently_used_and_tracks_bytes(self):
+        # Arrange
+        metrics.reset()
+        cache = ProfileCache(LRUBackend(max_entries=2))
+        for player_id in ("player-1", "player-2"):
+            cache.put(make_snapshot(player_id))
+        cache.get("player-1")
+
+        # Act
+        cache.put(make_snapshot("player-3"))
+
+        # Assert
+        assert cache.get("player-2") is None
+        assert cache.get("player-1") is not None
+        assert metrics.get('profile_cache.evictions') == 1
+        assert metrics.get('profile_cache.entries') == 2
+        assert metrics.get('profile_cache.bytes') == sum(
+            len(make_snapshot(p).encode()) for p in ("player-1", "player-3"))
+        assert metrics.get('profile_cache.hit_ratio') == 2 / 3
+
+    def test_redis_backend_accepts_a_stand_in_client(self):
+        # Arrange
+        client = FakeRedis()
+        cache = ProfileCache(RedisBackend(client))
+
+        # Act
+        cache.put(make_snapshot())
+        cache.invalidate(["player-1"])
+
+        # Assert
+        assert client.values == {}
+        assert cache.get("player-1") is None
+
+    def test_put_skips_snapshot_invalidated_since_generation(self):
+        # Arrange
+        cache = ProfileCache()
+        generation = cache.generation("player-1")
+        cache.invalidate(["player-1"])
+
+        # Act
+        cache.put(make_snapshot(), generation)
+
+        # Assert
+        assert cache.get("player-1") is None
+
+
+class TestGetClientConfigCache:
+    """Tests for the cached get_client_config route"""
+
+    def test_second_call_is_served_without_queries(
+            self, client, player_id, campaign_api, count_queries):
+        # Arrange
+        campaign_api.campaigns = [active_campaign("campaign-001")]
+        catalog.refresh()
+        first = client.get(f'/get_client_config/{player_id}')
+
+        # Act
+        with count_queries() as statements:
+            second = client.get(f'/get_client_config/{player_id}')
+
+        # Assert
+        assert second.status_code == 200
+        assert second.data == first.data
+        assert statements == []
+        assert second.headers["ETag"] == first.headers["ETag"]
+
+    def test_matching_etag_gets_not_modified(
+            self, client, player_id, campaign_api):
+        # Arrange
+        metrics.reset()
+        catalog.refresh()
+        first = client.get(f'/get_client_config/{player_id}')
+
+        # Act
+        second = client.get(
+            f'/get_client_config/{player_id}',
+            headers={"If-None-Match": first.headers["ETag"]})
+
+        # Assert
+        assert second.status_code == 304
+        assert second.data == b''
+        assert metrics.get('response_cache.hits') == 1
+        assert metrics.get('response_cache.misses') == 1
+        assert metrics.get('response_cache.hit_ratio') == 0.5
+        assert metrics.get('response_cache.not_modified') == 1
+
+    def test_catalog_version_changes_etag(
+            self, client, player_id, campaign_api):
+        # Arrange
+        catalog.refresh()
+        first = client.get(f'/get_client_config/{player_id}')
+        campaign_api.campaigns = [
+            active_campaign("campaign-other", countries=["FR"])]
+        catalog.refresh()
+
+        # Act
+        second = client.get(
+            f'/get_client_config/{player_id}',
+            headers={"If-None-Match": first.headers["ETag"]})
+
+        # Assert
+        assert second.status_code == 200
+        assert second.data == first.data
+        assert second.headers["ETag"] != first.headers["ETag"]
+
+    def test_player_update_invalidates_on_commit(
+            self, client, player_id, campaign_api):
+        # Arrange
+        catalog.refresh()
+        client.get(f'/get_client_config/{player_id}')
+        player = Player.query.filter_by(player_id=player_id).one()
+        player.level = 7
+
+        # Act
+        db.session.flush()
+        cached_before_commit = profile_cache.get(player_id)
+        db.session.commit()
+
+        # Assert
+        assert cached_before_commit is not None
+        assert profile_cache.get(player_id) is None
+        assert client.get(f'/get_client_config/{player_id}').json["level"] \
+            == 7
+
+    def test_new_campaign_refreshes_cached_profile(
+            self, client, player_id, campaign_api):
+        # Arrange
+        catalog.refresh()
+        client.get(f'/get_client_config/{player_id}')
+        campaign_api.campaigns = [active_campaign("campaign-new")]
+        catalog.refresh()
+
+        # Act
+        response = client.get(f'/get_client_config/{player_id}')
+
+        # Assert
+        assert [c["campaign_id"] for c in response.json["campaigns"]] == [
+            "campaign-new"]
+        assert profile_cache.get(player_id).view.campaign_ids == frozenset(
+            {"campaign-new"})
+
+    def test_profile_loaded_before_concurrent_write_is_not_cached(
+            self, client, player_id, campaign_api, monkeypatch):
+        # Arrange
+        catalog.refresh()
+        load_player_profile = app_module.load_player_profile
+
+        def load_then_write(player_id):
+            player = load_player_profile(player_id)
+            # A concurrent update commits once the profile was loaded
+            profile_cache.invalidate([player_id])
+            return player
+        monkeypatch.setattr(app_module, 'load_player_profile', load_then_write)
+
+        # Act
+        response = client.get(f'/get_client_config/{player_id}')
+
+        # Assert
+        assert response.status_code == 200
+        assert profile_cache.get(player_id) is None
@@ -0,0 +1,38 @@
+"""
+Tests for the player profile loader
+"""
+from app.models import db
+from app.profiles import load_player_profile
+from app.schemas import player_schema
+
+
+class TestLoadPlayerProfile:
+    """Tests for the load_player_profile function"""
+
+    def test_returns_none_for_unknown_player(self, app):
+        # Act
+        result = load_player_profile("unknown")
+
+        # Assert
+        assert result is None
+
+    def test_loads_and_serializes_in_bounded_statements(
+            self, app, player_id, count_queries):
+        # Arrange
+        db.session.expunge_all()
+
+        # Act
+        with count_queries() as statements:
+            player = load_player_profile(player_id)
+            player_schema.dump(player)
+            player.get_items_dict()
+            player.owned_item_names
+
+        # Assert
+        assert len(statements) == 4
+        assert player.country == "CA"
+        assert player.get_items_dict() == {
+            "cash": 1000, "coins": 500, "item_1": 1, "item_34": 3,
+            "item_55": 2}
+        assert player.clan.name == "Hello world clan"
+        assert len(player.devices) == 1
@@ -0,0 +1,194 @@
+"""
+Tests for the offline re-match job
+"""
+import io
+import pytest
+from urllib.error import HTTPError
+from app.catalog import catalog
+from sqlalchemy import delete
+from app.models import db, Player, player_campaign
+from app.rematch import (
+    campaigns_checkpoint, fetch_catalog_changes, rematch_catalog_changes,
+    rematch_players, stream_player_views, write_checkpoint)
+from tests.test_app import active_campaign
+
+
+def add_players(count):
+    db.session.add_all([
+        Player(player_id="player-%d" % index, level=index % 5,
+               country="US" if index % 2 else "FR")
+        for index in range(count)])
+    db.session.commit()
+
+
+class TestRematchPlayers:
+    """Tests for the rematch_players function"""
+
+    def test_streams_every_player_in_chunks(self, app):
+        # Arrange
+        add_players(5)
+
+        # Act
+        chunks = list(stream_player_views(chunk_size=2))
+
+        # Assert
+        assert [len(views) for _, views in chunks] == [2, 2, 2]
+        assert chunks[0][1][0].item_names == frozenset({
+            "Cash", "Coins", "Item 1", "Item 34", "Item 55"})
+
+    def test_assigns_matching_players(self, app, player_id, campaign_api):
+        # Arrange
+        add_players(10)
+        campaign_api.campaigns = [
+            active_campaign("campaign-us", countries=["US"]),
+            active_campaign("campaign-ca", countries=["CA"]),
+        ]
+        catalog.refresh()
+
+        # Act
+        report = rematch_players(catalog.snapshot().campaign_set, chunk_size=3)
+        again = rematch_players(catalog.snapshot().campaign_set, chunk_size=3)
+
+        # Assert
+        assert report.players == 11
+        assert report.assignments == 5
+        assert again.assignments == 0
+        assert Player.query.filter_by(
+            player_id=player_id).one().has_campaign("campaign-ca")
+        assert Player.query.filter_by(
+            player_id="player-1").one().has_campaign("campaign-us")
+
+    def test_catalog_changes_rematch_new_campaigns_only(
+            self, app, player_id, campaign_api):
+        # Arrange
+        add_players(4)
+        campaign_api.campaigns = [active_campaign("campaign-001")]
+        catalog.refresh()
+        since, _ = rematch_catalog_changes(catalog, 0)
+        db.session.execute(delete(player_campaign))
+        db.session.commit()
+        campaign_api.campaigns = [active_campaign("campaign-001"),
+                                  active_campaign("campaign-002")]
+        catalog.refresh()
+
+        # Act
+        version, report = rematch_catalog_changes(catalog, since)
+
+        # Assert
+        assert version == since + 1
+        assert report.assignments == 4
+        assert {row.campaign_id for row in db.session.query(
+            player_campaign)} == {"campaign-002"}
+
+    def test_unchanged_catalog_reads_no_player(
+            self, app, campaign_api, count_queries):
+        # Arrange
+        add_players(4)
+        campaign_api.campaigns = [active_campaign("campaign-001")]
+        catalog.refresh()
+        since, _ = rematch_catalog_changes(catalog, 0)
+
+        # Act
+        with count_queries() as statements:
+            version, report = rematch_catalog_changes(catalog, since)
+
+        # Assert
+        assert version == since
+        assert report.players == 0
+        assert statements == []
+
+    def test_campaigns_run_ignores_full_run_checkpoint(
+            self, app, campaign_api, tmp_path):
+        # Arrange
+        add_players(4)
+        campaign_api.campaigns = [active_campaign("campaign-001")]
+        catalog.refresh()
+        checkpoint = str(tmp_path / "checkpoint.json")
+        write_checkpoint(checkpoint, Player.query.order_by(
+            Player.id.desc()).first().id)
+
+        # Act
+        report = rematch_players(
+            catalog.snapshot().campaign_set, checkpoint=checkpoint,
+            campaign_ids=["campaign-001"])
+
+        # Assert
+        assert report.players == 5
+        assert (tmp_path / "checkpoint.json").exists()
+        assert campaigns_checkpoint(checkpoint, ["campaign-001"]) != checkpoint
+
+    def test_resumes_from_checkpoint(self, app, campaign_api, tmp_path):
+        # Arrange
+        add_players(4)
+        campaign_api.campaigns = [active_campaign("campaign-001")]
+        catalog.refresh()
+        checkpoint = str(tmp_path / "checkpoint.json")
+        first_id = Player.query.order_by(Player.id).first().id
+        write_checkpoint(checkpoint, first_id + 2)
+
+        # Act
+        report = rematch_players(
+            catalog.snapshot().campaign_set, checkpoint=checkpoint)
+
+        # Assert
+        assert report.players == 2
+        assert not (tmp_path / "checkpoint.json").exists()
+
+    def test_columnar_mode_assigns_the_same_players(self, app, campaign_api):
+        # Arrange
+        pytest.importorskip("numpy")
+        add_players(10)
+        campaign_api.campaigns = [
+            active_campaign("campaign-us", countries=["US"]),
+            active_campaign("campaign-ca", countries=["CA"],
+                            required_items=["Item 1"]),
+        ]
+        catalog.refresh()
+
+        # Act
+        report = rematch_players(
+            catalog.snapshot().campaign_set, chunk_size=4, columnar=True)
+
+        # Assert
+        assert report.assignments == 5
+
+
+class TestFetchCatalogChanges:
+    """Tests for the fetch_catalog_changes function"""
+
+    @pytest.fixture
+    def server(self, client, monkeypatch):
+        """Route the requests of fetch_catalog_changes to the test client"""
+        def urlopen(url, timeout):
+            response = client.get(url.replace('http://server', ''))
+            if response.status_code != 200:
+                raise HTTPError(url, response.status_code, response.status,
+                                {}, io.BytesIO(response.data))
+            return io.BytesIO(response.data)
+        monkeypatch.setattr('app.rematch.urlopen', urlopen)
+        return 'http://server'
+
+    def test_reads_changes_since_version(self, server, campaign_api):
+        # Arrange
+        campaign_api.campaigns = [active_campaign("campaign-001"),
+                                  active_campaign("campaign-002")]
+        catalog.refresh()
+        since = catalog.snapshot().version
+        campaign_api.campaigns = [active_campaign("campaign-002"),
+                                  active_campaign("campaign-003")]
+        catalog.refresh()
+
+        # Act
+        version, campaign_ids = fetch_catalog_changes(server, since)
+
+        # Assert
+        assert version == since + 1
+        assert campaign_ids == {"campaign-003"}
+
+    def test_history_gap_raises_lookup_error(self, server, campaign_api):
+        # Arrange
+        catalog.refresh()
+
+        # Act / Assert
+        with pytest.raises(LookupError):
+            fetch_catalog_changes(server, -5)
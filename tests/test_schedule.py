@@ -0,0 +1,148 @@
+"""
+Tests for the campaign activity schedule
+"""
+from datetime import datetime, timedelta, timezone
+from app.engine import CompiledCampaignSet, compile_campaign
+from app.schedule import CampaignSchedule
+from tests.test_engine import make_campaign, make_view
+
+FEB_1 = datetime(2024, 2, 1, tzinfo=timezone.utc)
+FEB_10 = datetime(2024, 2, 10, tzinfo=timezone.utc)
+MAR_1 = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    """Time source moved by hand"""
+
+    def __init__(self, now):
+        self.now = now
+        self.reads = 0
+
+    def __call__(self):
+        self.reads += 1
+        return self.now
+
+
+def scheduled_campaign(campaign_id, start, end, enabled=True):
+    campaign = make_campaign(campaign_id)
+    campaign.update(start_date=start, end_date=end, enabled=enabled)
+    return campaign
+
+
+def schedule_of(campaigns, clock):
+    return CampaignSchedule(
+        [compile_campaign(campaign) for campaign in campaigns], clock)
+
+
+class TestCampaignSchedule:
+    """Tests for the CampaignSchedule class"""
+
+    def test_active_subset_follows_boundaries(self):
+        # Arrange
+        clock = FakeClock(FEB_1 - timedelta(days=1))
+        schedule = schedule_of([
+            scheduled_campaign("early", FEB_1, FEB_10),
+            scheduled_campaign("late", FEB_10, MAR_1)], clock)
+
+        # Act
+        before = schedule.active()
+        clock.now = FEB_1
+        started = schedule.active()
+        clock.now = FEB_10
+        overlap = schedule.active()
+        clock.now = FEB_10 + timedelta(microseconds=1)
+        second = schedule.active()
+        clock.now = MAR_1 + timedelta(seconds=1)
+        after = schedule.active()
+
+        # Assert
+        assert before == frozenset()
+        assert started == {0}
+        assert overlap == {0, 1}
+        assert second == {1}
+        assert after == frozenset()
+
+    def test_recomputes_only_at_boundaries(self):
+        # Arrange
+        clock = FakeClock(FEB_1 + timedelta(days=2))
+        schedule = schedule_of(
+            [scheduled_campaign("early", FEB_1, FEB_10)], clock)
+        window = schedule._window
+
+        # Act
+        for hour in range(24):
+            clock.now = FEB_1 + timedelta(days=2, hours=hour)
+            schedule.active()
+
+        # Assert
+        assert schedule._window is window
+        assert schedule.next_change == FEB_10 + timedelta(microseconds=1)
+
+    def test_past_lookup_keeps_current_window(self):
+        # Arrange
+        clock = FakeClock(FEB_1 + timedelta(days=2))
+        schedule = schedule_of(
+            [scheduled_campaign("early", FEB_1, FEB_10)], clock)
+
+        # Act
+        past = schedule.active(FEB_1 - timedelta(days=1))
+
+        # Assert
+        assert past == frozenset()
+        assert schedule.active() == {0}
+
+    def test_disabled_and_undated_campaigns(self):
+        # Arrange
+        clock = FakeClock(FEB_1)
+        schedule = schedule_of([
+            scheduled_campaign("disabled", FEB_1, MAR_1, enabled=False),
+            scheduled_campaign("undated", None, None)], clock)
+
+        # Act
+        active = schedule.active()
+
+        # Assert
+        assert active == {1}
+        assert schedule.boundaries == []
+        assert schedule.next_change is None
+
+    def test_timer_refreshes_at_next_change(self):
+        # Arrange
+        now = datetime.now(timezone.utc)
+        campaign = scheduled_campaign(
+            "soon", now + timedelta(milliseconds=50), now + timedelta(days=1))
+        schedule = schedule_of(
+            [campaign], clock=lambda: datetime.now(timezone.utc))
+        window = schedule._window
+
+        # Act
+        schedule.start()
+        try:
+            schedule._timer.join(timeout=5)
+        finally:
+            schedule.stop()
+
+        # Assert
+        assert window.active == frozenset()
+        assert schedule._window.active == {0}
+
+
+class TestCompiledCampaignSetSchedule:
+    """Tests for the schedule of a CompiledCampaignSet"""
+
+    def test_match_uses_injected_clock(self):
+        # Arrange
+        clock = FakeClock(FEB_1 - timedelta(days=1))
+        campaign_set = CompiledCampaignSet(
+            [make_campaign("campaign-001")], clock=clock)
+
+        # Act
+        before = campaign_set.match(make_view())
+        clock.now = FEB_10
+        during = campaign_set.match(make_view())
+
+        # Assert
+        assert before == []
+        assert [c.campaign_id for c in during] == ["campaign-001"]
+        assert [c.campaign_id for c in campaign_set.active()] == [
+            "campaign-001"]
@@ -0,0 +1,177 @@
+"""
+Tests for the priority-ordered, capped selection of matching campaigns
+"""
+import random
+import pytest
+from app.catalog import catalog
+from app.engine import CompiledCampaignSet, Selection
+from app.metrics import metrics
+from tests.test_app import active_campaign
+from tests.test_engine import NOW, make_campaign, make_view
+from tests.test_index import random_campaign
+
+
+def prioritized(campaign_id, priority, **matchers):
+    return {**make_campaign(campaign_id, **matchers), "priority": priority}
+
+
+def campaign_set(selection, *campaigns):
+    return CompiledCampaignSet(
+        campaigns, clock=lambda: NOW, selection=selection)
+
+
+CAMPAIGNS = (
+    prioritized("low", 1.0),
+    prioritized("high", 9.0),
+    prioritized("tie-b", 5.0),
+    prioritized("tie-a", 5.0),
+    prioritized("unreachable", 7.0, level={"min": 50}),
+)
+
+
+class TestSelection:
+    """Tests for the Selection class"""
+
+    @pytest.mark.parametrize('selection, held_above, held, limit', [
+        (Selection(), 1, 3, None),
+        (Selection(top_k=2), 0, 3, 2),
+        (Selection(top_k=2), 1, 3, 1),
+        (Selection(top_k=2), 3, 3, 0),
+        (Selection(player_cap=4), 3, 3, 1),
+        (Selection(top_k=2, player_cap=4), 0, 0, 2),
+        (Selection(top_k=2, player_cap=4), 0, 6, 0),
+    ])
+    def test_limit(self, selection, held_above, held, limit):
+        # Act / Assert
+        assert selection.limit(held_above, held) == limit
+
+
+class TestSelectedMatch:
+    """Tests for CompiledCampaignSet.match with a selection"""
+
+    def test_returns_top_k_by_priority_then_id(self):
+        # Arrange
+        campaigns = campaign_set(Selection(top_k=3), *CAMPAIGNS)
+        early_exits = metrics.get('campaign_selection.early_exits')
+
+        # Act
+        matched = campaigns.match(make_view())
+
+        # Assert
+        assert [c.campaign_id for c in matched] == ["high", "tie-a", "tie-b"]
+        assert metrics.get('campaign_selection.early_exits') == \
+            early_exits + 1
+
+    def test_player_cap_counts_active_assigned_campaigns(self):
+        # Arrange
+        campaigns = campaign_set(Selection(player_cap=2), *CAMPAIGNS)
+
+        # Act
+        matched = campaigns.match(make_view(campaigns=["tie-a", "retired"]))
+        capped = campaigns.match(make_view(campaigns=["tie-a", "high"]))
+
+        # Assert
+        assert [c.campaign_id for c in matched] == ["high"]
+        assert capped == []
+
+    def test_repeated_matches_keep_top_k_held(self):
+        # Arrange
+        campaigns = campaign_set(Selection(top_k=1), *CAMPAIGNS)
+        held = []
+
+        # Act
+        for _ in range(3):
+            held += [c.campaign_id for c in campaigns.match(
+                make_view(campaigns=held))]
+
+        # Assert
+        assert held == ["high"]
+
+    def test_held_lower_ranked_campaigns_leave_room_above(self):
+        # Arrange
+        campaigns = campaign_set(Selection(top_k=2), *CAMPAIGNS)
+
+        # Act
+        matched = campaigns.match(make_view(campaigns=["low", "tie-b"]))
+
+        # Assert
+        assert [c.campaign_id for c in matched] == ["high", "tie-a"]
+
+    def test_subset_counts_campaigns_held_in_whole_set(self):
+        # Arrange
+        campaigns = campaign_set(
+            Selection(player_cap=2), *CAMPAIGNS, prioritized("new", 0.0))
+        view = make_view(campaigns=["low", "high"])
+
+        # Act
+        matched = campaigns.subset(["new"]).match(view)
+
+        # Assert
+        assert campaigns.match(view) == []
+        assert matched == []
+
+    def test_without_selection_keeps_every_match_in_catalog_order(self):
+        # Act
+        matched = campaign_set(Selection(), *CAMPAIGNS).match(make_view())
+
+        # Assert
+        assert [c.campaign_id for c in matched] == [
+            "low", "high", "tie-b", "tie-a"]
+
+    @pytest.mark.parametrize('subset', [False, True])
+    def test_columnar_matching_applies_the_same_selection(self, subset):
+        # Arrange
+        pytest.importorskip("numpy")
+        from app.columnar import PlayerColumns, match_columns
+        rng = random.Random(25)
+        campaigns = campaign_set(
+            Selection(top_k=2, player_cap=3),
+            *[{**random_campaign(rng, f"campaign-{index:03d}"),
+               "priority": rng.randint(0, 3)} for index in range(30)])
+        views = [make_view(
+            level=rng.randint(0, 15),
+            country=rng.choice(["US", "CA", "FR"]),
+            items=rng.sample(["Item 1", "Item 34", "Item 55"],
+                             rng.randint(0, 3)),
+            campaigns=rng.sample(
+                [c.campaign_id for c in campaigns.campaigns],
+                rng.randint(0, 3))
+        )._replace(player_id=f"player-{index}") for index in range(200)]
+        if subset:
+            campaigns = campaigns.subset(
+                c.campaign_id for c in campaigns.campaigns[::2])
+
+        # Act
+        eligible = match_columns(
+            PlayerColumns.from_views(views), campaigns, NOW)
+
+        # Assert
+        by_row = {row: set() for row in range(len(views))}
+        for campaign_id, rows in eligible.items():
+            for row in rows.tolist():
+                by_row[row].add(campaign_id)
+        assert by_row == {
+            row: {c.campaign_id for c in campaigns.match(view, NOW)}
+            for row, view in enumerate(views)}
+        assert {len(matched) for matched in by_row.values()} == {0, 1, 2}
+
+
+class TestGetClientConfigSelection:
+    """Tests for get_client_config with a selection configured"""
+
+    def test_assigns_highest_priority_campaigns(
+            self, client, player_id, campaign_api, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(catalog, 'selection', Selection(top_k=1))
+        campaign_api.campaigns = [
+            {**active_campaign("campaign-low"), "priority": 1.0},
+            {**active_campaign("campaign-high"), "priority": 2.0},
+        ]
+        catalog.refresh()
+
+        # Act
+        response = client.get(f'/get_client_config/{player_id}')
+
+        # Assert
+        assert response.json["campaigns"] == [
+            {"campaign_id": "campaign-high", "name": "campaign-high"}]
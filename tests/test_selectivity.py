@@ -0,0 +1,99 @@
+"""
+Tests for the runtime matcher statistics and rule ordering
+"""
+from app.catalog import catalog
+from app.engine import CompiledCampaignSet, compile_campaign
+from app.selectivity import MatcherStatistics
+from tests.test_app import active_campaign
+from tests.test_engine import NOW, make_campaign, make_view
+
+
+def campaign_with_misleading_hints():
+    # has.items is hinted as the most selective rule, yet every player below
+    # owns Item 1 while the total_spent rule rejects them all
+    return make_campaign(
+        has={"items": ["Item 1"]}, total_spent={"min": 100.0})
+
+
+class TestMatcherStatistics:
+    """Tests for the MatcherStatistics class"""
+
+    def test_evaluate_records_every_rule_and_agrees_with_matches(self):
+        # Arrange
+        statistics = MatcherStatistics()
+        campaign = compile_campaign(campaign_with_misleading_hints())
+        view = make_view(items=["Item 1"])._replace(total_spent=5.0)
+
+        # Act
+        result = statistics.evaluate(campaign, view, NOW)
+
+        # Assert
+        assert result is campaign.matches(view, NOW) is False
+        items = statistics.get("campaign-001", "has.items")
+        spent = statistics.get("campaign-001", "total_spent")
+        assert (items.evaluations, items.rejections) == (1, 0)
+        assert (spent.evaluations, spent.rejections) == (1, 1)
+
+    def test_order_follows_hints_until_enough_samples(self):
+        # Arrange
+        statistics = MatcherStatistics(min_samples=10)
+        campaign = compile_campaign(campaign_with_misleading_hints())
+        view = make_view(items=["Item 1"])._replace(total_spent=5.0)
+        for _ in range(9):
+            statistics.evaluate(campaign, view, NOW)
+        hinted = statistics.order(campaign)
+
+        # Act
+        statistics.evaluate(campaign, view, NOW)
+        learned = statistics.order(campaign)
+
+        # Assert
+        assert [rule.name for rule in hinted] == ["has.items", "total_spent"]
+        assert [rule.name for rule in learned] == ["total_spent", "has.items"]
+
+
+class TestCompiledCampaignSetOrdering:
+    """Tests for the periodic reordering of a campaign set"""
+
+    def test_match_samples_and_reorders_without_changing_results(self):
+        # Arrange
+        statistics = MatcherStatistics(
+            sample_every=1, reorder_every=20, min_samples=20)
+        campaign_set = CompiledCampaignSet(
+            [campaign_with_misleading_hints()], statistics=statistics)
+        views = [make_view(items=["Item 1"])._replace(total_spent=spent)
+                 for spent in (5.0, 150.0)]
+        before = [campaign_set.match(view, NOW) != [] for view in views]
+
+        # Act
+        for _ in range(10):
+            for view in views:
+                campaign_set.match(view, NOW)
+
+        # Assert
+        assert [rule.name for rule in campaign_set.campaigns[0].rules] == [
+            "total_spent", "has.items"]
+        assert [campaign_set.match(view, NOW) != [] for view in views] \
+            == before == [False, True]
+
+
+class TestMatcherStatsEndpoint:
+    """Tests for the admin matcher statistics route"""
+
+    def test_reports_rules_of_current_campaigns(self, client, campaign_api):
+        # Arrange
+        campaign_api.campaigns = [active_campaign(
+            "campaign-stats", countries=["US"], required_items=["Item 1"])]
+        catalog.refresh()
+
+        # Act
+        response = client.get('/admin/matcher_stats')
+
+        # Assert
+        assert response.status_code == 200
+        rules = response.json["campaigns"]["campaign-stats"]
+        assert {rule["rule"] for rule in rules} == {
+            "level", "has.country", "has.items"}
+        assert set(rules[0]) == {
+            "rule", "evaluations", "rejection_rate", "mean_ns", "cost",
+            "pass_rate"}
@@ -3,11 +3,18 @@ Tests for the services module functions
 """
 from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
+from app.catalog import catalog
+from app.engine import compile_campaign
+from app.models import db, Campaign, Player, player_campaign
 from app.services import (
+    assign_campaigns,
+    campaign_rows,
     filter_eligible_campaigns,
     check_player_matches_campaign_criteria,
     check_campaign_is_active
 )
+from tests.test_app import active_campaign
+from tests.test_engine import make_campaign
 
 
 class TestFilterEligibleCampaigns:
@@ -384,3 +391,95 @@ class TestCheckCampaignIsActive:
         # Assert
         assert result is True
         mock_datetime.now.assert_called_once_with(timezone.utc)
+
+
+def compiled_campaign(campaign_id):
+    return compile_campaign(make_campaign(campaign_id))
+
+
+class TestAssignCampaigns:
+    """Tests for the assign_campaigns function"""
+
+    def test_assigning_twice_keeps_a_single_row(self, app, player_id):
+        # Arrange
+        campaign = compiled_campaign("campaign-001")
+        player = Player.query.filter_by(player_id=player_id).one()
+        assign_campaigns({player: [campaign]})
+        db.session.commit()
+        player = Player.query.filter_by(player_id=player_id).one()
+
+        # Act
+        written = assign_campaigns({player: [campaign]})
+        db.session.commit()
+
+        # Assert
+        assert written == 1
+        assert db.session.query(player_campaign).filter_by(
+            player_id=player_id, campaign_id="campaign-001").count() == 1
+        assert [c.campaign_id for c in player.campaigns] == ["campaign-001"]
+
+    def test_commit_does_not_insert_assignments_again(
+            self, app, player_id, count_queries):
+        # Arrange
+        player = Player.query.filter_by(player_id=player_id).one()
+        assign_campaigns({player: [compiled_campaign("campaign-001")]})
+
+        # Act
+        with count_queries() as statements:
+            db.session.commit()
+
+        # Assert
+        assert not [s for s in statements if s.startswith("INSERT")]
+
+    def test_campaign_rows_are_upserted_once(
+            self, app, player_id, count_queries):
+        # Arrange
+        player = Player.query.filter_by(player_id=player_id).one()
+        campaign = compiled_campaign("campaign-001")
+        assign_campaigns({player: [campaign]})
+        db.session.commit()
+        player = Player.query.filter_by(player_id=player_id).one()
+
+        # Act
+        with count_queries() as statements:
+            assign_campaigns({player: [compiled_campaign("campaign-001")]})
+
+        # Assert
+        assert not [s for s in statements
+                    if s.startswith("INSERT INTO campaigns")]
+        assert Campaign.query.filter_by(campaign_id="campaign-001").count() == 1
+
+    def test_rolled_back_campaign_rows_are_upserted_again(
+            self, app, player_id):
+        # Arrange
+        player = Player.query.filter_by(player_id=player_id).one()
+        assign_campaigns({player: [compiled_campaign("campaign-001")]})
+        db.session.rollback()
+        player = Player.query.filter_by(player_id=player_id).one()
+
+        # Act
+        written = assign_campaigns(
+            {player: [compiled_campaign("campaign-001")]})
+        db.session.commit()
+
+        # Assert
+        assert written == 1
+        assert Campaign.query.filter_by(campaign_id="campaign-001").count() == 1
+        assert compiled_campaign("campaign-001") in campaign_rows
+
+    def test_catalog_change_forgets_removed_campaign_rows(
+            self, app, campaign_api):
+        # Arrange
+        campaign_api.campaigns = [active_campaign("campaign-001"),
+                                  active_campaign("campaign-rows")]
+        catalog.refresh()
+        campaign_rows.add(compiled_campaign("campaign-001"))
+        campaign_rows.add(compiled_campaign("campaign-rows"))
+        campaign_api.campaigns = [active_campaign("campaign-rows")]
+
+        # Act
+        catalog.refresh()
+
+        # Assert
+        assert compiled_campaign("campaign-001") not in campaign_rows
+        assert compiled_campaign("campaign-rows") in campaign_rows
@@ -0,0 +1,147 @@
+"""
+Tests for single-flight request coalescing
+"""
+import threading
+import time
+import pytest
+from app.app import ClientConfig, client_config_calls
+from app.metrics import metrics
+from app.profile_cache import ProfileSnapshot
+from app.engine import PlayerView
+from app.singleflight import SingleFlight
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.001)
+
+
+def hold(flight, key, result):
+    """Start a call of flight that returns result once released"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocked():
+        started.set()
+        release.wait(5)
+        return result
+
+    thread = threading.Thread(target=flight.do, args=(key, blocked))
+    thread.start()
+    started.wait(5)
+    return release, thread
+
+
+class TestSingleFlight:
+    """Tests for the SingleFlight class"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        # Arrange
+        flight = SingleFlight('test_flight')
+        coalesced = metrics.get('test_flight.coalesced')
+        release, leader = hold(flight, "key", "shared")
+        results = []
+        followers = [
+            threading.Thread(target=lambda: results.append(
+                flight.do("key", lambda: "executed")))
+            for _ in range(3)]
+
+        # Act
+        for follower in followers:
+            follower.start()
+        wait_for(lambda: metrics.get('test_flight.coalesced') - coalesced == 3)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        # Assert
+        assert results == ["shared"] * 3
+        assert metrics.get('test_flight.in_flight') == 0
+
+    def test_exception_reaches_every_caller(self):
+        # Arrange
+        flight = SingleFlight('test_flight')
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise LookupError("boom")
+
+        def call():
+            try:
+                flight.do("key", failing)
+            except LookupError as error:
+                errors.append(error)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        coalesced = metrics.get('test_flight.coalesced')
+        follower = threading.Thread(target=call)
+
+        # Act
+        follower.start()
+        wait_for(lambda: metrics.get('test_flight.coalesced') > coalesced)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        # Assert
+        assert len(errors) == 2
+
+    def test_sequential_calls_execute_again(self):
+        # Arrange
+        flight = SingleFlight('test_flight')
+        calls = []
+
+        # Act
+        for _ in range(2):
+            flight.do("key", lambda: calls.append(1))
+
+        # Assert
+        assert len(calls) == 2
+
+    def test_failed_call_is_not_reused(self):
+        # Arrange
+        flight = SingleFlight('test_flight')
+
+        # Act
+        with pytest.raises(LookupError):
+            flight.do("key", lambda: {}["missing"])
+        result = flight.do("key", lambda: "ok")
+
+        # Assert
+        assert result == "ok"
+
+
+class TestClientConfigCoalescing:
+    """Tests for the coalescing of get_client_config requests"""
+
+    def test_request_joins_call_in_flight(self, app, player_id):
+        # Arrange
+        body = b'{"player_id":"shared"}\n'
+        snapshot = ProfileSnapshot.create(
+            PlayerView.create(player_id, 1, "US"), body)
+        coalesced = metrics.get('client_config.coalesced')
+        release, leader = hold(
+            client_config_calls, player_id, ClientConfig(snapshot, 7))
+        responses = []
+        follower = threading.Thread(target=lambda: responses.append(
+            app.test_client().get(f'/get_client_config/{player_id}')))
+
+        # Act
+        follower.start()
+        wait_for(lambda: metrics.get('client_config.coalesced') > coalesced)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        # Assert
+        assert responses[0].status_code == 200
+        assert responses[0].data == body
+        assert responses[0].headers['ETag'] == f'"{snapshot.version}-7"'
@@ -0,0 +1,172 @@
+"""
+Tests for the write-behind queue of campaign assignments
+"""
+import pytest
+from app.catalog import catalog
+from app.engine import compile_campaign
+from app.metrics import metrics
+from app.models import db, Player, player_campaign
+from app.write_behind import (
+    AssignmentLog, AssignmentLogLockedError, AssignmentQueue,
+    PendingAssignment)
+from tests.test_app import active_campaign
+from tests.test_engine import make_campaign
+
+
+@pytest.fixture
+def queue(app, tmp_path):
+    """Enabled queue, without writer thread, logging to a temporary file"""
+    queue = AssignmentQueue(max_depth=10, batch_size=2, timeout=0.01)
+    queue.open(app, AssignmentLog(str(tmp_path / "assignments.log")))
+    yield queue
+    queue.log.close()
+
+
+def stored(player_id):
+    return {row.campaign_id for row in db.session.query(player_campaign)
+            .filter_by(player_id=player_id)}
+
+
+def load(player_id):
+    return Player.query.filter_by(player_id=player_id).one()
+
+
+class TestAssignmentLog:
+    """Tests for the AssignmentLog class"""
+
+    def test_skips_torn_last_line(self, tmp_path):
+        # Arrange
+        log = AssignmentLog(str(tmp_path / "assignments.log"))
+        log.append([PendingAssignment("player-1", "campaign-001", "c1")])
+        log.close()
+        with open(tmp_path / "assignments.log", 'ab') as file:
+            file.write(b'{"player_id": "player-1", "camp')
+
+        # Act
+        assignments = AssignmentLog(str(tmp_path / "assignments.log")).read()
+
+        # Assert
+        assert assignments == [
+            PendingAssignment("player-1", "campaign-001", "c1")]
+
+    def test_log_is_held_by_a_single_owner(self, tmp_path):
+        # Arrange
+        pytest.importorskip("fcntl")
+        path = str(tmp_path / "assignments.log")
+        log = AssignmentLog(path)
+
+        # Act
+        with pytest.raises(AssignmentLogLockedError):
+            AssignmentLog(path)
+        log.close()
+        reopened = AssignmentLog(path)
+
+        # Assert
+        assert reopened.read() == []
+        reopened.close()
+
+
+class TestAssignmentQueue:
+    """Tests for the AssignmentQueue class"""
+
+    def test_submit_updates_player_before_flush(self, queue, player_id):
+        # Arrange
+        player = load(player_id)
+        campaign = compile_campaign(make_campaign("campaign-001"))
+
+        # Act
+        accepted = queue.submit({player: [campaign]})
+        assigned = [c.campaign_id for c in player.campaigns]
+        db.session.commit()
+
+        # Assert
+        assert accepted is True
+        assert assigned == ["campaign-001"]
+        assert stored(player_id) == set()
+        assert queue.depth == 1
+        assert queue.log.read() == [
+            PendingAssignment(player_id, "campaign-001", "campaign-001")]
+
+    def test_flush_writes_batch_and_compacts_log(self, queue, player_id):
+        # Arrange
+        campaigns = [compile_campaign(make_campaign(f"campaign-00{i}"))
+                     for i in range(1, 4)]
+        queue.submit({load(player_id): campaigns})
+        db.session.commit()
+
+        # Act
+        first = queue.flush()
+        logged = queue.log.read()
+        second = queue.flush()
+
+        # Assert
+        assert (first, second) == (2, 1)
+        assert logged == [
+            PendingAssignment(player_id, "campaign-003", "campaign-003")]
+        assert stored(player_id) == {
+            "campaign-001", "campaign-002", "campaign-003"}
+        assert queue.depth == 0
+        assert queue.log.read() == []
+
+    def test_replays_log_after_restart(self, queue, app, player_id):
+        # Arrange
+        queue.submit({load(player_id): [
+            compile_campaign(make_campaign("campaign-001"))]})
+        db.session.commit()
+        queue.log.close()
+        restarted = AssignmentQueue()
+
+        # Act
+        recovered = restarted.open(app, AssignmentLog(queue.log.path))
+        restarted.flush()
+
+        # Assert
+        assert recovered == 1
+        assert stored(player_id) == {"campaign-001"}
+        restarted.log.close()
+
+    def test_rejects_when_full_past_timeout(self, queue, player_id):
+        # Arrange
+        queue.max_depth = 1
+        player = load(player_id)
+        queue.submit({player: [compile_campaign(make_campaign("c1"))]})
+        rejected = metrics.get('write_behind.rejected')
+
+        # Act
+        accepted = queue.submit(
+            {player: [compile_campaign(make_campaign("c2"))]})
+
+        # Assert
+        assert accepted is False
+        assert queue.depth == 1
+        assert metrics.get('write_behind.rejected') == rejected + 1
+
+    def test_disabled_queue_refuses_submissions(self, app, player_id):
+        # Act
+        accepted = AssignmentQueue().submit({load(player_id): [
+            compile_campaign(make_campaign("campaign-001"))]})
+
+        # Assert
+        assert accepted is False
+
+
+class TestGetClientConfigWriteBehind:
+    """Tests for get_client_config with the write-behind queue enabled"""
+
+    def test_responds_with_queued_assignment(
+            self, client, player_id, campaign_api, queue, monkeypatch):
+        # Arrange
+        monkeypatch.setattr('app.app.assignment_queue', queue)
+        campaign_api.campaigns = [active_campaign("campaign-002")]
+        catalog.refresh()
+
+        # Act
+        response = client.get(f'/get_client_config/{player_id}')
+        pending = queue.depth
+        queue.flush()
+
+        # Assert
+        assert response.json["campaigns"] == [
+            {"campaign_id": "campaign-002", "name": "campaign-002"}]
+        assert pending == 1
+        assert stored(player_id) == {"campaign-002"}